@@ -25,7 +25,7 @@ from django.conf import settings
 from django.contrib.auth.base_user import AbstractBaseUser, BaseUserManager
 from django.contrib.auth.models import Group as DjangoGroup
 from django.db import models
-from django.db.models.signals import m2m_changed, post_save, pre_delete
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete
 from django.dispatch import receiver
 from django.http import Http404
 from django.urls import reverse
@@ -52,6 +52,7 @@ from weblate.auth.utils import (
     migrate_roles,
 )
 from weblate.lang.models import Language
+from weblate.machinery.base import invalidate_cache
 from weblate.trans.defines import EMAIL_LENGTH, FULLNAME_LENGTH, USERNAME_LENGTH
 from weblate.trans.fields import RegexField
 from weblate.trans.models import ComponentList, Project
@@ -648,6 +649,27 @@ def setup_project_groups(sender, instance, **kwargs):
 @receiver(pre_delete, sender=Project)
 def cleanup_group_acl(sender, instance, **kwargs):
     instance.group_set.filter(name__contains='@', internal=True).delete()
+    invalidate_cache('acl')
+
+
+@receiver(post_save, sender=Project)
+def create_project_acl(sender, instance, created, **kwargs):
+    # Superusers can access all projects
+    if created:
+        invalidate_cache('acl')
+
+
+@receiver(m2m_changed, sender=User.groups.through)
+@receiver(m2m_changed, sender=Group.projects.through)
+def change_acl(sender, action, **kwargs):
+    """Invalidate results cached per user projects on access changes."""
+    if action.startswith('post_'):
+        invalidate_cache('acl')
+
+
+@receiver(post_delete, sender=Group)
+def delete_group_acl(sender, **kwargs):
+    invalidate_cache('acl')
 
 
 class WeblateAuthConf(AppConf):
@@ -68,6 +68,19 @@ class Check:
             return False
         return self.check_target_unit(sources, targets, unit)
 
+    def check_target_batch(self, items):
+        """Check target strings of multiple units.
+
+        The items are tuples of sources, targets and unit. Returns list of units
+        where the check fires. Checks can override this to process all units at
+        once.
+        """
+        return [
+            unit
+            for sources, targets, unit in items
+            if self.check_target(sources, targets, unit)
+        ]
+
     def check_target_unit_with_flag(self, sources, targets, unit):
         """Check flag value."""
         raise NotImplementedError()
@@ -95,6 +108,14 @@ class Check:
         """Check source string."""
         raise NotImplementedError()
 
+    def check_source_batch(self, items):
+        """Check source strings of multiple units.
+
+        The items are tuples of sources and unit. Returns list of units where the
+        check fires.
+        """
+        return [unit for sources, unit in items if self.check_source(sources, unit)]
+
     def check_chars(self, source, target, pos, chars):
         """Generic checker for chars presence."""
         try:
@@ -19,6 +19,7 @@
 #
 
 import re
+from functools import lru_cache
 
 from django.utils.translation import gettext_lazy as _
 
@@ -154,6 +155,11 @@ JAVA_MESSAGE_MATCH = re.compile(
 )
 
 
+# Number of source strings to keep parsed format strings for, it is shared by
+# all format checks and should cover a component being updated
+FORMAT_CACHE_SIZE = 20000
+
+
 class BaseFormatCheck(TargetCheck):
     """Base class for fomat string checks."""
 
@@ -203,19 +209,39 @@ class BaseFormatCheck(TargetCheck):
     def normalize(self, matches):
         return [m for m in matches if m != '%']
 
+    def extract_matches(self, string):
+        """Return list of format strings used in a string."""
+        return [self.cleanup_string(x[0]) for x in self.regexp.findall(string)]
+
+    @lru_cache(maxsize=FORMAT_CACHE_SIZE)
+    def extract_source(self, source):
+        """Return format strings used in a source string and position usage.
+
+        The source strings are same for all translations, so this is cached.
+        """
+        matches = tuple(self.extract_matches(source))
+        if not matches:
+            return matches, True
+        return matches, any((self.is_position_based(x) for x in matches))
+
+    @lru_cache(maxsize=FORMAT_CACHE_SIZE)
+    def extract_highlight(self, source):
+        """Return positions of format strings in a source string."""
+        return tuple(
+            (match.start(), match.end(), match.group())
+            for match in self.regexp.finditer(source)
+        )
+
     def check_format(self, source, target, ignore_missing):
         """Generic checker for format strings."""
         if not target or not source:
             return False
 
-        uses_position = True
-
         # Calculate value
-        src_matches = [self.cleanup_string(x[0]) for x in self.regexp.findall(source)]
-        if src_matches:
-            uses_position = any((self.is_position_based(x) for x in src_matches))
+        src_matches, uses_position = self.extract_source(source)
+        src_matches = list(src_matches)
 
-        tgt_matches = [self.cleanup_string(x[0]) for x in self.regexp.findall(target)]
+        tgt_matches = self.extract_matches(target)
 
         if not uses_position:
             src_matches = set(src_matches)
@@ -252,11 +278,7 @@ class BaseFormatCheck(TargetCheck):
     def check_highlight(self, source, unit):
         if self.should_skip(unit):
             return []
-        ret = []
-        match_objects = self.regexp.finditer(source)
-        for match in match_objects:
-            ret.append((match.start(), match.end(), match.group()))
-        return ret
+        return list(self.extract_highlight(source))
 
     def get_description(self, check_obj):
         unit = check_obj.unit
@@ -0,0 +1,34 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright © 2012 - 2020 Michal Čihař <michal@cihar.com>
+#
+# This file is part of Weblate <https://weblate.org/>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+
+from django.db import transaction
+
+from weblate.trans.management.commands import WeblateLangCommand
+
+
+class Command(WeblateLangCommand):
+    help = 'recalculates number of failing checks for units'
+
+    def handle(self, *args, **options):
+        for translation in self.get_translations(**options):
+            self.stdout.write('Processing {}'.format(translation))
+            with transaction.atomic():
+                translation.unit_set.recalculate_failing_checks()
+            translation.invalidate_cache()
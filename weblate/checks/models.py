@@ -23,12 +23,9 @@ import json
 
 from appconf import AppConf
 from django.db import models
-from django.db.models.signals import post_save
-from django.dispatch import receiver
 from django.utils.functional import cached_property
 
 from weblate.checks import CHECKS
-from weblate.utils.decorators import disable_for_loaddata
 
 
 class WeblateChecksConf(AppConf):
@@ -148,20 +145,12 @@ class Check(models.Model):
         return ''
 
     def set_ignore(self, state=True):
-        """Set ignore flag."""
+        """Set ignore flag and update number of failing checks on unit."""
+        from weblate.trans.models import Unit
+
+        if self.ignore == state:
+            return
         self.ignore = state
-        self.save()
-
-
-@receiver(post_save, sender=Check)
-@disable_for_loaddata
-def update_failed_check_flag(sender, instance, created, **kwargs):
-    """Update related unit failed check flag."""
-    if created:
-        return
-    try:
-        instance.unit.update_has_failing_check(
-            has_checks=None if instance.ignore else True, invalidate=True
-        )
-    except IndexError:
-        return
+        self.save(update_fields=['ignore'])
+        Unit.objects.update_failing_checks([self.unit_id])
+        self.unit.translation.invalidate_cache()
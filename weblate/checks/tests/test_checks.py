@@ -205,6 +205,21 @@ class CheckTestCase(SimpleTestCase):
             )
         )
 
+    def test_check_batch(self):
+        if not self.test_failure_1 or self.check is None:
+            return
+        good = MockUnit(None, self.test_good_matching[2], self.default_lang)
+        bad = MockUnit(None, self.test_failure_1[2], self.default_lang)
+        self.assertEqual(
+            self.check.check_target_batch(
+                [
+                    ([self.test_good_matching[0]], [self.test_good_matching[1]], good),
+                    ([self.test_failure_1[0]], [self.test_failure_1[1]], bad),
+                ]
+            ),
+            [bad],
+        )
+
     def test_check_ignore_check(self):
         if self.check is None:
             return
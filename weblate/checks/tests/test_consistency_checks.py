@@ -24,8 +24,9 @@ from django.test import TestCase
 
 from weblate.checks.consistency import PluralsCheck, SamePluralsCheck, TranslatedCheck
 from weblate.checks.tests.test_checks import MockUnit
-from weblate.trans.models import Change
+from weblate.trans.models import Change, Unit
 from weblate.trans.tests.test_views import ViewTestCase
+from weblate.utils.state import STATE_TRANSLATED
 
 
 class PluralsCheckTest(TestCase):
@@ -104,3 +105,66 @@ class TranslatedCheckTest(ViewTestCase):
         unit = self.get_unit()
         unit.change_set.create(action=Change.ACTION_SOURCE_CHANGE)
         self.assertFalse(self.run_check())
+
+    def test_batch(self):
+        self.edit_unit('Hello, world!\n', 'Nazdar svete!\n')
+        self.edit_unit('Hello, world!\n', '')
+        unit = self.get_unit()
+        unit.check_set.all().delete()
+        self.project.run_target_checks()
+        self.assertTrue(unit.check_set.filter(check='translated').exists())
+        # Stale check is removed
+        Unit.objects.filter(pk=unit.pk).update(
+            target='Nazdar svete!\n', state=STATE_TRANSLATED
+        )
+        self.project.run_target_checks()
+        self.assertFalse(unit.check_set.filter(check='translated').exists())
+
+    def test_batch_scope(self):
+        self.edit_unit('Hello, world!\n', 'Nazdar svete!\n')
+        self.edit_unit('Hello, world!\n', '')
+        unit = self.get_unit()
+        unit.check_set.all().delete()
+        # Other strings are not processed
+        self.project.run_target_checks({unit.content_hash + 1})
+        self.assertFalse(unit.check_set.filter(check='translated').exists())
+        self.project.post_update(set(), {unit.translation_id})
+        self.assertFalse(unit.check_set.filter(check='translated').exists())
+        self.project.post_update({unit.content_hash}, {unit.translation_id})
+        self.assertTrue(unit.check_set.filter(check='translated').exists())
+
+    def test_failing_checks(self):
+        self.edit_unit('Hello, world!\n', 'Nazdar svete!\n')
+        self.edit_unit('Hello, world!\n', '')
+        self.project.run_target_checks()
+        unit = self.get_unit()
+        count = unit.active_checks().count()
+        self.assertGreater(count, 0)
+        self.assertEqual(unit.failing_checks, count)
+        self.assertTrue(unit.has_failing_check)
+        # Ignoring check
+        check = unit.active_checks()[0]
+        check.set_ignore()
+        unit.refresh_from_db()
+        self.assertEqual(unit.failing_checks, count - 1)
+        check.set_ignore(False)
+        unit.refresh_from_db()
+        self.assertEqual(unit.failing_checks, count)
+        # Removed by batch check
+        Unit.objects.filter(pk=unit.pk).update(
+            target='Nazdar svete!\n', state=STATE_TRANSLATED
+        )
+        self.project.run_target_checks()
+        unit.refresh_from_db()
+        self.assertEqual(unit.failing_checks, unit.active_checks().count())
+        # Saving outdated instance does not overwrite the number
+        outdated = Unit.objects.get(pk=unit.pk)
+        Unit.objects.filter(pk=unit.pk).update(failing_checks=3)
+        outdated.save(same_content=True, same_state=True)
+        unit.refresh_from_db()
+        self.assertEqual(unit.failing_checks, 3)
+        # Recalculation
+        Unit.objects.filter(pk=unit.pk).update(failing_checks=10)
+        Unit.objects.filter(pk=unit.pk).recalculate_failing_checks()
+        unit.refresh_from_db()
+        self.assertEqual(unit.failing_checks, unit.active_checks().count())
@@ -53,6 +53,14 @@ class PythonFormatCheckTest(CheckTestCase):
     def test_no_format(self):
         self.assertFalse(self.check.check_format('strins', 'string', False))
 
+    def test_source_cache(self):
+        source = '%(name)s cached %d string'
+        expected = (('(name)s', 'd'), True)
+        self.assertEqual(self.check.extract_source(source), expected)
+        hits = self.check.extract_source.cache_info().hits
+        self.assertEqual(self.check.extract_source(source), expected)
+        self.assertEqual(self.check.extract_source.cache_info().hits, hits + 1)
+
     def test_format(self):
         self.assertFalse(self.check.check_format('%s string', '%s string', False))
 
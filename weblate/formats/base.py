@@ -34,6 +34,29 @@ class UnitNotFound(Exception):
     pass
 
 
+def find_plural(language, formula):
+    """Return plural object matching formula, creating it if needed."""
+    from weblate.lang.models import Plural
+
+    if formula is None:
+        return language.plural
+
+    number, equation = formula
+
+    # Find matching one
+    for plural in language.plural_set.iterator():
+        if plural.same_plural(number, equation):
+            return plural
+
+    # Create new one
+    return Plural.objects.create(
+        language=language,
+        source=Plural.SOURCE_GETTEXT,
+        number=number,
+        equation=equation,
+    )
+
+
 class TranslationUnit:
     """Wrapper for translate-toolkit unit.
 
@@ -204,9 +227,13 @@ class TranslationFormat:
     def load(cls, storefile):
         raise NotImplementedError()
 
+    def get_plural_formula(self):
+        """Return number of plurals and plural equation defined in the file."""
+        return None
+
     def get_plural(self, language):
         """Return matching plural object."""
-        return language.plural
+        return find_plural(language, self.get_plural_formula())
 
     @cached_property
     def has_template(self):
@@ -0,0 +1,146 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright © 2012 - 2020 Michal Čihař <michal@cihar.com>
+#
+# This file is part of Weblate <https://weblate.org/>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+"""Parallel parsing of translation files."""
+
+
+import multiprocessing
+from collections import OrderedDict, deque
+
+from weblate.formats.base import find_plural
+from weblate.formats.models import FILE_FORMATS
+
+# Template store parsed in the worker process
+TEMPLATE_STORE = None
+
+
+class UnitSnapshot:
+    """Picklable copy of parsed translation unit.
+
+    It provides subset of TranslationUnit interface used when updating
+    units in the database.
+    """
+
+    def __init__(self, unit):
+        self.id_hash = unit.id_hash
+        self.content_hash = unit.content_hash
+        self.locations = unit.locations
+        self.flags = unit.flags
+        self.notes = unit.notes
+        self.source = unit.source
+        self.target = unit.target
+        self.context = unit.context
+        self.previous_source = unit.previous_source
+        # Only presence of the template is used
+        self.template = True if unit.template is not None else None
+        self._readonly = unit.is_readonly()
+        self._translated = unit.is_translated()
+        # Formats not supporting the flags return fallback
+        self._fuzzy = (unit.is_fuzzy(False), unit.is_fuzzy(True))
+        self._approved = (unit.is_approved(False), unit.is_approved(True))
+
+    def is_readonly(self):
+        return self._readonly
+
+    def is_translated(self):
+        return self._translated
+
+    def is_fuzzy(self, fallback=False):
+        return self._fuzzy[bool(fallback)]
+
+    def is_approved(self, fallback=False):
+        return self._approved[bool(fallback)]
+
+
+class StoreSnapshot:
+    """Picklable copy of parsed translation file."""
+
+    def __init__(self, store):
+        self.plural_formula = store.get_plural_formula()
+        self.content_units = [UnitSnapshot(unit) for unit in store.content_units]
+
+    def get_plural(self, language):
+        """Return matching plural object."""
+        return find_plural(language, self.plural_formula)
+
+
+def init_worker(file_format, template):
+    global TEMPLATE_STORE
+    if template:
+        TEMPLATE_STORE = FILE_FORMATS[file_format].parse(template)
+    else:
+        TEMPLATE_STORE = None
+
+
+def parse_store(file_format, filename, language_code, is_template):
+    store = FILE_FORMATS[file_format].parse(
+        filename, TEMPLATE_STORE, language_code=language_code, is_template=is_template
+    )
+    return StoreSnapshot(store)
+
+
+class ParallelParser:
+    """Parse translation files in process pool.
+
+    Files are parsed in the order they were added and only limited number of
+    parsed files is kept in memory while waiting for the caller.
+    """
+
+    def __init__(self, processes, file_format, template=None):
+        context = multiprocessing.get_context('fork')
+        self.pool = context.Pool(
+            processes, initializer=init_worker, initargs=(file_format, template)
+        )
+        self.file_format = file_format
+        self.window = 2 * processes
+        self.pending = deque()
+        self.results = OrderedDict()
+
+    def add(self, path, filename, language_code, is_template=False):
+        """Queue file for parsing."""
+        self.pending.append((path, (filename, language_code, is_template)))
+        self.fill()
+
+    def fill(self):
+        while self.pending and len(self.results) < self.window:
+            path, args = self.pending.popleft()
+            self.results[path] = self.pool.apply_async(
+                parse_store, (self.file_format,) + args
+            )
+
+    def get(self, path):
+        """Return parsed store snapshot or None if file was not queued.
+
+        Results for files queued before this one which were not fetched are
+        discarded.
+        """
+        if path not in self.results and all(item[0] != path for item in self.pending):
+            return None
+        while path not in self.results:
+            self.results.popitem(last=False)
+            self.fill()
+        while next(iter(self.results)) != path:
+            self.results.popitem(last=False)
+        result = self.results.pop(path)
+        self.fill()
+        return result.get()
+
+    def close(self):
+        self.pool.terminate()
+        self.pool.join()
@@ -20,6 +20,7 @@
 """File format specific behavior."""
 
 import os.path
+import pickle
 import shutil
 from io import BytesIO
 from unittest import SkipTest, TestCase
@@ -30,6 +31,7 @@ from translate.storage.po import pofile
 
 from weblate.formats.auto import AutodetectFormat, detect_filename
 from weblate.formats.models import FILE_FORMATS
+from weblate.formats.parallel import StoreSnapshot
 from weblate.formats.ttkit import (
     AndroidFormat,
     CSVFormat,
@@ -719,3 +721,22 @@ class FlatXMLFormatTest(AutoFormatTest):
     FIND_MATCH = 'Hello World!'
     NEW_UNIT_MATCH = b'<str key="key">Source string</str>\n'
     EXPECTED_FLAGS = ''
+
+
+class StoreSnapshotTest(TestCase):
+    def test_po(self):
+        store = PoFormat(TEST_PO)
+        snapshot = pickle.loads(pickle.dumps(StoreSnapshot(store)))
+        self.assertEqual(store.get_plural_formula(), snapshot.plural_formula)
+        units = list(store.content_units)
+        self.assertEqual(len(units), len(snapshot.content_units))
+        for unit, copy in zip(units, snapshot.content_units):
+            self.assertEqual(unit.id_hash, copy.id_hash)
+            self.assertEqual(unit.content_hash, copy.content_hash)
+            self.assertEqual(unit.source, copy.source)
+            self.assertEqual(unit.target, copy.target)
+            self.assertEqual(unit.context, copy.context)
+            self.assertEqual(unit.flags, copy.flags)
+            self.assertEqual(unit.is_translated(), copy.is_translated())
+            self.assertEqual(unit.is_fuzzy(), copy.is_fuzzy())
+            self.assertEqual(unit.is_approved(True), copy.is_approved(True))
@@ -723,28 +723,15 @@ class PoFormat(TTKitFormat):
         # is merged and relased in the Translate Toolkit
         return bool(self.store.units)
 
-    def get_plural(self, language):
-        """Return matching plural object."""
+    def get_plural_formula(self):
+        """Return number of plurals and plural equation defined in the file."""
         from weblate.lang.models import Plural
 
         header = self.store.parseheader()
         try:
-            number, equation = Plural.parse_formula(header['Plural-Forms'])
+            return Plural.parse_formula(header['Plural-Forms'])
         except (ValueError, KeyError):
-            return super().get_plural(language)
-
-        # Find matching one
-        for plural in language.plural_set.iterator():
-            if plural.same_plural(number, equation):
-                return plural
-
-        # Create new one
-        return Plural.objects.create(
-            language=language,
-            source=Plural.SOURCE_GETTEXT,
-            number=number,
-            equation=equation,
-        )
+            return None
 
     @classmethod
     def untranslate_store(cls, store, language, fuzzy=False):
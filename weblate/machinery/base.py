@@ -22,26 +22,154 @@
 
 import json
 import random
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from datetime import timedelta
 from hashlib import md5
-from urllib.error import HTTPError
-from urllib.request import Request, urlopen
+from threading import Lock
+from time import monotonic
 
+import requests
+from django.conf import settings
 from django.core.cache import cache
 from django.core.exceptions import ImproperlyConfigured
+from django.db import connections, transaction
+from django.utils import timezone
+from django.utils.crypto import get_random_string
 from django.utils.http import urlencode
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 from weblate import USER_AGENT
 from weblate.logger import LOGGER
+from weblate.machinery.models import MachineryResult
 from weblate.utils.errors import report_error
 from weblate.utils.hash import calculate_hash
 from weblate.utils.search import Comparer
 from weblate.utils.site import get_site_url
 
 
+def get_cache_version(scope):
+    """Return current version of cached results for given scope."""
+    key = 'mt-version:{}'.format(scope)
+    version = cache.get(key)
+    if version is None:
+        version = get_random_string(8)
+        cache.set(key, version, None)
+    return version
+
+
+def invalidate_cache(scope):
+    """Invalidate cached results for given scope.
+
+    The invalidation is repeated once current transaction is committed, as
+    results based on the data before the change could be cached meanwhile.
+    """
+    key = 'mt-version:{}'.format(scope)
+    cache.delete(key)
+    transaction.on_commit(lambda: cache.delete(key))
+
+
 class MachineTranslationError(Exception):
     """Generic Machine translation error."""
 
 
+# Number of threads used to query machine translation services from web
+# requests and from batch processing, these use separate pools so that
+# batch jobs do not delay interactive requests
+MAX_WORKERS = 10
+BATCH_WORKERS = 4
+
+EXECUTORS = {}
+EXECUTORS_LOCK = Lock()
+
+# HTTP sessions shared by all instances of a service
+SESSIONS = {}
+SESSIONS_LOCK = Lock()
+
+
+def get_executor(batch=False):
+    with EXECUTORS_LOCK:
+        if batch not in EXECUTORS:
+            EXECUTORS[batch] = ThreadPoolExecutor(
+                max_workers=BATCH_WORKERS if batch else MAX_WORKERS
+            )
+        return EXECUTORS[batch]
+
+
+def run_job(job):
+    try:
+        return job()
+    finally:
+        # Do not leak database connections from worker threads
+        connections.close_all()
+
+
+def run_concurrent(jobs, batch=False):
+    """Run machine translation jobs concurrently.
+
+    The jobs are list of service and callable pairs. Jobs of services which
+    can not be queried from a thread are executed in current thread while
+    others are running. Batch processing should set batch to use separate
+    pool of threads.
+
+    Returns list of result and exception pairs in the order of jobs. Jobs not
+    completed within service deadline end up with MachineTranslationError,
+    results of other jobs are still returned.
+    """
+    # Make sure site is cached, the workers should not access the database
+    get_site_url()
+
+    started = monotonic()
+    futures = [
+        get_executor(batch).submit(run_job, job) if service.concurrent else None
+        for service, job in jobs
+    ]
+    results = []
+    for (service, job), future in zip(jobs, futures):
+        try:
+            if future is None:
+                results.append((job(), None))
+            else:
+                timeout = max(0, started + service.deadline - monotonic())
+                results.append((future.result(timeout=timeout), None))
+        except FutureTimeoutError:
+            results.append(
+                (
+                    None,
+                    MachineTranslationError(
+                        '{}: Timeout after {} seconds'.format(
+                            service.name, service.deadline
+                        )
+                    ),
+                )
+            )
+        except Exception as error:
+            results.append((None, error))
+    return results
+
+
+class ResultStore:
+    """Results from the persistent store for a service and language pair.
+
+    The found results are loaded on creation and downloaded results are
+    written by save, the worker threads only access the dictionaries.
+    """
+
+    def __init__(self, service, source, language, texts):
+        self.service = service
+        self.source = source
+        self.language = language
+        self.found = service.get_stored_results(source, language, texts)
+        self.downloaded = {}
+
+    def save(self):
+        # Copy as thread which exceeded deadline might still add results
+        downloaded = dict(self.downloaded)
+        self.downloaded = {}
+        self.service.store_results(self.source, self.language, downloaded)
+
+
 class MissingConfiguration(ImproperlyConfigured):
     """Exception raised when configuraiton is wrong."""
 
@@ -54,7 +182,22 @@ class MachineTranslation:
     rank_boost = 0
     default_languages = []
     cache_translations = True
+    cache_timeout = 7 * 86400
+    # Whether results can be kept in persistent store, see MT_RESULT_STORE
+    result_store = True
     language_map = {}
+    # Maximal number of strings and their length in single request
+    batch_size = 1
+    batch_chars = None
+    # Timeout for single HTTP request and for whole service query
+    request_timeout = 5.0
+    deadline = 10.0
+    # Whether the service can be queried from a worker thread, services
+    # accessing the database should be queried directly
+    concurrent = True
+    # Number of retries on connection errors and backoff between them
+    retries = 2
+    retry_backoff = 0.5
 
     @classmethod
     def get_rank(cls):
@@ -77,10 +220,74 @@ class MachineTranslation:
     def get_identifier(self):
         return self.mtid
 
-    def authenticate(self, request):
+    def authenticate(self, headers):
         """Hook for backends to allow add authentication headers to request."""
         return
 
+    @property
+    def session(self):
+        """Return HTTP session shared by all instances of the service.
+
+        The session pools connections to the service, so these are kept alive
+        and reused across requests and threads.
+        """
+        with SESSIONS_LOCK:
+            if self.mtid not in SESSIONS:
+                SESSIONS[self.mtid] = self.create_session()
+            return SESSIONS[self.mtid]
+
+    def create_session(self):
+        """Create HTTP session with connection pooling and retries."""
+        # Retry failed connections and gateway errors, but do not retry
+        # read timeouts, these would only make slow service slower
+        retry = Retry(
+            total=self.retries,
+            read=0,
+            status_forcelist=(502, 503, 504),
+            backoff_factor=self.retry_backoff,
+            raise_on_status=False,
+            respect_retry_after_header=False,
+        )
+        adapter = HTTPAdapter(pool_maxsize=settings.MT_POOL_SIZE, max_retries=retry)
+        session = requests.Session()
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        session.headers['User-Agent'] = USER_AGENT
+        return session
+
+    def http_request(self, method, url, **kwargs):
+        """Perform HTTP request using pooled session.
+
+        Raises requests.HTTPError on error status.
+        """
+        session = self.session
+        # Connection pool is used to tell whether new connection was opened,
+        # the counter is not public API of urllib3, so it might be missing
+        pool = session.get_adapter(url).poolmanager.connection_from_url(url)
+        opened = getattr(pool, 'num_connections', None)
+        start = monotonic()
+        response = session.request(
+            method, url, timeout=self.request_timeout, **kwargs
+        )
+        if opened is None:
+            connection = 'unknown'
+        elif getattr(pool, 'num_connections', opened) > opened:
+            connection = 'new'
+        else:
+            connection = 'reused'
+        LOGGER.debug(
+            '%s: %s %s: HTTP %d, %s connection, %.3fs to headers, %.3fs total',
+            self.name,
+            method,
+            url.split('?')[0],
+            response.status_code,
+            connection,
+            response.elapsed.total_seconds(),
+            monotonic() - start,
+        )
+        response.raise_for_status()
+        return response
+
     def json_req(
         self,
         url,
@@ -100,7 +307,7 @@ class MachineTranslation:
             if json_body:
                 params = json.dumps(kwargs)
             else:
-                params = urlencode(kwargs)
+                params = urlencode(kwargs, doseq=True)
         else:
             if json_body:
                 params = '{}'
@@ -115,22 +322,26 @@ class MachineTranslation:
         if params and not http_post:
             url = '?'.join((url, params))
 
-        # Create request object with custom headers
-        request = Request(url)
-        request.add_header('User-Agent', USER_AGENT)
-        request.add_header('Referer', get_site_url())
+        # Custom headers
+        headers = {'Referer': get_site_url()}
+        if json_body:
+            headers['Content-Type'] = 'application/json'
+        elif http_post:
+            headers['Content-Type'] = 'application/x-www-form-urlencoded'
         # Optional authentication
         if not skip_auth:
-            self.authenticate(request)
+            self.authenticate(headers)
 
         # Fire request
         if http_post:
-            handle = urlopen(request, params.encode('utf-8'), timeout=5.0)
+            response = self.http_request(
+                'POST', url, data=params.encode('utf-8'), headers=headers
+            )
         else:
-            handle = urlopen(request, timeout=5.0)
+            response = self.http_request('GET', url, headers=headers)
 
         # Read and possibly convert response
-        text = handle.read()
+        text = response.content
         # Needed for Microsoft
         if text[:3] == b'\xef\xbb\xbf':
             text = text.decode('UTF-8-sig')
@@ -176,6 +387,18 @@ class MachineTranslation:
         """
         raise NotImplementedError()
 
+    def download_batch(self, source, language, texts, units, user):
+        """Download translations for list of strings.
+
+        Should return list of results as returned by download_translations for
+        every string. Services supporting translating multiple strings in single
+        request should override this and set batch_size.
+        """
+        return [
+            self.download_translations(source, language, text, unit, user)
+            for text, unit in zip(texts, units)
+        ]
+
     def convert_language(self, language):
         """Convert language to service specific code."""
         if language in self.language_map:
@@ -233,68 +456,269 @@ class MachineTranslation:
         return cache.set(self.rate_limit_cache, True, 1800)
 
     def is_rate_limit_error(self, exc):
-        if not isinstance(exc, HTTPError):
+        if not isinstance(exc, requests.HTTPError):
             return False
         # Apply rate limiting for following status codes:
         # HTTP 429 Too Many Requests
         # HTTP 401 Unauthorized
         # HTTP 403 Forbidden
         # HTTP 503 Service Unavailable
-        if exc.code in (429, 401, 403, 503):
+        if exc.response.status_code in (429, 401, 403, 503):
             return True
         return False
 
-    def translate_cache_key(self, source, language, text):
+    def translate_cache_key(self, source, language, text, unit, user):
         if not self.cache_translations:
             return None
         return 'mt:{}:{}:{}'.format(
             self.mtid, calculate_hash(source, language), calculate_hash(None, text)
         )
 
-    def translate(self, language, text, unit, user, source=None):
-        """Return list of machine translations."""
-        self.get_supported_languages()
+    def get_language_pair(self, language, unit, source=None):
+        """Return source and target language for the service.
 
+        None is returned if the language combination is not supported.
+        """
         if source is None:
             language = self.convert_language(language)
             source = self.convert_language(
                 unit.translation.component.project.source_language.code
             )
 
-        if not text or self.is_rate_limited() or source == language:
-            return []
+        if source == language:
+            return None
 
         if not self.is_supported(source, language):
             # Try without country code
             source = source.replace('-', '_')
             if '_' in source:
                 source = source.split('_')[0]
-                return self.translate(language, text, unit, user, source)
+                return self.get_language_pair(language, unit, source)
             language = language.replace('-', '_')
             if '_' in language:
                 language = language.split('_')[0]
-                return self.translate(language, text, unit, user, source)
+                return self.get_language_pair(language, unit, source)
             if self.supported_languages_error:
                 raise MachineTranslationError(repr(self.supported_languages_error))
+            return None
+
+        return source, language
+
+    def handle_translation_error(self, exc):
+        if self.is_rate_limit_error(exc):
+            self.set_rate_limit()
+
+        self.report_error(exc, 'Failed to fetch translations from %s')
+        raise MachineTranslationError(self.get_error_message(exc))
+
+    def translate(self, language, text, unit, user, source=None, store=None):
+        """Return list of machine translations.
+
+        The store is result of get_result_store for use in worker threads,
+        when not provided the persistent store is accessed directly.
+        """
+        self.get_supported_languages()
+
+        if not text or self.is_rate_limited():
+            return []
+
+        languages = self.get_language_pair(language, unit, source)
+        if languages is None:
             return []
+        source, language = languages
 
-        cache_key = self.translate_cache_key(source, language, text)
+        cache_key = self.translate_cache_key(source, language, text, unit, user)
         if cache_key:
             result = cache.get(cache_key)
             if result is not None:
                 return result
 
-        try:
-            result = self.download_translations(source, language, text, unit, user)
+        own_store = store is None
+        if own_store:
+            store = self.open_result_store(source, language, [text])
+        if store is not None and text in store.found:
+            result = store.found[text]
+        else:
+            try:
+                result = self.download_translations(
+                    source, language, text, unit, user
+                )
+            except Exception as exc:
+                self.handle_translation_error(exc)
+            if store is not None:
+                store.downloaded[text] = result
+        if own_store and store is not None:
+            store.save()
+
+        if cache_key:
+            cache.set(cache_key, result, self.cache_timeout)
+        return result
+
+    def get_batches(self, texts):
+        """Split strings to chunks processed in single request."""
+        batch = []
+        chars = 0
+        for text in texts:
+            if batch and (
+                len(batch) >= self.batch_size
+                or (self.batch_chars and chars + len(text) > self.batch_chars)
+            ):
+                yield batch
+                batch = []
+                chars = 0
+            batch.append(text)
+            chars += len(text)
+        if batch:
+            yield batch
+
+    def translate_batch(self, language, units, user, store=None):
+        """Return machine translations for source strings of multiple units.
+
+        All units are expected to share the source language. The result is a
+        list with translations for every unit. The store is handled same as
+        in translate.
+        """
+        results = [[] for unit in units]
+        if not units:
+            return results
+
+        self.get_supported_languages()
+        if self.is_rate_limited():
+            return results
+
+        languages = self.get_language_pair(language, units[0])
+        if languages is None:
+            return results
+        source, language = languages
+
+        # Collect strings not found in the cache, every string is
+        # translated only once
+        pending = {}
+        for pos, unit in enumerate(units):
+            text = unit.get_source_plurals()[0]
+            if not text:
+                continue
+            if text in pending:
+                pending[text][2].append(pos)
+                continue
+            cache_key = self.translate_cache_key(source, language, text, unit, user)
             if cache_key:
-                cache.set(cache_key, result, 7 * 86400)
-            return result
-        except Exception as exc:
-            if self.is_rate_limit_error(exc):
-                self.set_rate_limit()
+                result = cache.get(cache_key)
+                if result is not None:
+                    results[pos] = result
+                    continue
+            pending[text] = (unit, cache_key, [pos])
+
+        def set_result(text, result):
+            _unit, cache_key, positions = pending[text]
+            if cache_key:
+                cache.set(cache_key, result, self.cache_timeout)
+            for pos in positions:
+                results[pos] = result
+
+        own_store = store is None
+        if own_store:
+            store = self.open_result_store(source, language, list(pending))
+        stored = store.found if store is not None else {}
+        for text in pending:
+            if text in stored:
+                set_result(text, stored[text])
+
+        missing = [text for text in pending if text not in stored]
+        try:
+            for texts in self.get_batches(missing):
+                try:
+                    translations = self.download_batch(
+                        source,
+                        language,
+                        texts,
+                        [pending[text][0] for text in texts],
+                        user,
+                    )
+                except Exception as exc:
+                    self.handle_translation_error(exc)
+                for text, result in zip(texts, translations):
+                    set_result(text, result)
+                    if store is not None:
+                        store.downloaded[text] = result
+        finally:
+            # Keep results downloaded before failure
+            if own_store and store is not None:
+                store.save()
+
+        return results
+
+    def use_result_store(self):
+        return settings.MT_RESULT_STORE and self.result_store
+
+    def open_result_store(self, source, language, texts):
+        """Look up texts in the persistent store."""
+        if not self.use_result_store() or not texts:
+            return None
+        return ResultStore(self, source, language, texts)
+
+    def get_result_store(self, language, unit, texts, source=None):
+        """Look up texts in the persistent store before querying the service.
 
-            self.report_error(exc, 'Failed to fetch translations from %s')
-            raise MachineTranslationError(self.get_error_message(exc))
+        This is used for services queried from worker threads, which do not
+        access the database. The returned store is passed to translate or
+        translate_batch and its save method has to be called once these are
+        completed. None is returned if the store is not used.
+        """
+        if not self.use_result_store():
+            return None
+        self.get_supported_languages()
+        try:
+            languages = self.get_language_pair(language, unit, source)
+        except MachineTranslationError:
+            # The error is reported when querying the service
+            return None
+        if languages is None:
+            return None
+        return self.open_result_store(languages[0], languages[1], texts)
+
+    def get_stored_results(self, source, language, texts):
+        """Return results found in the persistent store as dictionary."""
+        if not self.use_result_store() or not texts:
+            return {}
+        hashes = {calculate_hash(None, text): text for text in texts}
+        found = MachineryResult.objects.filter(
+            service=self.mtid,
+            source_language=source,
+            target_language=language,
+            text_hash__in=hashes.keys(),
+        )
+        # Usage timestamp is updated at most once a day to avoid writing on
+        # every lookup
+        now = timezone.now()
+        threshold = now - timedelta(days=1)
+        results = {}
+        stale = []
+        for item in found:
+            results[hashes[item.text_hash]] = item.result
+            if item.last_used < threshold:
+                stale.append(item.pk)
+        if stale:
+            MachineryResult.objects.filter(pk__in=stale).update(last_used=now)
+        return results
+
+    def store_results(self, source, language, results):
+        """Store dictionary of results in the persistent store."""
+        if not self.use_result_store() or not results:
+            return
+        MachineryResult.objects.bulk_create(
+            [
+                MachineryResult(
+                    service=self.mtid,
+                    source_language=source,
+                    target_language=language,
+                    text_hash=calculate_hash(None, text),
+                    result=result,
+                )
+                for text, result in results.items()
+            ],
+            ignore_conflicts=True,
+        )
 
     def get_error_message(self, exc):
         return '{0}: {1}'.format(exc.__class__.__name__, str(exc))
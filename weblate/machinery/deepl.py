@@ -34,6 +34,7 @@ class DeepLTranslation(MachineTranslation):
     # This seems to be currently best MT service, so score it a bit
     # better than other ones.
     max_score = 91
+    batch_size = 50
 
     def __init__(self):
         """Check configuration."""
@@ -65,3 +66,26 @@ class DeepLTranslation(MachineTranslation):
             }
             for translation in response['translations']
         ]
+
+    def download_batch(self, source, language, texts, units, user):
+        """Download translations for multiple strings in single request."""
+        response = self.json_req(
+            DEEPL_API,
+            http_post=True,
+            auth_key=settings.MT_DEEPL_KEY,
+            text=texts,
+            source_lang=source,
+            target_lang=language,
+        )
+
+        return [
+            [
+                {
+                    'text': translation['text'],
+                    'quality': self.max_score,
+                    'service': self.name,
+                    'source': text,
+                }
+            ]
+            for text, translation in zip(texts, response['translations'])
+        ]
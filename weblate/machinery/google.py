@@ -19,8 +19,6 @@
 #
 
 
-import json
-
 from django.conf import settings
 
 from weblate.machinery.base import (
@@ -37,6 +35,8 @@ class GoogleTranslation(MachineTranslation):
 
     name = 'Google Translate'
     max_score = 90
+    batch_size = 100
+    batch_chars = 5000
 
     # Map old codes used by Google to new ones used by Weblate
     language_map = {'he': 'iw', 'jv': 'jw', 'nb': 'no'}
@@ -87,12 +87,37 @@ class GoogleTranslation(MachineTranslation):
             }
         ]
 
+    def download_batch(self, source, language, texts, units, user):
+        """Download translations for multiple strings in single request."""
+        response = self.json_req(
+            GOOGLE_API_ROOT,
+            http_post=True,
+            key=settings.MT_GOOGLE_KEY,
+            q=texts,
+            source=source,
+            target=language,
+            format='text',
+        )
+
+        if 'error' in response:
+            raise MachineTranslationError(response['error']['message'])
+
+        return [
+            [
+                {
+                    'text': translation['translatedText'],
+                    'quality': self.max_score,
+                    'service': self.name,
+                    'source': text,
+                }
+            ]
+            for text, translation in zip(texts, response['data']['translations'])
+        ]
+
     def get_error_message(self, exc):
-        if hasattr(exc, 'read'):
-            content = exc.read()
+        if getattr(exc, 'response', None) is not None:
             try:
-                data = json.loads(content)
-                return data['error']['message']
+                return exc.response.json()['error']['message']
             except Exception:
                 pass
 
@@ -0,0 +1,46 @@
+# Generated by Django 3.0.3 on 2020-03-10 10:12
+
+import django.utils.timezone
+from django.db import migrations, models
+
+import weblate.utils.fields
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = []
+
+    operations = [
+        migrations.CreateModel(
+            name="MachineryResult",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("service", models.CharField(max_length=100)),
+                ("source_language", models.CharField(max_length=50)),
+                ("target_language", models.CharField(max_length=50)),
+                ("text_hash", models.BigIntegerField()),
+                ("result", weblate.utils.fields.JSONField(default={})),
+                (
+                    "last_used",
+                    models.DateTimeField(
+                        db_index=True, default=django.utils.timezone.now
+                    ),
+                ),
+            ],
+            options={
+                "unique_together": {
+                    ("service", "source_language", "target_language", "text_hash")
+                }
+            },
+        )
+    ]
@@ -19,7 +19,13 @@
 #
 
 
+from datetime import timedelta
+
 from appconf import AppConf
+from django.db import models
+from django.utils import timezone
+
+from weblate.utils.fields import JSONField
 
 
 class WeblateConf(AppConf):
@@ -77,6 +83,20 @@ class WeblateConf(AppConf):
     NETEASE_KEY = None
     NETEASE_SECRET = None
 
+    # Number of translation memory matches scored by edit distance
+    MEMORY_CANDIDATES = 100
+
+    # Time budget for translation memory lookup in seconds
+    MEMORY_TIMEOUT = 1.0
+
+    # Persistent storage of machine translation results
+    RESULT_STORE = False
+    RESULT_STORE_SIZE = 100000
+    RESULT_STORE_AGE = 90
+
+    # Number of pooled HTTP connections kept alive per service
+    POOL_SIZE = 10
+
     # List of machine translations
     SERVICES = (
         'weblate.machinery.weblatetm.WeblateTranslation',
@@ -85,3 +105,42 @@ class WeblateConf(AppConf):
 
     class Meta:
         prefix = 'MT'
+
+
+class MachineryResult(models.Model):
+    """Stored result of machine translation service.
+
+    The results are looked up before querying the service, the least recently
+    used ones are removed by periodic cleanup.
+    """
+
+    service = models.CharField(max_length=100)
+    source_language = models.CharField(max_length=50)
+    target_language = models.CharField(max_length=50)
+    text_hash = models.BigIntegerField()
+    result = JSONField()
+    last_used = models.DateTimeField(default=timezone.now, db_index=True)
+
+    class Meta:
+        unique_together = (
+            ('service', 'source_language', 'target_language', 'text_hash'),
+        )
+
+    def __str__(self):
+        return '{}: {}-{}'.format(
+            self.service, self.source_language, self.target_language
+        )
+
+    @classmethod
+    def cleanup(cls, size, age):
+        """Remove results not used for age days and keep at most size results."""
+        removed = cls.objects.filter(
+            last_used__lt=timezone.now() - timedelta(days=age)
+        ).delete()[0]
+        cutoff = (
+            cls.objects.order_by('-last_used')
+            .values_list('last_used', flat=True)[size : size + 1]
+        )
+        if cutoff:
+            removed += cls.objects.filter(last_used__lte=cutoff[0]).delete()[0]
+        return removed
@@ -55,7 +55,7 @@ class NeteaseSightTranslation(MachineTranslation):
         """List of supported languages."""
         return ['zh', 'en']
 
-    def authenticate(self, request):
+    def authenticate(self, headers):
         """Hook for backends to allow add authentication headers to request."""
         # Override to add required headers.
 
@@ -66,11 +66,11 @@ class NeteaseSightTranslation(MachineTranslation):
         sign = sign.encode('utf-8')
         sign = sha1(sign).hexdigest()
 
-        request.add_header('Content-Type', 'application/json')
-        request.add_header('appkey', settings.MT_NETEASE_KEY)
-        request.add_header('nonce', nonce)
-        request.add_header('timestamp', timestamp)
-        request.add_header('signature', sign)
+        headers['Content-Type'] = 'application/json'
+        headers['appkey'] = settings.MT_NETEASE_KEY
+        headers['nonce'] = nonce
+        headers['timestamp'] = timestamp
+        headers['signature'] = sign
 
     def download_translations(self, source, language, text, unit, user):
         """Download list of possible translations from a service."""
@@ -20,11 +20,9 @@
 
 import base64
 import json
-from urllib.request import Request, urlopen
 
 from django.conf import settings
 
-from weblate import USER_AGENT
 from weblate.machinery.base import MachineTranslation, MissingConfiguration
 from weblate.utils.site import get_site_url
 
@@ -39,11 +37,11 @@ class SAPTranslationHub(MachineTranslation):
         if settings.MT_SAP_BASE_URL is None:
             raise MissingConfiguration('missing SAP Translation Hub configuration')
 
-    def authenticate(self, request):
+    def authenticate(self, headers):
         """Hook for backends to allow add authentication headers to request."""
         # to access the sandbox
         if settings.MT_SAP_SANDBOX_APIKEY is not None:
-            request.add_header('APIKey', settings.MT_SAP_SANDBOX_APIKEY.encode('utf-8'))
+            headers['APIKey'] = settings.MT_SAP_SANDBOX_APIKEY
 
         # to access the productive API
         if (
@@ -53,11 +51,9 @@ class SAPTranslationHub(MachineTranslation):
             credentials = '{}:{}'.format(
                 settings.MT_SAP_USERNAME, settings.MT_SAP_PASSWORD
             )
-            request.add_header(
-                'Authorization',
-                'Basic '
-                + base64.b64encode(credentials.encode('utf-8')).decode('utf-8'),
-            )
+            headers['Authorization'] = 'Basic ' + base64.b64encode(
+                credentials.encode('utf-8')
+            ).decode('utf-8')
 
     def download_languages(self):
         """Get all available languages from SAP Translation Hub."""
@@ -89,18 +85,17 @@ class SAPTranslationHub(MachineTranslation):
 
         # create the request
         translation_url = settings.MT_SAP_BASE_URL + 'translate'
-        request = Request(translation_url)
-        request.add_header('User-Agent', USER_AGENT.encode('utf-8'))
-        request.add_header('Referer', get_site_url().encode('utf-8'))
-        request.add_header('Content-Type', 'application/json; charset=utf-8')
-        request.add_header('Content-Length', len(request_data_as_bytes))
-        request.add_header('Accept', 'application/json; charset=utf-8')
-        self.authenticate(request)
+        headers = {
+            'Referer': get_site_url(),
+            'Content-Type': 'application/json; charset=utf-8',
+            'Accept': 'application/json; charset=utf-8',
+        }
+        self.authenticate(headers)
 
         # Read and possibly convert response
-        content = (
-            urlopen(request, request_data_as_bytes, timeout=0.5).read().decode('utf-8')
-        )
+        content = self.http_request(
+            'POST', translation_url, data=request_data_as_bytes, headers=headers
+        ).content.decode('utf-8')
         # Replace literal \t
         content = content.strip().replace('\t', '\\t').replace('\r', '\\r')
 
@@ -0,0 +1,37 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright © 2012 - 2020 Michal Čihař <michal@cihar.com>
+#
+# This file is part of Weblate <https://weblate.org/>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+
+
+from django.conf import settings
+
+from weblate.machinery.models import MachineryResult
+from weblate.utils.celery import app
+
+
+@app.task(trail=False)
+def cleanup_machinery_results():
+    MachineryResult.cleanup(settings.MT_RESULT_STORE_SIZE, settings.MT_RESULT_STORE_AGE)
+
+
+@app.on_after_finalize.connect
+def setup_periodic_tasks(sender, **kwargs):
+    sender.add_periodic_task(
+        3600 * 24, cleanup_machinery_results.s(), name='machinery-results-cleanup'
+    )
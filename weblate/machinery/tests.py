@@ -20,18 +20,31 @@
 
 
 import json
+from datetime import timedelta
+from functools import partial
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+from threading import Thread
+from time import sleep
 
 import httpretty
 from botocore.stub import ANY, Stubber
+from django.conf import settings
 from django.test import TestCase
 from django.test.utils import override_settings
+from django.utils import timezone
 from django.utils.encoding import force_text
 
+from weblate.auth.models import Group
 from weblate.checks.tests.test_checks import MockUnit
 from weblate.machinery.apertium import ApertiumAPYTranslation
 from weblate.machinery.aws import AWSTranslation
 from weblate.machinery.baidu import BAIDU_API, BaiduTranslation
-from weblate.machinery.base import MachineTranslationError
+from weblate.machinery.base import (
+    MachineTranslation,
+    MachineTranslationError,
+    run_concurrent,
+)
 from weblate.machinery.deepl import DeepLTranslation
 from weblate.machinery.dummy import DummyTranslation
 from weblate.machinery.glosbe import GlosbeTranslation
@@ -41,6 +54,7 @@ from weblate.machinery.microsoftterminology import (
     MST_API_URL,
     MicrosoftTerminologyService,
 )
+from weblate.machinery.models import MachineryResult
 from weblate.machinery.mymemory import MyMemoryTranslation
 from weblate.machinery.netease import NETEASE_API_ROOT, NeteaseSightTranslation
 from weblate.machinery.saptranslationhub import SAPTranslationHub
@@ -49,7 +63,7 @@ from weblate.machinery.weblatetm import WeblateTranslation
 from weblate.machinery.yandex import YandexTranslation
 from weblate.machinery.youdao import YoudaoTranslation
 from weblate.trans.models.unit import Unit
-from weblate.trans.search import update_fulltext
+from weblate.trans.search import Fulltext
 from weblate.trans.tests.test_views import FixtureTestCase
 from weblate.trans.tests.utils import get_test_file
 from weblate.utils.state import STATE_TRANSLATED
@@ -250,6 +264,79 @@ DEEPL_RESPONSE = b'''{
 }'''
 
 
+class StubHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.startswith('/slow'):
+            sleep(2)
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.end_headers()
+        self.wfile.write(b'{"text": "Ahoj"}')
+
+    def log_message(self, *args):
+        return
+
+
+class StubServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+class StubTranslation(MachineTranslation):
+    """Translation service querying local stub server."""
+
+    name = 'Stub'
+    deadline = 0.5
+    cache_translations = False
+
+    def __init__(self, url):
+        super().__init__()
+        self.url = url
+
+    def download_languages(self):
+        return ('en', 'cs')
+
+    def download_translations(self, source, language, text, unit, user):
+        response = self.json_req(self.url)
+        return [
+            {
+                'text': response['text'],
+                'quality': self.max_score,
+                'service': self.name,
+                'source': text,
+            }
+        ]
+
+
+class ConcurrentTest(TestCase):
+    def setUp(self):
+        self.server = StubServer(('127.0.0.1', 0), StubHandler)
+        self.thread = Thread(target=self.server.serve_forever)
+        self.thread.start()
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.thread.join()
+
+    def get_job(self, path):
+        service = StubTranslation(
+            'http://127.0.0.1:{}/{}'.format(self.server.server_port, path)
+        )
+        service.delete_cache()
+        return (service, partial(service.translate, 'cs', 'Hello', MockUnit(), None))
+
+    def test_deadline(self):
+        results = run_concurrent(
+            [self.get_job('slow'), self.get_job('fast'), self.get_job('fast')]
+        )
+        self.assertIsInstance(results[0][1], MachineTranslationError)
+        expected = [
+            {'text': 'Ahoj', 'quality': 100, 'service': 'Stub', 'source': 'Hello'}
+        ]
+        self.assertEqual(results[1], (expected, None))
+        self.assertEqual(results[2], (expected, None))
+
+
 class MachineTranslationTest(TestCase):
     """Testing of machine translation core."""
 
@@ -293,6 +380,33 @@ class MachineTranslationTest(TestCase):
             [],
         )
 
+    def test_translate_batch(self):
+        machine_translation = self.get_machine(DummyTranslation)
+        results = machine_translation.translate_batch(
+            'cs',
+            [
+                MockUnit(source='Hello, world!'),
+                MockUnit(source='Hello'),
+                MockUnit(source=''),
+                MockUnit(source='Hello, world!'),
+            ],
+            None,
+        )
+        self.assertEqual([len(result) for result in results], [2, 0, 0, 2])
+        self.assertEqual(
+            machine_translation.translate_batch('de', [MockUnit(source='Hello')], None),
+            [[]],
+        )
+
+    def test_batches(self):
+        machine_translation = self.get_machine(DummyTranslation)
+        machine_translation.batch_size = 2
+        machine_translation.batch_chars = 5
+        self.assertEqual(
+            list(machine_translation.get_batches(['a', 'b', 'c', 'dddd', 'eeeeee'])),
+            [['a', 'b'], ['c', 'dddd'], ['eeeeee']],
+        )
+
     def assert_translate(self, machine, lang='cs', word='world', empty=False):
         translation = machine.translate(lang, word, MockUnit(), None)
         self.assertIsInstance(translation, list)
@@ -321,6 +435,73 @@ class MachineTranslationTest(TestCase):
             self.assert_translate(machine, empty=True)
         self.assert_translate(machine, empty=True)
 
+    @httpretty.activate
+    def test_glosbe_retry(self):
+        machine = self.get_machine(GlosbeTranslation)
+        httpretty.register_uri(
+            httpretty.GET,
+            'https://glosbe.com/gapi/translate',
+            responses=[
+                httpretty.Response(body='', status=502),
+                httpretty.Response(body=GLOSBE_JSON),
+            ],
+        )
+        self.assert_translate(machine)
+        self.assertEqual(len(httpretty.latest_requests()), 2)
+
+    @override_settings(MT_RESULT_STORE=True)
+    @httpretty.activate
+    def test_result_store(self):
+        machine = self.get_machine(GlosbeTranslation)
+        httpretty.register_uri(
+            httpretty.GET, 'https://glosbe.com/gapi/translate', body=GLOSBE_JSON
+        )
+        self.assert_translate(machine)
+        self.assertEqual(MachineryResult.objects.count(), 1)
+        # Stored result is used without querying the service
+        httpretty.reset()
+        httpretty.register_uri(
+            httpretty.GET, 'https://glosbe.com/gapi/translate', body='', status=500
+        )
+        self.assert_translate(machine)
+        self.assertEqual(
+            machine.translate_batch('cs', [MockUnit(source='world')], None),
+            [machine.translate('cs', 'world', MockUnit(), None)],
+        )
+        # Store accessed outside of the service query
+        store = machine.get_result_store('cs', MockUnit(), ['world', 'Zkouška'])
+        self.assertEqual(set(store.found), {'world'})
+        httpretty.reset()
+        httpretty.register_uri(
+            httpretty.GET, 'https://glosbe.com/gapi/translate', body=GLOSBE_JSON
+        )
+        machine.translate('cs', 'Zkouška', MockUnit(), None, store=store)
+        self.assertEqual(MachineryResult.objects.count(), 1)
+        store.save()
+        self.assertEqual(MachineryResult.objects.count(), 2)
+
+    def test_result_store_cleanup(self):
+        for text_hash in range(5):
+            MachineryResult.objects.create(
+                service='glosbe',
+                source_language='en',
+                target_language='cs',
+                text_hash=text_hash,
+                result=[],
+                last_used=timezone.now() - timedelta(days=text_hash * 30),
+            )
+        self.assertEqual(MachineryResult.cleanup(2, 100), 3)
+        self.assertEqual(
+            set(MachineryResult.objects.values_list('text_hash', flat=True)), {0, 1}
+        )
+
+    def test_session(self):
+        machine = self.get_machine(GlosbeTranslation)
+        self.assertIs(machine.session, GlosbeTranslation().session)
+        self.assertIsNot(machine.session, DummyTranslation().session)
+        adapter = machine.session.get_adapter('https://glosbe.com/')
+        self.assertEqual(adapter._pool_maxsize, settings.MT_POOL_SIZE)
+
     @httpretty.activate
     def test_glosbe_ratelimit_set(self):
         machine = self.get_machine(GlosbeTranslation)
@@ -682,6 +863,33 @@ class MachineTranslationTest(TestCase):
         )
         self.assert_translate(machine, lang='de', word='Hello')
 
+    @override_settings(MT_DEEPL_KEY='KEY')
+    @httpretty.activate
+    def test_deepl_batch(self):
+        machine = self.get_machine(DeepLTranslation)
+        httpretty.register_uri(
+            httpretty.POST,
+            'https://api.deepl.com/v1/translate',
+            body=json.dumps(
+                {
+                    'translations': [
+                        {'detected_source_language': 'EN', 'text': 'Hallo'},
+                        {'detected_source_language': 'EN', 'text': 'Welt'},
+                    ]
+                }
+            ),
+        )
+        results = machine.translate_batch(
+            'de', [MockUnit(source='Hello'), MockUnit(source='world')], None
+        )
+        self.assertEqual(
+            [[item['text'] for item in result] for result in results],
+            [['Hallo'], ['Welt']],
+        )
+        self.assertEqual(
+            httpretty.last_request().parsed_body['text'], ['Hello', 'world']
+        )
+
     @override_settings(MT_DEEPL_KEY='KEY')
     @httpretty.activate
     def test_cache(self):
@@ -739,23 +947,29 @@ class WeblateTranslationTest(FixtureTestCase):
         )
         self.assertEqual(results, [])
 
-    def test_exists(self):
+    def test_exists(self, cached=False):
         unit = Unit.objects.filter(translation__language_code="cs")[0]
+        if cached:
+            # Populate the cache with empty result
+            self.test_empty()
         # Create fake fulltext entry
         other = unit.translation.unit_set.exclude(pk=unit.pk)[0]
         other.source = unit.source
         other.target = 'Preklad'
         other.state = STATE_TRANSLATED
         other.save()
-        update_fulltext(
-            None,
-            pk=other.pk,
-            source=force_text(unit.source),
-            context=force_text(unit.context),
-            location=force_text(unit.location),
-            target=force_text(other.target),
-            note='',
-            language=force_text(unit.translation.language.code),
+        Fulltext().update_index(
+            [
+                {
+                    'pk': other.pk,
+                    'source': force_text(unit.source),
+                    'context': force_text(unit.context),
+                    'location': force_text(unit.location),
+                    'target': force_text(other.target),
+                    'note': '',
+                    'language': force_text(unit.translation.language.code),
+                }
+            ]
         )
         # Perform lookup
         machine = WeblateTranslation()
@@ -766,3 +980,23 @@ class WeblateTranslationTest(FixtureTestCase):
             self.user,
         )
         self.assertNotEqual(results, [])
+
+    def test_exists_cached(self):
+        # The cached result is invalidated by the translation change
+        self.test_exists(cached=True)
+
+    def test_cache_key_acl(self):
+        machine = WeblateTranslation()
+        unit = Unit.objects.filter(translation__language_code="cs")[0]
+        source = unit.get_source_plurals()[0]
+        key = machine.translate_cache_key('en', 'cs', source, unit, self.user)
+        # The key is built without accessing the database
+        with self.assertNumQueries(0):
+            self.assertEqual(
+                machine.translate_cache_key('en', 'cs', source, unit, self.user), key
+            )
+        # Access control change invalidates the key
+        self.user.groups.add(Group.objects.create(name='Test ACL'))
+        self.assertNotEqual(
+            machine.translate_cache_key('en', 'cs', source, unit, self.user), key
+        )
@@ -19,10 +19,10 @@
 #
 
 
-from urllib.error import HTTPError
 from urllib.parse import quote
 
 from django.conf import settings
+from requests.exceptions import HTTPError
 
 from weblate.machinery.base import MachineTranslation, MissingConfiguration
 
@@ -57,7 +57,7 @@ class TMServerTranslation(MachineTranslation):
             # This will raise exception in DEBUG mode
             data = self.json_req('{0}/languages/'.format(self.url))
         except HTTPError as error:
-            if error.code == 404:
+            if error.response.status_code == 404:
                 return []
             raise
         return [
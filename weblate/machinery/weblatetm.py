@@ -21,8 +21,9 @@
 
 from django.utils.encoding import force_text
 
-from weblate.machinery.base import MachineTranslation
+from weblate.machinery.base import MachineTranslation, get_cache_version
 from weblate.trans.models import Unit
+from weblate.utils.hash import calculate_hash
 
 
 class WeblateTranslation(MachineTranslation):
@@ -30,7 +31,31 @@ class WeblateTranslation(MachineTranslation):
 
     name = 'Weblate'
     rank_boost = 1
-    cache_translations = False
+    cache_timeout = 3600
+    concurrent = False
+    result_store = False
+
+    def translate_cache_key(self, source, language, text, unit, user):
+        """Cache results for the projects accessible by the user.
+
+        The results are invalidated on translation changes in the language
+        and on access control changes.
+        """
+        if not self.cache_translations:
+            return None
+        if user:
+            scope = 'u{}:{}:{}'.format(
+                user.id, int(user.is_superuser), get_cache_version('acl')
+            )
+        else:
+            scope = 'p{}'.format(unit.translation.component.project.id)
+        return 'mt:{}:{}:{}:{}:{}'.format(
+            self.mtid,
+            get_cache_version('weblate:{}'.format(language)),
+            calculate_hash(source, language),
+            scope,
+            calculate_hash(None, text),
+        )
 
     def is_supported(self, source, language):
         """Any language is supported."""
@@ -64,12 +89,11 @@ class WeblateTranslation(MachineTranslation):
             .distinct()
         )
 
-        result = [
-            self.format_unit_match(
-                munit, self.comparer.similarity(text, munit.get_source_plurals()[0])
+        result = []
+        for munit in matching_units:
+            quality = self.comparer.bounded_similarity(
+                text, munit.get_source_plurals()[0], 50
             )
-            for munit in matching_units
-        ]
-        while None in result:
-            result.remove(None)
+            if quality is not None:
+                result.append(self.format_unit_match(munit, quality))
         return result
@@ -20,8 +20,9 @@
 
 
 from weblate.lang.models import Language
-from weblate.machinery.base import MachineTranslation
+from weblate.machinery.base import MachineTranslation, get_cache_version
 from weblate.memory.storage import TranslationMemory, get_category_name
+from weblate.utils.hash import calculate_hash
 
 
 class WeblateMemory(MachineTranslation):
@@ -29,7 +30,9 @@ class WeblateMemory(MachineTranslation):
 
     name = 'Weblate Translation Memory'
     rank_boost = 2
-    cache_translations = False
+    cache_timeout = 3600
+    concurrent = False
+    result_store = False
 
     def convert_language(self, language):
         return Language.objects.get(code=language)
@@ -38,6 +41,24 @@ class WeblateMemory(MachineTranslation):
         """Any language is supported."""
         return True
 
+    def translate_cache_key(self, source, language, text, unit, user):
+        """Cache results for the memory categories used for lookup.
+
+        The results are invalidated on any memory change.
+        """
+        if not self.cache_translations:
+            return None
+        project = unit.translation.component.project
+        return 'mt:{}:{}:{}:{}:{}:{}:{}'.format(
+            self.mtid,
+            get_cache_version('memory'),
+            calculate_hash(source.code, language.code),
+            project.id,
+            int(project.use_shared_tm),
+            user.id if user else 0,
+            calculate_hash(None, text),
+        )
+
     def format_unit_match(self, text, target, similarity, category, origin):
         """Format match to translation service result."""
         return {
@@ -27,7 +27,7 @@ from weblate.utils.management.base import BaseCommand
 class Command(BaseCommand):
     """Command for exporting translation memory."""
 
-    help = 'exports translation memory in JSON format'
+    help = 'exports translation memory in JSON or TMX format'
 
     def add_arguments(self, parser):
         super().add_arguments(parser)
@@ -38,6 +38,16 @@ class Command(BaseCommand):
             type=int,
             help=('Specifies the indent level to use when ' 'pretty-printing output.'),
         )
+        parser.add_argument(
+            '--format',
+            default='json',
+            choices=('json', 'tmx'),
+            help='Output format',
+        )
+        parser.add_argument(
+            '--category', type=int, help='Dump only entries from given category'
+        )
+        parser.add_argument('--origin', help='Dump only entries from given origin')
         parser.add_argument(
             '--backup',
             action='store_true',
@@ -50,5 +60,11 @@ class Command(BaseCommand):
             return
         memory = TranslationMemory()
         self.stdout.ending = None
-        memory.dump(self.stdout, indent=options['indent'])
+        memory.dump(
+            self.stdout,
+            indent=options['indent'],
+            fmt=options['format'],
+            category=options['category'],
+            origin=options['origin'],
+        )
         self.stdout.write('\n')
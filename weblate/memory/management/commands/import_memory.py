@@ -53,7 +53,13 @@ class Command(BaseCommand):
                 )
             }
 
+        def progress(count):
+            self.stdout.write('Imported {} entries'.format(count))
+
         try:
-            TranslationMemory.import_file(None, options['file'], langmap)
+            count = TranslationMemory.import_file(
+                None, options['file'], langmap, progress=progress
+            )
         except MemoryImportError as error:
             raise CommandError('Import failed: {}'.format(error))
+        self.stdout.write('Import completed, {} entries imported'.format(count))
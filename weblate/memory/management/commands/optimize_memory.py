@@ -44,7 +44,7 @@ class Command(BaseCommand):
         memory.empty()
         with memory.writer() as writer:
             for entry in data:
-                writer.add_document(**entry)
+                writer.add_document(**memory.build_document(entry, entry['sources']))
 
     def handle(self, *args, **options):
         """Translation memory cleanup."""
@@ -0,0 +1,20 @@
+# Generated by Django 3.0.3 on 2020-02-28 10:12
+
+from django.db import migrations
+
+
+def upgrade_index(apps, schema_editor):
+    from weblate.memory.storage import TranslationMemory
+
+    TranslationMemory.upgrade_index()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("memory", "0001_squashed_0003_auto_20180321_1554"),
+    ]
+
+    operations = [
+        migrations.RunPython(upgrade_index, migrations.RunPython.noop, elidable=True)
+    ]
@@ -19,20 +19,33 @@
 #
 
 
+import codecs
 import json
 import os.path
+import shutil
+from itertools import islice
+from time import time
+from xml.sax.saxutils import escape, quoteattr
 
+from django.conf import settings
 from django.utils.encoding import force_text
 from django.utils.functional import cached_property
 from django.utils.translation import gettext as _
-from django.utils.translation import pgettext
-from translate.misc.xml_helpers import getXMLlang, getXMLspace
-from translate.storage.tmx import tmxfile
+from django.utils.translation import ngettext, pgettext
+from lxml import etree
+from translate.misc.xml_helpers import getText, getXMLlang, getXMLspace
 from whoosh import qparser, query
+from whoosh.analysis import RegexTokenizer
+from whoosh.collectors import TimeLimit, TimeLimitCollector
 from whoosh.fields import ID, NUMERIC, STORED, TEXT, SchemaClass
+from whoosh.filedb.filestore import FileStorage
+from whoosh.index import EmptyIndexError
 
 from weblate.lang.models import Language
+from weblate.machinery.base import invalidate_cache
+from weblate.utils.data import data_dir
 from weblate.utils.errors import report_error
+from weblate.utils.hash import calculate_hash, hash_to_checksum
 from weblate.utils.index import WhooshIndex
 from weblate.utils.search import Comparer
 
@@ -41,14 +54,134 @@ class MemoryImportError(Exception):
     pass
 
 
-def get_node_data(unit, node):
-    """Generic implementation of LISAUnit.gettarget."""
-    # The language should be present as xml:lang, but in some
-    # cases it's there only as lang
-    return (
-        getXMLlang(node) or node.get('lang'),
-        unit.getNodeText(node, getXMLspace(unit.xmlelement, 'preserve')),
-    )
+def get_localname(element):
+    return etree.QName(element).localname
+
+
+def iter_tmx(fileobj):
+    """Incrementally parse TMX file.
+
+    Yields source language code from the header followed by dictionaries
+    mapping language codes to texts for every translation unit.
+    """
+    header_seen = False
+    for _event, element in etree.iterparse(
+        fileobj, events=('end',), resolve_entities=False, huge_tree=True
+    ):
+        name = get_localname(element)
+        if name == 'header' and not header_seen:
+            header_seen = True
+            yield element.get('srclang')
+        elif name == 'tu':
+            if not header_seen:
+                raise SyntaxError('Missing TMX header')
+            xml_space = getXMLspace(element, 'preserve')
+            translations = {}
+            for node in element:
+                if not isinstance(node.tag, str) or get_localname(node) != 'tuv':
+                    continue
+                lang = getXMLlang(node) or node.get('lang')
+                seg = next(
+                    (
+                        child
+                        for child in node.iter()
+                        if isinstance(child.tag, str)
+                        and get_localname(child) == 'seg'
+                    ),
+                    None,
+                )
+                if seg is None:
+                    continue
+                text = getText(seg, xml_space)
+                if lang and text:
+                    translations[lang] = text
+            yield translations
+        else:
+            continue
+        # Free already processed elements
+        element.clear()
+        while element.getprevious() is not None:
+            del element.getparent()[0]
+    if not header_seen:
+        raise SyntaxError('Missing TMX header')
+
+
+def iter_json(fileobj, chunk_size=65536):
+    """Incrementally parse JSON list."""
+    decoder = json.JSONDecoder()
+    reader = codecs.getincrementaldecoder('utf-8')()
+    buf = ''
+    pos = 0
+    eof = False
+
+    def read():
+        chunk = fileobj.read(chunk_size)
+        if isinstance(chunk, bytes):
+            return reader.decode(chunk, final=not chunk), not chunk
+        return chunk, not chunk
+
+    def skip_whitespace():
+        nonlocal buf, pos, eof
+        while True:
+            while pos < len(buf) and buf[pos].isspace():
+                pos += 1
+            if pos < len(buf) or eof:
+                return
+            buf, eof = read()
+            pos = 0
+
+    skip_whitespace()
+    if buf[pos : pos + 1] != '[':
+        raise ValueError('Expected JSON list')
+    pos += 1
+    skip_whitespace()
+    if buf[pos : pos + 1] == ']':
+        return
+    while True:
+        while True:
+            try:
+                value, end = decoder.raw_decode(buf, pos)
+                # Numbers might continue in next chunk
+                if end < len(buf) or eof:
+                    pos = end
+                    break
+            except ValueError:
+                if eof:
+                    raise
+            chunk, eof = read()
+            buf = buf[pos:] + chunk
+            pos = 0
+        yield value
+        skip_whitespace()
+        separator = buf[pos : pos + 1]
+        pos += 1
+        if separator == ']':
+            return
+        if separator != ',':
+            raise ValueError('Expected separator in JSON list')
+        skip_whitespace()
+
+
+# Number of entries stored in single commit on import
+IMPORT_BATCH = 10000
+# Time to wait for the index lock on import
+IMPORT_LOCK_TIMEOUT = 60
+
+# Number of fulltext matches fetched for every candidate to be scored
+PREFILTER_FACTOR = 10
+
+
+def get_ngrams(text, size=3):
+    """Return set of character n-grams of a string."""
+    text = text.lower()
+    if len(text) <= size:
+        return {text}
+    return {text[pos : pos + size] for pos in range(len(text) - size + 1)}
+
+
+def ngram_similarity(first, second):
+    """Dice coefficient of two n-gram sets."""
+    return 2 * len(first & second) / (len(first) + len(second))
 
 
 CATEGORY_FILE = 1
@@ -71,15 +204,42 @@ def get_category_name(category, origin):
     return text.format(origin)
 
 
+# Fields of imported and exported entries, the checksum and sources are
+# calculated from them when storing
+ENTRY_FIELDS = (
+    'source_language',
+    'target_language',
+    'source',
+    'target',
+    'origin',
+    'category',
+)
+
+
+def get_checksum(source_language, target_language, source, target):
+    """Checksum identifying translation memory entry."""
+    return hash_to_checksum(
+        calculate_hash(
+            None, '\x00'.join((source_language, target_language, source, target))
+        )
+    )
+
+
 class TMSchema(SchemaClass):
-    """Fultext index schema for source and context strings."""
+    """Fultext index schema for source and context strings.
+
+    Every translation is stored once, the categories and origins it belongs
+    to are stored as list of pairs in sources and indexed for filtering.
+    """
 
+    checksum = ID(stored=True, unique=True)
     source_language = ID(stored=True)
     target_language = ID(stored=True)
     source = TEXT(stored=True)
     target = STORED()
-    origin = ID(stored=True)
-    category = NUMERIC(stored=True)
+    origin = ID(analyzer=RegexTokenizer(r'[^\n]+'))
+    category = NUMERIC()
+    sources = STORED()
 
 
 class TranslationMemory(WhooshIndex):
@@ -100,6 +260,11 @@ class TranslationMemory(WhooshIndex):
     def __del__(self):
         self.close()
 
+    @classmethod
+    def cleanup(cls):
+        super().cleanup()
+        invalidate_cache('memory')
+
     @cached_property
     def searcher(self):
         return self.index.searcher()
@@ -136,6 +301,17 @@ class TranslationMemory(WhooshIndex):
             return CATEGORY_FILE
         return category
 
+    @staticmethod
+    def get_origin(filename):
+        """Return origin and format of file to import."""
+        origin = force_text(os.path.basename(filename)).lower()
+        name, extension = os.path.splitext(origin)
+        if extension not in ('.tmx', '.json'):
+            raise MemoryImportError(_('Unsupported file!'))
+        if len(name) > 25:
+            origin = '{}...{}'.format(name[:25], extension)
+        return origin, extension
+
     @classmethod
     def import_file(
         cls,
@@ -146,165 +322,335 @@ class TranslationMemory(WhooshIndex):
         project=None,
         user=None,
         use_file=False,
+        progress=None,
+        filename=None,
     ):
-        origin = force_text(os.path.basename(fileobj.name)).lower()
+        origin, extension = cls.get_origin(filename or fileobj.name)
         category = cls.get_category(category, project, user, use_file)
-        name, extension = os.path.splitext(origin)
-        if len(name) > 25:
-            origin = '{}...{}'.format(name[:25], extension)
         if extension == '.tmx':
-            result = cls.import_tmx(request, fileobj, langmap, category, origin)
-        elif extension == '.json':
-            result = cls.import_json(request, fileobj, category, origin)
+            entries = cls.import_tmx(request, fileobj, langmap, category, origin)
         else:
-            raise MemoryImportError(_('Unsupported file!'))
+            entries = cls.import_json(request, fileobj, category, origin)
+        result = cls().import_entries(entries, progress)
         if not result:
             raise MemoryImportError(_('No valid entries found in the uploaded file!'))
         return result
 
+    def import_entries(self, entries, progress=None, batch_size=IMPORT_BATCH):
+        """Store entries in the index in batches.
+
+        Every batch is committed separately to keep memory usage bounded, the
+        optional progress callback receives number of entries stored so far.
+        When the parsing fails, the error includes number of entries stored
+        before the failure.
+        """
+        found = 0
+        entries = iter(entries)
+        while True:
+            try:
+                batch = list(islice(entries, batch_size))
+            except MemoryImportError as error:
+                if not found:
+                    raise
+                self.refresh()
+                raise MemoryImportError(
+                    ngettext(
+                        '{0} {1} entry was imported before the error.',
+                        '{0} {1} entries were imported before the error.',
+                        found,
+                    ).format(error, found)
+                )
+            if not batch:
+                break
+            with self.index.writer(timeout=IMPORT_LOCK_TIMEOUT) as writer:
+                self.upsert(writer, batch)
+            found += len(batch)
+            if progress is not None:
+                progress(found)
+        if found:
+            self.refresh()
+        return found
+
     @classmethod
     def import_json(cls, request, fileobj, category=None, origin=None):
-        from weblate.memory.tasks import update_memory_task
-
-        content = fileobj.read()
-        try:
-            data = json.loads(force_text(content))
-        except ValueError as error:
-            report_error(error, request, prefix='Failed to parse')
-            raise MemoryImportError(_('Failed to parse JSON file!'))
+        """Generate entries from JSON file."""
         updates = {}
-        fields = cls.SCHEMA().names()
         if category:
             updates = {'category': category, 'origin': origin}
-        found = 0
-        if not isinstance(data, list):
+        try:
+            for entry in iter_json(fileobj):
+                if not isinstance(entry, dict):
+                    raise MemoryImportError(_('Failed to parse JSON file!'))
+                # Apply overrides
+                entry.update(updates)
+                # Ensure there are not extra fields
+                try:
+                    yield {
+                        field: entry[field]
+                        if isinstance(entry[field], int)
+                        else force_text(entry[field])
+                        for field in ENTRY_FIELDS
+                    }
+                except KeyError:
+                    raise MemoryImportError(_('Failed to parse JSON file!'))
+        except ValueError as error:
+            report_error(error, request, prefix='Failed to parse')
             raise MemoryImportError(_('Failed to parse JSON file!'))
-        for entry in data:
-            if not isinstance(entry, dict):
-                raise MemoryImportError(_('Failed to parse JSON file!'))
-            # Apply overrides
-            entry.update(updates)
-            # Ensure all fields are set
-            for field in fields:
-                if not entry.get(field):
-                    continue
-            # Ensure there are not extra fields
-            try:
-                record = {field: entry[field] for field in fields}
-            except KeyError:
-                raise MemoryImportError(_('Failed to parse JSON file!'))
-            update_memory_task.delay(**record)
-            found += 1
-        return found
 
     @classmethod
     def import_tmx(cls, request, fileobj, langmap=None, category=None, origin=None):
-        from weblate.memory.tasks import update_memory_task
-
+        """Generate entries from TMX file."""
         if category is None:
             category = CATEGORY_FILE
+        languages = {}
         try:
-            storage = tmxfile.parsefile(fileobj)
-        except (SyntaxError, AssertionError) as error:
+            units = iter_tmx(fileobj)
+            source_language_code = next(units)
+            source_language = cls.get_language_code(source_language_code, langmap)
+
+            for translations in units:
+                try:
+                    source = translations.pop(source_language_code)
+                except KeyError:
+                    # Skip if source language is not present
+                    continue
+
+                for lang, text in translations.items():
+                    if lang not in languages:
+                        languages[lang] = cls.get_language_code(lang, langmap)
+                    yield {
+                        'source_language': source_language,
+                        'target_language': languages[lang],
+                        'source': source,
+                        'target': text,
+                        'origin': origin,
+                        'category': category,
+                    }
+        except SyntaxError as error:
             report_error(error, request, prefix='Failed to parse')
             raise MemoryImportError(_('Failed to parse TMX file!'))
-        header = next(
-            storage.document.getroot().iterchildren(storage.namespaced("header"))
-        )
-        source_language_code = header.get('srclang')
-        source_language = cls.get_language_code(source_language_code, langmap)
 
-        languages = {}
-        found = 0
-        for unit in storage.units:
-            # Parse translations (translate-toolkit does not care about
-            # languages here, it just picks first and second XML elements)
-            translations = {}
-            for node in unit.getlanguageNodes():
-                lang, text = get_node_data(unit, node)
-                if not lang or not text:
-                    continue
-                translations[lang] = text
-                if lang not in languages:
-                    languages[lang] = cls.get_language_code(lang, langmap)
+    @classmethod
+    def upgrade_index(cls):
+        """Convert index without deduplication to current schema."""
+        storage = FileStorage(data_dir(cls.LOCATION))
+        try:
+            old_index = storage.open_index()
+        except (OSError, EmptyIndexError):
+            return
+        if 'checksum' in old_index.schema:
+            return
+        new_dir = data_dir('{}.new'.format(cls.LOCATION))
+        if os.path.exists(new_dir):
+            shutil.rmtree(new_dir)
+        new_storage = FileStorage(new_dir)
+        new_storage.create()
+        new_index = new_storage.create_index(cls.SCHEMA)
+        with old_index.searcher() as searcher:
+            entries = searcher.documents()
+            while True:
+                batch = list(islice(entries, IMPORT_BATCH))
+                if not batch:
+                    break
+                with new_index.writer() as writer:
+                    cls.upsert(writer, batch)
+        old_index.close()
+        new_index.close()
+        shutil.rmtree(data_dir(cls.LOCATION))
+        os.rename(new_dir, data_dir(cls.LOCATION))
 
-            try:
-                source = translations.pop(source_language_code)
-            except KeyError:
-                # Skip if source language is not present
-                continue
+    @staticmethod
+    def build_document(document, sources):
+        """Create document with given categories and origins."""
+        sources = sorted({tuple(item) for item in sources})
+        return {
+            'checksum': document['checksum'],
+            'source_language': document['source_language'],
+            'target_language': document['target_language'],
+            'source': document['source'],
+            'target': document['target'],
+            'sources': sources,
+            'category': sorted({category for category, _origin in sources}),
+            'origin': '\n'.join(sorted({origin for _category, origin in sources})),
+        }
 
-            for lang, text in translations.items():
-                update_memory_task.delay(
-                    source_language=source_language,
-                    target_language=languages[lang],
-                    source=source,
-                    target=text,
-                    origin=origin,
-                    category=category,
+    @classmethod
+    def upsert(cls, writer, entries):
+        """Add entries to the index, merging them with existing ones.
+
+        The entries have category and origin, entries for same translation
+        end up in single document.
+        """
+        documents = {}
+        for entry in entries:
+            document = {
+                field: force_text(entry[field])
+                for field in (
+                    'source_language',
+                    'target_language',
+                    'source',
+                    'target',
                 )
-                found += 1
-        return found
+            }
+            checksum = get_checksum(**document)
+            if checksum not in documents:
+                documents[checksum] = dict(document, checksum=checksum, sources=set())
+            documents[checksum]['sources'].add(
+                (int(entry['category']), force_text(entry['origin']).strip())
+            )
+
+        updated = False
+        with writer.searcher() as searcher:
+            for checksum, document in documents.items():
+                sources = document['sources']
+                current = searcher.document(checksum=checksum)
+                if current:
+                    current_sources = {tuple(item) for item in current['sources']}
+                    if sources <= current_sources:
+                        # Nothing new
+                        continue
+                    sources |= current_sources
+                writer.update_document(**cls.build_document(document, sources))
+                updated = True
+        if updated:
+            invalidate_cache('memory')
+        return len(documents)
 
     @staticmethod
-    def get_filter(user, project, use_shared, use_file):
-        """Create query to filter categories based on selection."""
+    def get_categories(user, project, use_shared, use_file):
+        """List categories based on selection."""
         # Always include file imported memory
         if use_file:
-            category_filter = [query.Term('category', CATEGORY_FILE)]
+            categories = [CATEGORY_FILE]
         else:
-            category_filter = []
+            categories = []
         # Per user memory
         if user:
-            category_filter.append(
-                query.Term('category', CATEGORY_USER_OFFSET + user.id)
-            )
+            categories.append(CATEGORY_USER_OFFSET + user.id)
         # Private project memory
         if project:
-            category_filter.append(
-                query.Term('category', CATEGORY_PRIVATE_OFFSET + project.id)
-            )
+            categories.append(CATEGORY_PRIVATE_OFFSET + project.id)
         # Shared memory
         if use_shared:
-            category_filter.append(query.Term('category', CATEGORY_SHARED))
-        return query.Or(category_filter)
+            categories.append(CATEGORY_SHARED)
+        return categories
+
+    @classmethod
+    def get_filter(cls, user, project, use_shared, use_file):
+        """Create query to filter categories based on selection."""
+        return query.Or(
+            [
+                query.Term('category', category)
+                for category in cls.get_categories(user, project, use_shared, use_file)
+            ]
+        )
 
     def list_documents(self, user=None, project=None, use_shared=False, use_file=False):
         catfilter = self.get_filter(user, project, use_shared, use_file)
         return self.searcher.search(catfilter, limit=None)
 
     def lookup(self, source_language, target_language, text, user, project, use_shared):
+        categories = self.get_categories(user, project, use_shared, True)
         langfilter = query.And(
             [
                 query.Term('source_language', source_language),
                 query.Term('target_language', target_language),
-                self.get_filter(user, project, use_shared, True),
+                query.Or([query.Term('category', category) for category in categories]),
             ]
         )
-        text_query = self.parser.parse(text)
-        matches = self.searcher.search(text_query, filter=langfilter, limit=20000)
-
+        # The filter is part of the query with constant score to keep ordering,
+        # the filtering collector would bypass the time limit
+        text_query = query.And(
+            [self.parser.parse(text), query.ConstantScoreQuery(langfilter)]
+        )
+        budget = settings.MT_MEMORY_TIMEOUT
+        deadline = time() + budget
+
+        # Find candidates using fulltext
+        collector = TimeLimitCollector(
+            self.searcher.collector(
+                limit=settings.MT_MEMORY_CANDIDATES * PREFILTER_FACTOR
+            ),
+            timelimit=budget,
+            use_alarm=False,
+        )
+        try:
+            self.searcher.search_with_collector(text_query, collector)
+        except TimeLimit:
+            # Use matches found so far
+            pass
+        matches = collector.results()
+
+        # Pick best candidates based on n-grams
+        ngrams = get_ngrams(text)
+        length = len(text)
+        candidates = []
         for match in matches:
-            similarity = self.comparer.similarity(text, match['source'])
-            if similarity < 30:
+            source = match['source']
+            # The edit distance is at least the length difference, so skip
+            # strings which can not reach required similarity
+            if 10 * abs(len(source) - length) > 7 * max(len(source), length):
+                continue
+            candidates.append((ngram_similarity(ngrams, get_ngrams(source)), match))
+        candidates.sort(key=lambda candidate: candidate[0], reverse=True)
+
+        # Score them by edit distance
+        for _score, match in candidates[: settings.MT_MEMORY_CANDIDATES]:
+            if time() > deadline:
+                break
+            similarity = self.comparer.bounded_similarity(text, match['source'], 30)
+            if similarity is None:
+                continue
+            # Report the first matching category in order of preference
+            sources = dict(match['sources'])
+            category = next(
+                (category for category in categories if category in sources), None
+            )
+            if category is None:
                 continue
             yield (
                 match['source'],
                 match['target'],
                 similarity,
-                match['category'],
-                match['origin'],
+                category,
+                sources[category],
             )
 
     def delete(
         self, origin=None, category=None, project=None, user=None, use_file=False
     ):
-        """Delete entries based on filter."""
+        """Delete entries based on filter.
+
+        Documents belonging to other categories or origins are kept.
+        """
         category = self.get_category(category, project, user, use_file)
-        with self.writer() as writer:
-            if origin:
-                return writer.delete_by_term('origin', origin)
-            return writer.delete_by_term('category', category)
+        if origin:
+            term = query.Term('origin', origin)
+
+            def matches(item):
+                return item[1] == origin
+
+        else:
+            term = query.Term('category', category)
+
+            def matches(item):
+                return item[0] == category
+
+        removed = 0
+        with self.writer() as writer, writer.searcher() as searcher:
+            for docnum in list(term.docs(searcher)):
+                document = searcher.stored_fields(docnum)
+                sources = [
+                    tuple(item) for item in document['sources'] if not matches(item)
+                ]
+                removed += len(document['sources']) - len(sources)
+                if sources:
+                    writer.update_document(**self.build_document(document, sources))
+                else:
+                    writer.delete_document(docnum)
+        if removed:
+            invalidate_cache('memory')
+        return removed
 
     def empty(self):
         """Recreates translation memory."""
@@ -315,6 +661,103 @@ class TranslationMemory(WhooshIndex):
     def get_values(self, field):
         return [force_text(x) for x in self.searcher.reader().field_terms(field)]
 
-    def dump(self, handle, indent=2):
-        """Dump memory content to JSON file."""
-        json.dump(list(self.searcher.documents()), handle, indent=indent)
+    def iter_documents(self, category=None, origin=None, **kwargs):
+        """Iterate over stored entries, optionally filtered.
+
+        The keyword arguments are same as for list_documents. Only document
+        numbers of matches are collected, the content is loaded lazily. Every
+        matching category and origin of a document is reported as separate
+        entry.
+        """
+        filters = []
+        categories = None
+        if kwargs:
+            categories = set(self.get_categories(**kwargs))
+            filters.append(self.get_filter(**kwargs))
+        if category is not None:
+            filters.append(query.Term('category', category))
+        if origin is not None:
+            filters.append(query.Term('origin', origin))
+        if filters:
+            documents = (
+                self.searcher.stored_fields(docnum)
+                for docnum in query.And(filters).docs(self.searcher)
+            )
+        else:
+            documents = self.searcher.documents()
+        for document in documents:
+            for item_category, item_origin in document['sources']:
+                if (
+                    (categories is not None and item_category not in categories)
+                    or (category is not None and item_category != category)
+                    or (origin is not None and item_origin != origin)
+                ):
+                    continue
+                yield {
+                    'source_language': document['source_language'],
+                    'target_language': document['target_language'],
+                    'source': document['source'],
+                    'target': document['target'],
+                    'origin': item_origin,
+                    'category': item_category,
+                }
+
+    @staticmethod
+    def export_json(documents, indent=2):
+        """Generate JSON content."""
+        if indent is None:
+            separator = ', '
+            prefix = ''
+            end = ']'
+        else:
+            separator = ','
+            prefix = '\n' + ' ' * indent
+            end = '\n]'
+        yield '['
+        empty = True
+        for document in documents:
+            encoded = json.dumps(document, indent=indent)
+            if indent is not None:
+                encoded = encoded.replace('\n', prefix)
+            yield '{}{}{}'.format('' if empty else separator, prefix, encoded)
+            empty = False
+        yield ']' if empty else end
+
+    @staticmethod
+    def export_tmx(documents):
+        """Generate TMX content."""
+        yield (
+            '<?xml version="1.0" encoding="utf-8"?>\n'
+            '<tmx version="1.4">\n'
+            '<header adminlang="en" srclang="en">\n'
+            '</header>\n'
+            '<body>\n'
+        )
+        for document in documents:
+            yield (
+                '<tu>\n'
+                '<tuv xml:lang={}>\n<seg>{}</seg>\n</tuv>\n'
+                '<tuv xml:lang={}>\n<seg>{}</seg>\n</tuv>\n'
+                '</tu>\n'
+            ).format(
+                quoteattr(document['source_language']),
+                escape(document['source']),
+                quoteattr(document['target_language']),
+                escape(document['target']),
+            )
+        yield '</body>\n</tmx>\n'
+
+    def export(self, fmt='json', indent=2, **kwargs):
+        """Generate memory content in given format.
+
+        The keyword arguments are passed to iter_documents.
+        """
+        documents = self.iter_documents(**kwargs)
+        if fmt == 'tmx':
+            return self.export_tmx(documents)
+        return self.export_json(documents, indent)
+
+    def dump(self, handle, indent=2, fmt='json', **kwargs):
+        """Dump memory content to a file."""
+        for chunk in self.export(fmt, indent, **kwargs):
+            handle.write(chunk)
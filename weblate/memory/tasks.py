@@ -22,9 +22,9 @@
 import os
 from time import sleep
 
+from celery import current_task
 from celery.schedules import crontab
 from celery_batches import Batches
-from django.utils.encoding import force_text
 from whoosh.index import LockError
 
 from weblate.memory.storage import (
@@ -59,6 +59,39 @@ def import_memory(project_id):
         update_memory(None, unit)
 
 
+@app.task(trail=False)
+def import_memory_file(path, filename, project_id=None, user_id=None, use_file=False):
+    """Import uploaded translation memory file.
+
+    The file is removed once processed, the progress is reported based on
+    the position in the file.
+    """
+    from weblate.auth.models import User
+    from weblate.trans.models import Project
+
+    kwargs = {'use_file': use_file}
+    if project_id:
+        kwargs['project'] = Project.objects.get(pk=project_id)
+    if user_id:
+        kwargs['user'] = User.objects.get(pk=user_id)
+    try:
+        size = os.path.getsize(path)
+        with open(path, 'rb') as handle:
+
+            def progress(count):
+                if current_task and current_task.request.id and size:
+                    current_task.update_state(
+                        state='PROGRESS',
+                        meta={'progress': 100 * handle.tell() // size},
+                    )
+
+            return TranslationMemory.import_file(
+                None, handle, progress=progress, filename=filename, **kwargs
+            )
+    finally:
+        os.unlink(path)
+
+
 def update_memory(user, unit):
     component = unit.translation.component
     project = component.project
@@ -69,35 +102,30 @@ def update_memory(user, unit):
     if unit.translation.component.project.contribute_shared_tm:
         categories.append(CATEGORY_SHARED)
 
-    for category in categories:
-        update_memory_task.delay(
-            source_language=project.source_language.code,
-            target_language=unit.translation.language.code,
-            source=unit.source,
-            target=unit.target,
-            origin=component.full_slug,
-            category=category,
-        )
+    update_memory_task.delay(
+        source_language=project.source_language.code,
+        target_language=unit.translation.language.code,
+        source=unit.source,
+        target=unit.target,
+        origin=component.full_slug,
+        categories=categories,
+    )
 
 
 @app.task(trail=False, base=Batches, flush_every=1000, flush_interval=300, bind=True)
 def update_memory_task(self, *args, **kwargs):
-    def fixup_strings(data):
-        result = {}
-        for key, value in data.items():
-            if isinstance(value, int):
-                result[key] = value
-            else:
-                result[key] = force_text(value)
-        return result
+    def expand_categories(data):
+        for item in data:
+            categories = item.get('categories', [item.get('category')])
+            for category in categories:
+                yield dict(item, category=category)
 
     data = extract_batch_kwargs(*args, **kwargs)
 
     memory = TranslationMemory()
     try:
         with memory.writer() as writer:
-            for item in data:
-                writer.add_document(**fixup_strings(item))
+            memory.upsert(writer, expand_categories(data))
     except LockError:
         # Manually handle retries, it doesn't work
         # with celery-batches
@@ -19,16 +19,22 @@
 #
 
 import json
-from io import StringIO
+from io import BytesIO, StringIO
 
 from django.core.management import call_command
 from django.core.management.base import CommandError
 from django.test import SimpleTestCase, TestCase
+from django.test.utils import override_settings
 from django.urls import reverse
 
 from weblate.checks.tests.test_checks import MockUnit
 from weblate.memory.machine import WeblateMemory
-from weblate.memory.storage import CATEGORY_FILE, TranslationMemory
+from weblate.memory.storage import (
+    CATEGORY_FILE,
+    MemoryImportError,
+    TranslationMemory,
+    iter_json,
+)
 from weblate.trans.tests.test_views import FixtureTestCase
 from weblate.trans.tests.utils import get_test_file
 
@@ -45,7 +51,7 @@ TEST_DOCUMENT = {
 def add_document():
     memory = TranslationMemory()
     with memory.writer() as writer:
-        writer.add_document(**TEST_DOCUMENT)
+        memory.upsert(writer, [TEST_DOCUMENT])
 
 
 class MemoryTest(SimpleTestCase):
@@ -59,10 +65,41 @@ class MemoryTest(SimpleTestCase):
         self.assertEqual(memory.doc_count(), 0)
 
     def test_import_json_command(self):
-        call_command('import_memory', get_test_file('memory.json'))
+        output = StringIO()
+        call_command('import_memory', get_test_file('memory.json'), stdout=output)
+        self.assertIn('1 entries imported', output.getvalue())
         memory = TranslationMemory()
         self.assertEqual(memory.doc_count(), 1)
 
+    def test_import_entries(self):
+        memory = TranslationMemory()
+        progress = []
+        result = memory.import_entries(
+            (dict(TEST_DOCUMENT, source=str(i)) for i in range(5)), progress.append
+        )
+        self.assertEqual(result, 5)
+        self.assertEqual(progress, [5])
+        self.assertEqual(memory.doc_count(), 5)
+
+    def test_import_entries_partial(self):
+        def entries():
+            for i in range(3):
+                yield dict(TEST_DOCUMENT, source=str(i))
+            raise MemoryImportError('Failed to parse JSON file!')
+
+        memory = TranslationMemory()
+        with self.assertRaisesRegex(MemoryImportError, '2 entries were imported'):
+            memory.import_entries(entries(), batch_size=2)
+        self.assertEqual(memory.doc_count(), 2)
+
+    def test_iter_json(self):
+        data = [TEST_DOCUMENT, {'source': 'Ahoj světe'}, 123, []]
+        self.assertEqual(
+            list(iter_json(BytesIO(json.dumps(data).encode()), chunk_size=3)), data
+        )
+        with self.assertRaises(ValueError):
+            list(iter_json(BytesIO(b'[1 2]')))
+
     def test_import_broken_json_command(self):
         with self.assertRaises(CommandError):
             call_command('import_memory', get_test_file('memory-broken.json'))
@@ -82,6 +119,34 @@ class MemoryTest(SimpleTestCase):
         data = json.loads(output.getvalue())
         self.assertEqual(data, [TEST_DOCUMENT])
 
+    def test_dump_import(self):
+        add_document()
+        output = StringIO()
+        call_command('dump_memory', stdout=output)
+        TranslationMemory.cleanup()
+        memory = TranslationMemory()
+        entries = list(
+            memory.import_json(None, BytesIO(output.getvalue().encode('utf-8')))
+        )
+        self.assertEqual(entries, [TEST_DOCUMENT])
+        self.assertEqual(memory.import_entries(entries), 1)
+        self.assertEqual(memory.doc_count(), 1)
+
+    def test_dump_filter_command(self):
+        add_document()
+        output = StringIO()
+        call_command('dump_memory', '--origin', 'test', '--indent', '0', stdout=output)
+        self.assertEqual(json.loads(output.getvalue()), [TEST_DOCUMENT])
+        output = StringIO()
+        call_command('dump_memory', '--category', '2', stdout=output)
+        self.assertEqual(json.loads(output.getvalue()), [])
+
+    def test_dump_tmx_command(self):
+        add_document()
+        output = StringIO()
+        call_command('dump_memory', '--format', 'tmx', stdout=output)
+        self.assertIn('<seg>Ahoj</seg>', output.getvalue())
+
     def test_delete_command_error(self):
         with self.assertRaises(CommandError):
             call_command('delete_memory')
@@ -124,7 +189,7 @@ class MemoryTest(SimpleTestCase):
     def add_document(self):
         memory = TranslationMemory()
         with memory.writer() as writer:
-            writer.add_document(**TEST_DOCUMENT)
+            memory.upsert(writer, [TEST_DOCUMENT])
 
     def test_delete(self):
         add_document()
@@ -135,6 +200,23 @@ class MemoryTest(SimpleTestCase):
         memory = TranslationMemory()
         self.assertEqual(memory.doc_count(), 0)
 
+    def test_deduplicate(self):
+        add_document()
+        add_document()
+        memory = TranslationMemory()
+        with memory.writer() as writer:
+            memory.upsert(writer, [dict(TEST_DOCUMENT, category=2, origin='other')])
+        memory = TranslationMemory()
+        self.assertEqual(memory.doc_count(), 1)
+        self.assertEqual(
+            list(memory.iter_documents()),
+            [TEST_DOCUMENT, dict(TEST_DOCUMENT, category=2, origin='other')],
+        )
+        # Removing one origin keeps the other
+        self.assertEqual(memory.delete('other', None), 1)
+        memory = TranslationMemory()
+        self.assertEqual(list(memory.iter_documents()), [TEST_DOCUMENT])
+
     def test_list(self):
         memory = TranslationMemory()
         self.assertEqual(memory.get_values('origin'), [])
@@ -163,6 +245,44 @@ class MemoryDBTest(TestCase):
             ],
         )
 
+    def test_machine_cache(self):
+        add_document()
+        machine_translation = WeblateMemory()
+        unit = MockUnit()
+        self.assertEqual(
+            len(machine_translation.translate('cs', 'Hello', unit, None)), 1
+        )
+        memory = TranslationMemory()
+        with memory.writer() as writer:
+            memory.upsert(writer, [dict(TEST_DOCUMENT, target='Nazdar')])
+        # Memory change invalidates cached results
+        self.assertEqual(
+            len(machine_translation.translate('cs', 'Hello', unit, None)), 2
+        )
+
+    def test_lookup_candidates(self):
+        memory = TranslationMemory()
+        with memory.writer() as writer:
+            memory.upsert(
+                writer,
+                [
+                    dict(TEST_DOCUMENT, source=source)
+                    for source in ('Hello', 'Hello world', 'Hello there world')
+                ],
+            )
+        memory = TranslationMemory()
+        results = memory.lookup('en', 'cs', 'Hello world', None, None, False)
+        self.assertEqual(
+            sorted(result[0] for result in results),
+            ['Hello', 'Hello there world', 'Hello world'],
+        )
+        # Only the closest candidate is scored
+        with override_settings(MT_MEMORY_CANDIDATES=1):
+            results = memory.lookup('en', 'cs', 'Hello world', None, None, False)
+            self.assertEqual(
+                [result[:3] for result in results], [('Hello world', 'Ahoj', 100)]
+            )
+
     def test_import_tmx_command(self):
         call_command('import_memory', get_test_file('memory.tmx'))
         memory = TranslationMemory()
@@ -237,6 +357,18 @@ class MemoryViewTest(FixtureTestCase):
         else:
             self.assertContains(response, 'Failed to parse JSON file')
 
+    def test_machine_unit(self):
+        TranslationMemory.cleanup()
+        add_document()
+        machine_translation = WeblateMemory()
+        unit = self.get_unit()
+        for _dummy in range(2):
+            # Second lookup is served from the cache
+            results = machine_translation.translate(
+                unit.translation.language.code, 'Hello', unit, self.user
+            )
+            self.assertEqual([result['text'] for result in results], ['Ahoj'])
+
     def test_memory_project(self):
         self.test_memory('Number of entries for Test', True, kwargs=self.kw_project)
 
@@ -19,20 +19,25 @@
 #
 
 
+import os
+from tempfile import NamedTemporaryFile
+
+from django.conf import settings
 from django.contrib.auth.decorators import login_required
 from django.core.exceptions import PermissionDenied
-from django.http import JsonResponse
-from django.shortcuts import render
+from django.http import StreamingHttpResponse
 from django.urls import reverse
 from django.utils.decorators import method_decorator
 from django.utils.encoding import force_text
 from django.utils.translation import gettext as _
+from django.utils.translation import ngettext
 from django.views.generic.base import TemplateView
 
 from weblate.memory.forms import DeleteForm, ImportForm, UploadForm
 from weblate.memory.storage import MemoryImportError, TranslationMemory
-from weblate.memory.tasks import import_memory
+from weblate.memory.tasks import import_memory, import_memory_file
 from weblate.utils import messages
+from weblate.utils.data import data_dir
 from weblate.utils.views import ErrorFormView, get_project
 from weblate.wladmin.views import MENU
 
@@ -100,15 +105,49 @@ class UploadView(MemoryFormView):
     def form_valid(self, form):
         if not check_perm(self.request.user, 'memory.edit', self.objects):
             raise PermissionDenied()
+        upload = form.cleaned_data['file']
         try:
-            TranslationMemory.import_file(
-                self.request, form.cleaned_data['file'], **self.objects
-            )
-            messages.success(
-                self.request, _('File processed, the entries will appear shortly.')
-            )
+            _origin, extension = TranslationMemory.get_origin(upload.name)
         except MemoryImportError as error:
             messages.error(self.request, force_text(error))
+            return super().form_valid(form)
+
+        # Store the file for the background import
+        directory = data_dir('cache', 'memory-import')
+        os.makedirs(directory, exist_ok=True)
+        with NamedTemporaryFile(dir=directory, suffix=extension, delete=False) as temp:
+            for chunk in upload.chunks():
+                temp.write(chunk)
+        args = (temp.name, upload.name)
+        kwargs = {
+            'project_id': self.objects['project'].pk
+            if 'project' in self.objects
+            else None,
+            'user_id': self.objects['user'].pk if 'user' in self.objects else None,
+            'use_file': 'use_file' in self.objects,
+        }
+
+        if settings.CELERY_TASK_ALWAYS_EAGER:
+            try:
+                count = import_memory_file(*args, **kwargs)
+                messages.success(
+                    self.request,
+                    ngettext(
+                        'File processed, %d entry was imported.',
+                        'File processed, %d entries were imported.',
+                        count,
+                    )
+                    % count,
+                )
+            except MemoryImportError as error:
+                messages.error(self.request, force_text(error))
+        else:
+            task = import_memory_file.delay(*args, **kwargs)
+            messages.success(
+                self.request,
+                _('File uploaded, the entries will appear shortly.'),
+                'task:{}'.format(task.id),
+            )
         return super().form_valid(form)
 
 
@@ -155,16 +194,13 @@ class DownloadView(MemoryView):
     def get(self, request, *args, **kwargs):
         memory = TranslationMemory()
         fmt = request.GET.get('format', 'json')
-        data = [dict(x) for x in memory.list_documents(**self.objects)]
         if fmt == 'tmx':
-            response = render(
-                request,
-                'memory/dump.tmx',
-                {'data': data},
-                content_type='application/x-tmx',
-            )
+            content_type = 'application/x-tmx'
         else:
             fmt = 'json'
-            response = JsonResponse(data, safe=False)
+            content_type = 'application/json'
+        response = StreamingHttpResponse(
+            memory.export(fmt, indent=None, **self.objects), content_type=content_type
+        )
         response['Content-Disposition'] = CD_TEMPLATE.format(fmt)
         return response
@@ -18,13 +18,34 @@
 # along with this program.  If not, see <https://www.gnu.org/licenses/>.
 #
 
+from collections import defaultdict
+from functools import partial
+from itertools import islice
+from time import monotonic
+
 from celery import current_task
+from django.core.cache import cache
 from django.core.exceptions import PermissionDenied
 from django.db import transaction
 
 from weblate.machinery import MACHINE_TRANSLATION_SERVICES
+from weblate.machinery.base import invalidate_cache, run_concurrent
+from weblate.trans.exceptions import CheckpointLocked
 from weblate.trans.models import Change, Component, Suggestion, Unit
-from weblate.utils.state import STATE_FUZZY, STATE_TRANSLATED
+from weblate.trans.models.unit import NEWLINES
+from weblate.trans.search import get_fulltext
+from weblate.trans.util import split_plural
+from weblate.utils.state import STATE_EMPTY, STATE_FUZZY, STATE_TRANSLATED
+
+# Number of units sent to machine translation and committed at once
+BATCH_SIZE = 100
+
+# How long is the automatic translation progress kept for resuming
+CHECKPOINT_TIMEOUT = 7 * 86400
+
+# How long is the checkpoint locked without progress, it has to be longer
+# than processing of a single chunk
+CHECKPOINT_LOCK_TIMEOUT = 900
 
 
 class AutoTranslate:
@@ -34,7 +55,13 @@ class AutoTranslate:
         self.filter_type = filter_type
         self.mode = mode
         self.updated = 0
+        self.updated_pks = []
+        self.touched_hashes = set()
         self.total = 0
+        self.processed = 0
+        self.started = monotonic()
+        # Total time and number of requests for every service
+        self.latency = defaultdict(lambda: [0, 0])
         self.target_state = STATE_FUZZY if mode == 'fuzzy' else STATE_TRANSLATED
 
     def get_units(self):
@@ -45,8 +72,19 @@ class AutoTranslate:
 
     def set_progress(self, current):
         if current_task and current_task.request.id and self.total:
+            elapsed = monotonic() - self.started
             current_task.update_state(
-                state="PROGRESS", meta={"progress": 100 * current // self.total}
+                state="PROGRESS",
+                meta={
+                    "progress": 100 * current // self.total,
+                    "units_per_second": round(self.processed / elapsed, 1)
+                    if elapsed
+                    else 0,
+                    "latency": {
+                        name: round(total / count, 3)
+                        for name, (total, count) in self.latency.items()
+                    },
+                },
             )
 
     def update(self, unit, state, target):
@@ -56,7 +94,86 @@ class AutoTranslate:
             unit.translate(self.user, target, state, Change.ACTION_AUTO, False)
         self.updated += 1
 
+    def update_bulk(self, updates):
+        """Store translations of multiple units.
+
+        This is counterpart of update for many units at once, the units are
+        saved, checked and indexed in bulk and their changes are created in
+        bulk as well. The batch checks and flags are updated in post_process.
+        """
+        translation = self.translation
+        if self.mode == 'suggest' or translation.is_source or translation.is_template:
+            for unit, state, target in updates:
+                if unit.state != state or unit.target != target:
+                    self.update(unit, state, target)
+            return
+
+        units = []
+        changes = []
+        for unit, state, target in updates:
+            # Newlines fixup
+            if 'dos-eol' in unit.all_flags:
+                target = NEWLINES.sub('\r\n', target)
+            if not max(split_plural(target)):
+                state = STATE_EMPTY
+            # No save if translation is same
+            if unit.state == state and unit.target == target:
+                continue
+            changes.append(
+                Change(
+                    unit=unit,
+                    action=Change.ACTION_AUTO,
+                    user=self.user,
+                    author=self.user,
+                    target=target,
+                    old=unit.target,
+                )
+            )
+            unit.target = target
+            unit.state = unit.original_state = state
+            units.append(unit)
+
+        if not units:
+            return
+
+        # Commit pending changes of other authors
+        pending = [unit.pk for unit in units if unit.pending]
+        if (
+            pending
+            and Change.objects.content()
+            .filter(unit__in=pending)
+            .exclude(author=self.user)
+            .exists()
+        ):
+            translation.commit_pending('pending unit', self.user, force=True)
+
+        for unit in units:
+            unit.pending = True
+        Unit.objects.bulk_update(
+            units, ['target', 'state', 'original_state', 'pending'], batch_size=500
+        )
+        Change.objects.create_bulk(changes)
+        translation.run_checks(units)
+        get_fulltext().update_index_units(units)
+
+        self.updated += len(units)
+        self.updated_pks.extend(unit.pk for unit in units)
+        self.touched_hashes.update(unit.content_hash for unit in units)
+
     def post_process(self):
+        if self.updated_pks:
+            project = self.translation.component.project
+            project.post_update(self.touched_hashes, {self.translation.pk})
+            # Enforced checks revert the state to needs editing (fuzzy)
+            enforced = self.translation.component.enforced_checks
+            if enforced:
+                for offset in range(0, len(self.updated_pks), 500):
+                    Unit.objects.filter(
+                        pk__in=self.updated_pks[offset : offset + 500],
+                        state__gte=STATE_TRANSLATED,
+                        check__check__in=enforced,
+                    ).update(state=STATE_FUZZY, original_state=STATE_FUZZY)
+            invalidate_cache('weblate:{}'.format(self.translation.language.code))
         if self.updated > 0:
             self.translation.invalidate_cache()
             if self.user:
@@ -89,80 +206,209 @@ class AutoTranslate:
         units = self.get_units().filter(source__in=sources.values("source"))
         self.total = units.count()
 
-        for pos, unit in enumerate(units.select_for_update().iterator()):
-            # Get first matching entry
-            update = sources.filter(source=unit.source)[0]
-            # No save if translation is same
-            if unit.state == update.state and unit.target == update.target:
-                continue
-            # Copy translation
-            self.update(unit, update.state, update.target)
-            self.set_progress(pos / 2)
+        # Best translation for every string, the translations with higher
+        # state are preferred
+        translations = {}
+        for source_text, state, target in (
+            sources.filter(source__in=units.values("source"))
+            .order_by("-state", "pk")
+            .values_list("source", "state", "target")
+            .iterator()
+        ):
+            if source_text not in translations:
+                translations[source_text] = (state, target)
+
+        units = units.select_for_update().iterator()
+        pos = 0
+        while True:
+            batch = list(islice(units, BATCH_SIZE))
+            if not batch:
+                break
+            # The source match is case sensitive here, but might not be in the
+            # database (depending on collation)
+            self.update_bulk(
+                [
+                    (unit,) + translations[unit.source]
+                    for unit in batch
+                    if unit.source in translations
+                ]
+            )
+            pos += len(batch)
+            self.processed += len(batch)
+            self.set_progress(pos)
 
         self.post_process()
 
-    def fetch_mt(self, engines, threshold):
-        """Get the translations."""
-        translations = {}
+    def translate_batch(self, service, units, store=None):
+        """Query machine translation service and record its latency."""
+        start = monotonic()
+        try:
+            return service.translate_batch(
+                self.translation.language.code, units, self.user, store=store
+            )
+        finally:
+            latency = self.latency[service.name]
+            latency[0] += monotonic() - start
+            latency[1] += 1
 
-        for pos, unit in enumerate(self.get_units().iterator()):
-            # a list to store all found translations
-            max_quality = threshold - 1
-            translation = None
+    def fetch_mt(self, services, threshold, units):
+        """Get the translations for given units.
 
-            # Run engines with higher maximal score first
-            engines = sorted(
-                engines,
-                key=lambda x: MACHINE_TRANSLATION_SERVICES[x].get_rank(),
-                reverse=True,
-            )
-            for engine in engines:
-                translation_service = MACHINE_TRANSLATION_SERVICES[engine]
-
-                # Skip service if it can not provide better results.
-                # Typically we skip machine translation when we have
-                # a terminology match.
-                if max_quality >= translation_service.max_score:
-                    continue
-
-                result = translation_service.translate(
-                    self.translation.language.code,
-                    unit.get_source_plurals()[0],
-                    unit,
-                    self.user,
-                )
+        The services are queried in the order of their maximal score, so
+        that services which can not provide better results are skipped.
+        The services accessing the database are queried serially, services
+        with same maximal score are queried concurrently.
+        """
+        translations = {}
+        max_quality = {unit.pk: threshold - 1 for unit in units}
+
+        def get_pending(service):
+            # Skip units where service can not provide better results.
+            # Typically we skip machine translation when we have
+            # a terminology match.
+            return [unit for unit in units if max_quality[unit.pk] < service.max_score]
 
+        def process_results(units, results):
+            for unit, result in zip(units, results):
                 for item in result:
-                    if item["quality"] > max_quality:
-                        max_quality = item["quality"]
-                        translation = item["text"]
+                    if item["quality"] > max_quality[unit.pk]:
+                        max_quality[unit.pk] = item["quality"]
+                        translations[unit.pk] = item["text"]
 
-                # Break if we can't get better match
-                if max_quality == 100:
-                    break
+        for service in services:
+            if not service.concurrent:
+                pending = get_pending(service)
+                if pending:
+                    process_results(pending, self.translate_batch(service, pending))
 
-            if translation is None:
-                continue
+        tiers = defaultdict(list)
+        for service in services:
+            if service.concurrent:
+                tiers[service.max_score].append(service)
 
-            translations[unit.pk] = translation
-            self.set_progress(pos / 2)
+        for max_score in sorted(tiers, reverse=True):
+            jobs = []
+            stores = []
+            for service in tiers[max_score]:
+                pending = get_pending(service)
+                if pending:
+                    # Persistent store is accessed here as the threads do not
+                    # use database
+                    store = service.get_result_store(
+                        self.translation.language.code,
+                        pending[0],
+                        [unit.get_source_plurals()[0] for unit in pending],
+                    )
+                    job = partial(self.translate_batch, service, pending, store)
+                    jobs.append((service, pending, job))
+                    stores.append(store)
+            results = run_concurrent(
+                [(service, job) for service, _units, job in jobs], batch=True
+            )
+            for store in stores:
+                if store is not None:
+                    store.save()
+            for (service, pending, _job), (result, error) in zip(jobs, results):
+                if error is None:
+                    process_results(pending, result)
+                else:
+                    # Failing or too slow services are skipped for this batch
+                    self.translation.log_warning(
+                        "machine translation using %s failed: %s", service.name, error
+                    )
 
         return translations
 
+    def get_checkpoint_key(self):
+        if current_task and current_task.request.id:
+            return "auto-translate-checkpoint:{}".format(current_task.request.id)
+        return None
+
     def process_mt(self, engines, threshold):
-        """Perform automatic translation based on machine translation."""
-        self.total = self.get_units().count()
-        translations = self.fetch_mt(engines, threshold)
-
-        with transaction.atomic():
-            # Perform the translation
-            for pos, unit in enumerate(self.get_units().select_for_update().iterator()):
-                # Copy translation
-                try:
-                    self.update(unit, self.target_state, translations[unit.pk])
-                except KeyError:
-                    # Probably new unit, ignore it for now
-                    continue
-                self.set_progress((self.total / 2) + (pos / 2))
-
-            self.post_process()
+        """Perform automatic translation based on machine translation.
+
+        The units are processed in chunks, every chunk is committed separately
+        and the progress is stored in a checkpoint. When the task is
+        interrupted and delivered again, it continues after the last
+        committed chunk. The checkpoint is locked while processing, so that
+        the task delivered again while still running is not processed twice,
+        CheckpointLocked is raised in that case. The finished state is kept in
+        the checkpoint as well, so that the task is not processed again.
+        """
+        # Run engines with higher maximal score first
+        services = sorted(
+            (MACHINE_TRANSLATION_SERVICES[engine] for engine in engines),
+            key=lambda service: service.get_rank(),
+            reverse=True,
+        )
+
+        # Make sure related objects are loaded before using them in threads
+        self.translation.component.project.source_language
+
+        units = self.get_units().order_by("pk")
+        done = 0
+        checkpoint_key = self.get_checkpoint_key()
+        if checkpoint_key:
+            lock_key = "{}:lock".format(checkpoint_key)
+            if not cache.add(lock_key, True, CHECKPOINT_LOCK_TIMEOUT):
+                raise CheckpointLocked()
+            checkpoint = cache.get(checkpoint_key)
+            if checkpoint and checkpoint.get("finished"):
+                cache.delete(lock_key)
+                self.updated = checkpoint["updated"]
+                return
+            if checkpoint:
+                units = units.filter(pk__gt=checkpoint["pk"])
+                done = checkpoint["done"]
+                self.updated = checkpoint["updated"]
+                self.updated_pks = checkpoint["updated_pks"]
+                self.touched_hashes = checkpoint["touched_hashes"]
+        self.total = done + units.count()
+
+        try:
+            units = units.iterator()
+            while True:
+                batch = list(islice(units, BATCH_SIZE))
+                if not batch:
+                    break
+                translations = self.fetch_mt(services, threshold, batch)
+
+                with transaction.atomic():
+                    locked = self.get_units().filter(pk__in=list(translations))
+                    self.update_bulk(
+                        [
+                            (unit, self.target_state, translations[unit.pk])
+                            for unit in locked.select_for_update()
+                        ]
+                    )
+
+                done += len(batch)
+                self.processed += len(batch)
+                if checkpoint_key:
+                    cache.set(
+                        checkpoint_key,
+                        {
+                            "pk": batch[-1].pk,
+                            "done": done,
+                            "updated": self.updated,
+                            "updated_pks": self.updated_pks,
+                            "touched_hashes": self.touched_hashes,
+                        },
+                        CHECKPOINT_TIMEOUT,
+                    )
+                    # Extend the lock while making progress
+                    cache.set(lock_key, True, CHECKPOINT_LOCK_TIMEOUT)
+                self.set_progress(done)
+
+            with transaction.atomic():
+                self.post_process()
+
+            if checkpoint_key:
+                cache.set(
+                    checkpoint_key,
+                    {"finished": True, "updated": self.updated},
+                    CHECKPOINT_TIMEOUT,
+                )
+        finally:
+            if checkpoint_key:
+                cache.delete(lock_key)
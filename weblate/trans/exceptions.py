@@ -21,3 +21,7 @@
 
 class FileParseError(Exception):
     """Generic error for parsing."""
+
+
+class CheckpointLocked(Exception):
+    """Automatic translation checkpoint is locked by other task."""
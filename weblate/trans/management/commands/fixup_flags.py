@@ -30,8 +30,7 @@ class Command(WeblateLangCommand):
                 unit.update_has_suggestion()
             if unit.has_comment:
                 unit.update_has_comment()
-            if unit.has_failing_check:
-                unit.update_has_failing_check()
 
         for translation in self.get_translations(**options):
+            translation.unit_set.recalculate_failing_checks()
             translation.invalidate_cache()
@@ -21,7 +21,7 @@
 from weblate.lang.models import Language
 from weblate.trans.management.commands import WeblateComponentCommand
 from weblate.trans.models import Unit
-from weblate.trans.search import Fulltext
+from weblate.trans.search import Fulltext, get_fulltext
 from weblate.trans.tasks import optimize_fulltext
 
 
@@ -106,7 +106,10 @@ class Command(WeblateComponentCommand):
         if options['optimize']:
             optimize_fulltext()
             return
-        fulltext = Fulltext()
+        fulltext = get_fulltext()
+        if not isinstance(fulltext, Fulltext):
+            self.stdout.write('Fulltext index is maintained by the database')
+            return
         # Optionally rebuild indices from scratch
         if options['clean'] or options['all']:
             fulltext.cleanup()
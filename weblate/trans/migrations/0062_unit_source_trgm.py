@@ -0,0 +1,29 @@
+# Generated by Django 3.0.3 on 2020-02-25 09:14
+
+from django.db import migrations
+
+
+def create_index(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")
+        if cursor.fetchone() is None:
+            return
+    schema_editor.execute(
+        "CREATE INDEX IF NOT EXISTS trans_unit_source_trgm "
+        "ON trans_unit USING GIN (source gin_trgm_ops)"
+    )
+
+
+def drop_index(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    schema_editor.execute("DROP INDEX IF EXISTS trans_unit_source_trgm")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [("trans", "0061_auto_20200218_1108")]
+
+    operations = [migrations.RunPython(create_index, drop_index, elidable=True)]
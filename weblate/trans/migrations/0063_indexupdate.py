@@ -0,0 +1,29 @@
+# Generated by Django 3.0.3 on 2020-02-26 13:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [("trans", "0062_unit_source_trgm")]
+
+    operations = [
+        migrations.CreateModel(
+            name="IndexUpdate",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("unitid", models.IntegerField()),
+                ("language_code", models.CharField(blank=True, max_length=50)),
+                ("to_delete", models.BooleanField(default=False)),
+                ("timestamp", models.DateTimeField(auto_now_add=True)),
+            ],
+        )
+    ]
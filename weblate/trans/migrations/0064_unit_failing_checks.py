@@ -0,0 +1,40 @@
+# Generated by Django 3.0.3 on 2020-03-02 10:12
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def count_failing_checks(apps, schema_editor):
+    db_alias = schema_editor.connection.alias
+
+    Unit = apps.get_model("trans", "Unit")
+    Check = apps.get_model("checks", "Check")
+
+    active = (
+        Check.objects.using(db_alias)
+        .filter(unit=OuterRef("pk"), ignore=False)
+        .order_by()
+        .values("unit")
+        .annotate(count=Count("pk"))
+        .values("count")
+    )
+    Unit.objects.using(db_alias).update(
+        failing_checks=Coalesce(Subquery(active, output_field=models.IntegerField()), 0)
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [("trans", "0063_indexupdate"), ("checks", "0003_auto_20191212_1441")]
+
+    operations = [
+        migrations.AddField(
+            model_name="unit",
+            name="failing_checks",
+            field=models.IntegerField(default=0),
+        ),
+        migrations.RunPython(
+            count_failing_checks, migrations.RunPython.noop, elidable=True
+        ),
+    ]
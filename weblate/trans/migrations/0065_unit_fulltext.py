@@ -0,0 +1,35 @@
+# Generated by Django 3.0.3 on 2020-03-02 10:21
+
+from django.db import migrations
+
+# Fields searched by weblate.trans.search.DatabaseFulltext, the index
+# expressions have to match the queries it generates
+FIELDS = ("source", "context", "location", "target", "note")
+
+
+def create_index(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    for field in FIELDS:
+        schema_editor.execute(
+            "CREATE INDEX IF NOT EXISTS trans_unit_{0}_fulltext ON trans_unit "
+            "USING GIN (to_tsvector('simple'::regconfig, COALESCE({0}, '')))".format(
+                field
+            )
+        )
+
+
+def drop_index(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    for field in FIELDS:
+        schema_editor.execute(
+            "DROP INDEX IF EXISTS trans_unit_{}_fulltext".format(field)
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [("trans", "0064_unit_failing_checks")]
+
+    operations = [migrations.RunPython(create_index, drop_index, elidable=True)]
@@ -33,6 +33,7 @@ from weblate.trans.models.comment import Comment
 from weblate.trans.models.component import Component
 from weblate.trans.models.componentlist import AutoComponentList, ComponentList
 from weblate.trans.models.dictionary import Dictionary
+from weblate.trans.models.indexupdate import IndexUpdate
 from weblate.trans.models.label import Label
 from weblate.trans.models.project import Project
 from weblate.trans.models.shaping import Shaping
@@ -62,6 +63,7 @@ __all__ = [
     'Alert',
     'Shaping',
     'Label',
+    'IndexUpdate',
 ]
 
 
@@ -77,6 +79,7 @@ def project_post_delete(sender, instance, **kwargs):
     """Handler to delete (sub)project directory on project deletion."""
     # Invalidate stats
     instance.stats.invalidate()
+    instance.stats.delete()
 
     # Remove directory
     delete_object_dir(instance)
@@ -87,12 +90,25 @@ def component_post_delete(sender, instance, **kwargs):
     """Handler to delete (sub)project directory on project deletion."""
     # Invalidate stats
     instance.stats.invalidate()
+    instance.stats.delete()
 
     # Do not delete linked components
     if not instance.is_repo_link:
         delete_object_dir(instance)
 
 
+@receiver(post_delete, sender=Translation)
+def translation_post_delete(sender, instance, **kwargs):
+    """Handler to remove stored stats on translation deletion."""
+    instance.stats.delete()
+
+
+@receiver(post_delete, sender=ComponentList)
+def componentlist_post_delete(sender, instance, **kwargs):
+    """Handler to remove stored stats on component list deletion."""
+    instance.stats.delete()
+
+
 @receiver(post_save, sender=Unit)
 @disable_for_loaddata
 def update_source(sender, instance, **kwargs):
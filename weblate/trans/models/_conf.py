@@ -53,6 +53,13 @@ class WeblateConf(AppConf):
     # Minimal number of similar messages to show
     SIMILAR_MESSAGES = 5
 
+    # Fulltext search backend
+    FULLTEXT_BACKEND = 'weblate.trans.search.Fulltext'
+
+    # Number of processes used to parse translation files, parallel
+    # parsing is disabled for values lower than 2
+    PARSE_PROCESSES = 0
+
     # Enable lazy commits
     COMMIT_PENDING_HOURS = 24
 
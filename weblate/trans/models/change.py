@@ -19,7 +19,7 @@
 #
 
 from django.conf import settings
-from django.db import models, transaction
+from django.db import connections, models, transaction
 from django.db.models import Count, Q
 from django.utils import timezone
 from django.utils.translation import gettext as _
@@ -152,6 +152,35 @@ class ChangeManager(models.Manager):
             user = None
         return super().create(user=user, **kwargs)
 
+    def create_bulk(self, changes):
+        """Create multiple changes at once.
+
+        This is counterpart of saving the changes one by one for bulk
+        operations, it fills in related objects and triggers notifications.
+        Databases not returning primary keys from bulk insert save the
+        changes one by one, as the notifications need them.
+        """
+        from weblate.accounts.tasks import notify_change
+
+        for change in changes:
+            if change.user is not None and not change.user.is_authenticated:
+                change.user = None
+        if not connections[self.db].features.can_return_rows_from_bulk_insert:
+            for change in changes:
+                change.save()
+            return
+
+        for change in changes:
+            change.fill_in_related()
+        self.bulk_create(changes, batch_size=500)
+        pks = [change.pk for change in changes]
+
+        def notify():
+            for pk in pks:
+                notify_change.delay(pk)
+
+        transaction.on_commit(notify)
+
 
 class Change(models.Model, UserDisplayMixin):
     ACTION_UPDATE = 0
@@ -519,9 +548,7 @@ class Change(models.Model, UserDisplayMixin):
 
         return ''
 
-    def save(self, *args, **kwargs):
-        from weblate.accounts.tasks import notify_change
-
+    def fill_in_related(self):
         if self.unit:
             self.translation = self.unit.translation
         if self.translation:
@@ -530,5 +557,10 @@ class Change(models.Model, UserDisplayMixin):
             self.project = self.component.project
         if self.dictionary:
             self.project = self.dictionary.project
+
+    def save(self, *args, **kwargs):
+        from weblate.accounts.tasks import notify_change
+
+        self.fill_in_related()
         super().save(*args, **kwargs)
         transaction.on_commit(lambda: notify_change.delay(self.pk))
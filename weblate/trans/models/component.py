@@ -44,6 +44,7 @@ from django.utils.translation import gettext_lazy, ngettext
 
 from weblate.checks.flags import Flags
 from weblate.formats.models import FILE_FORMATS
+from weblate.formats.parallel import ParallelParser
 from weblate.lang.models import Language
 from weblate.trans.defines import (
     COMPONENT_NAME_LENGTH,
@@ -517,6 +518,7 @@ class Component(models.Model, URLMixin, PathMixin):
         self.logs = []
         self.translations_count = None
         self.translations_progress = 0
+        self.parallel_parser = None
 
     @cached_property
     def update_key(self):
@@ -611,7 +613,8 @@ class Component(models.Model, URLMixin, PathMixin):
     def preload_sources(self):
         """Preload source objects to improve performance on load."""
         self._sources = {
-            source.id_hash: source for source in self.source_translation.unit_set.all()
+            source.id_hash: source
+            for source in self.source_translation.unit_set.prefetch_related('labels')
         }
         self._sources_prefetched = True
 
@@ -1246,11 +1249,62 @@ class Component(models.Model, URLMixin, PathMixin):
             return [self.template] + sorted(matches)
         return sorted(matches)
 
+    def get_git_blob_hash(self, filename):
+        """Return current VCS blob hash for translation file."""
+        ret = self.repository.get_object_hash(os.path.join(self.full_path, filename))
+
+        if not self.has_template():
+            return ret
+
+        return ",".join([ret, self.repository.get_object_hash(self.template)])
+
+    def start_parallel_parser(self, matches, force=False, langs=None):
+        """Start parsing of changed translation files in process pool."""
+        self.parallel_parser = None
+        if settings.PARSE_PROCESSES < 2 or len(matches) < 2:
+            return
+        revisions = dict(self.translation_set.values_list("filename", "revision"))
+        paths = []
+        for path in matches:
+            code = self.get_lang_code(path)
+            if langs is not None and code not in langs:
+                continue
+            if not force and revisions.get(path) == self.get_git_blob_hash(path):
+                continue
+            paths.append((path, code))
+        if len(paths) < 2:
+            return
+        template = self.get_template_filename() if self.has_template() else None
+        try:
+            parser = ParallelParser(
+                settings.PARSE_PROCESSES, self.file_format, template
+            )
+        except (AssertionError, OSError) as error:
+            self.log_warning("failed to start parallel parsing: %s", error)
+            return
+        self.log_info("parsing %d files in parallel", len(paths))
+        for path, code in paths:
+            parser.add(
+                path,
+                os.path.join(self.full_path, path),
+                code,
+                is_template=path == self.template,
+            )
+        self.parallel_parser = parser
+
+    def stop_parallel_parser(self):
+        if self.parallel_parser is not None:
+            self.parallel_parser.close()
+            self.parallel_parser = None
+
     def update_source_checks(self):
         self.log_debug("running source checks")
+        translations = {}
         for unit in self.updated_sources.values():
-            unit.is_batch_update = True
-            unit.run_checks()
+            translations.setdefault(unit.translation.pk, (unit.translation, []))
+            translations[unit.translation.pk][1].append(unit)
+        for translation, units in translations.values():
+            translation.run_checks(units)
         self.updated_sources = {}
 
     @cached_property
@@ -1306,6 +1360,9 @@ class Component(models.Model, URLMixin, PathMixin):
         self.needs_cleanup = False
         self.updated_sources = {}
         self.alerts_trigger = {}
+        # Content hashes of changed strings and ids of changed translations
+        self.touched_hashes = set()
+        self.changed_translations = set()
         was_change = False
         translations = {}
         languages = {}
@@ -1337,56 +1394,70 @@ class Component(models.Model, URLMixin, PathMixin):
             self.translations_count = len(matches) + sum(
                 (c.translation_set.count() for c in self.linked_childs)
             )
-        for pos, path in enumerate(matches):
-            if not self._sources_prefetched and path != self.template:
-                self.preload_sources()
-            with transaction.atomic():
-                code = self.get_lang_code(path)
-                if langs is not None and code not in langs:
-                    self.log_info("skipping %s", path)
-                    continue
+        self.start_parallel_parser(matches, force, langs)
+        try:
+            for pos, path in enumerate(matches):
+                if not self._sources_prefetched and path != self.template:
+                    self.preload_sources()
+                with transaction.atomic():
+                    code = self.get_lang_code(path)
+                    if langs is not None and code not in langs:
+                        self.log_info("skipping %s", path)
+                        continue
 
-                self.log_info(
-                    "checking %s (%s) [%d/%d]", path, code, pos + 1, len(matches)
-                )
-                lang = Language.objects.auto_get_or_create(code=code)
-                if lang.code in languages:
-                    codes = "{}, {}".format(code, languages[lang.code])
-                    detail = "{} ({})".format(lang.code, codes)
-                    self.log_warning("duplicate language found: %s", detail)
-                    Change.objects.create(
-                        component=self,
-                        user=request.user if request else None,
-                        target=detail,
-                        action=Change.ACTION_DUPLICATE_LANGUAGE,
-                    )
-                    self.trigger_alert(
-                        "DuplicateLanguage", codes=codes, language_code=lang.code
+                    self.log_info(
+                        "checking %s (%s) [%d/%d]", path, code, pos + 1, len(matches)
                     )
-                    continue
-                translation = Translation.objects.check_sync(
-                    self, lang, code, path, force, request=request
-                )
-                was_change |= bool(translation.reason)
-                translations[translation.id] = translation
-                languages[lang.code] = code
-                # Remove fuzzy flag on template name change
-                if changed_template and self.template:
-                    translation.unit_set.filter(state=STATE_FUZZY).update(
-                        state=STATE_TRANSLATED
+                    lang = Language.objects.auto_get_or_create(code=code)
+                    if lang.code in languages:
+                        codes = "{}, {}".format(code, languages[lang.code])
+                        detail = "{} ({})".format(lang.code, codes)
+                        self.log_warning("duplicate language found: %s", detail)
+                        Change.objects.create(
+                            component=self,
+                            user=request.user if request else None,
+                            target=detail,
+                            action=Change.ACTION_DUPLICATE_LANGUAGE,
+                        )
+                        self.trigger_alert(
+                            "DuplicateLanguage", codes=codes, language_code=lang.code
+                        )
+                        continue
+                    translation = Translation.objects.check_sync(
+                        self, lang, code, path, force, request=request
                     )
-                self.progress_step()
+                    if translation.reason:
+                        was_change = True
+                        self.touched_hashes.update(translation.touched_hashes)
+                        self.changed_translations.add(translation.id)
+                    translations[translation.id] = translation
+                    languages[lang.code] = code
+                    # Remove fuzzy flag on template name change
+                    if changed_template and self.template:
+                        translation.unit_set.filter(state=STATE_FUZZY).update(
+                            state=STATE_TRANSLATED
+                        )
+                    self.progress_step()
+        finally:
+            self.stop_parallel_parser()
 
         # Delete possibly no longer existing translations
         if langs is None:
             todelete = self.translation_set.exclude(id__in=translations.keys())
             if todelete.exists():
+                from weblate.trans.models import Unit
+
                 self.needs_cleanup = True
                 with transaction.atomic():
                     self.log_info(
                         "removing stale translations: %s",
                         ",".join(trans.language.code for trans in todelete),
                     )
+                    self.touched_hashes.update(
+                        Unit.objects.filter(translation__in=todelete).values_list(
+                            "content_hash", flat=True
+                        )
+                    )
                     todelete.delete()
 
         self.update_import_alerts()
@@ -1404,19 +1475,18 @@ class Component(models.Model, URLMixin, PathMixin):
             was_change |= component.create_translations(
                 force, langs, request=request, from_link=True
             )
+            self.touched_hashes.update(component.touched_hashes)
+            self.changed_translations.update(component.changed_translations)
             projects[component.project_id] = component.project
 
         # Run source checks on updated source strings
         if self.updated_sources:
             self.update_source_checks()
 
-        # Run batch checks, update flags and stats
+        # Run batch checks, update flags and stats of changed strings
         if not from_link and was_change:
             for project in projects.values():
-                project.run_target_checks()
-                project.run_source_checks()
-                project.update_unit_flags()
-                project.invalidate_stats_deep()
+                project.post_update(self.touched_hashes, self.changed_translations)
 
         # Schedule background cleanup if needed
         if self.needs_cleanup:
@@ -1994,7 +2064,6 @@ class Component(models.Model, URLMixin, PathMixin):
                 )
                 self.project.run_target_checks()
                 self.update_source_checks()
-                self.project.update_unit_flags()
                 translation.invalidate_cache()
                 translation.notify_new(request)
                 messages.error(request, _("Translation file already exists!"))
@@ -2026,7 +2095,6 @@ class Component(models.Model, URLMixin, PathMixin):
             )
             self.project.run_target_checks()
             self.update_source_checks()
-            self.project.update_unit_flags()
             translation.invalidate_cache()
             translation.notify_new(request)
             return translation
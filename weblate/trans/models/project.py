@@ -19,13 +19,12 @@
 #
 
 
-import functools
 import os
 import os.path
 
 from django.conf import settings
 from django.db import models
-from django.db.models import Q
+from django.db.models import Exists, OuterRef
 from django.urls import reverse
 from django.utils.functional import cached_property
 from django.utils.translation import gettext as _
@@ -40,6 +39,9 @@ from weblate.utils.data import data_dir
 from weblate.utils.site import get_site_url
 from weblate.utils.stats import ProjectStats
 
+# Maximal number of strings processed separately after update
+SCOPE_LIMIT = 500
+
 
 class ProjectQuerySet(models.QuerySet):
     def order(self):
@@ -304,85 +306,117 @@ class Project(models.Model, URLMixin, PathMixin):
             or self.billing_set.filter(paid=True).exists()
         )
 
-    def run_batch_checks(self, attr_name):
-        """Run batch executed checks."""
+    @staticmethod
+    def filter_triggered(data, attr_name, prefix):
+        """Limit triggered checks to the unit referenced by outer query."""
+        if attr_name == 'source':
+            return data.filter(content_hash=OuterRef(prefix + 'content_hash'))
+        return data.filter(
+            content_hash=OuterRef(prefix + 'content_hash'),
+            translation__language=OuterRef(prefix + 'translation__language'),
+        )
+
+    def run_batch_checks(self, attr_name, content_hashes=None):
+        """Run batch executed checks.
+
+        The triggered checks are matched to units using subqueries, so every
+        check takes few queries regardless of number of strings. The checks
+        can be limited to units with given content hashes.
+        """
         from weblate.trans.models import Unit
 
         create = []
+        changed = set()
         meth_name = 'check_{}_project'.format(attr_name)
+        units = Unit.objects.filter(translation__component__project=self)
+        if content_hashes is not None:
+            units = units.filter(content_hash__in=content_hashes)
+        if attr_name == 'source':
+            units = units.filter(translation__language=self.source_language)
         for check, check_obj in CHECKS.items():
             if not getattr(check_obj, attr_name) or not check_obj.batch_update:
                 continue
             self.log_info('running batch check: %s', check)
             # List of triggered checks
             data = getattr(check_obj, meth_name)(self)
-            # Fetch existing check instances
-            existing = set(
-                Check.objects.filter(
-                    unit__translation__component__project=self, check=check
-                ).values_list('unit__content_hash', 'unit__translation__language_id')
-            )
             # Create new check instances
-            for item in data:
-                if 'translation__language' not in item:
-                    item['translation__language'] = self.source_language.id
-                key = (item['content_hash'], item['translation__language'])
-                if key in existing:
-                    existing.discard(key)
-                else:
-                    units = Unit.objects.filter(
-                        translation__component__project=self,
-                        translation__language_id=item['translation__language'],
-                        content_hash=item['content_hash'],
-                    )
-                    for unit in units:
-                        create.append(Check(unit=unit, check=check, ignore=False))
-            # Remove stale instances
-            if existing:
-                query = functools.reduce(
-                    lambda q, value: q
-                    | (
-                        Q(unit__content_hash=value[0])
-                        & Q(unit__translation__language_id=value[1])
-                    ),
-                    existing,
-                    Q(),
+            matching = units.annotate(
+                triggered=Exists(self.filter_triggered(data, attr_name, ''))
+            ).filter(triggered=True)
+            for pk in (
+                matching.exclude(check__check=check)
+                .values_list('pk', flat=True)
+                .iterator()
+            ):
+                create.append(Check(unit_id=pk, check=check, ignore=False))
+                changed.add(pk)
+            # Remove stale instances, the units are matched in a subquery, so
+            # the content hashes are passed to the database only once
+            stale = (
+                Check.objects.filter(unit__in=units, check=check)
+                .annotate(
+                    triggered=Exists(self.filter_triggered(data, attr_name, 'unit__'))
                 )
-                Check.objects.filter(check=check).filter(query).delete()
+                .filter(triggered=False)
+            )
+            delete = []
+            for pk, unit_id in stale.values_list('pk', 'unit_id'):
+                delete.append(pk)
+                changed.add(unit_id)
+            for offset in range(0, len(delete), 500):
+                Check.objects.filter(pk__in=delete[offset : offset + 500]).delete()
         # Create new checks
         if create:
             Check.objects.bulk_create(create, batch_size=500, ignore_conflicts=True)
+        # Update number of failing checks
+        Unit.objects.update_failing_checks(changed)
 
-    def run_target_checks(self):
+    def run_target_checks(self, content_hashes=None):
         """Run batch executed target checks."""
-        self.run_batch_checks('target')
+        self.run_batch_checks('target', content_hashes)
 
-    def run_source_checks(self):
+    def run_source_checks(self, content_hashes=None):
         """Run batch executed source checks."""
-        self.run_batch_checks('source')
+        self.run_batch_checks('source', content_hashes)
 
-    def update_unit_flags(self):
-        from weblate.trans.models import Unit
-
-        units = Unit.objects.filter(translation__component__project=self)
-
-        self.log_debug('updating unit flags: has_failing_check')
-
-        units.filter(has_failing_check=False).filter(check__ignore=False).update(
-            has_failing_check=True
-        )
-        units.filter(has_failing_check=True).exclude(check__ignore=False).update(
-            has_failing_check=False
-        )
-        self.log_debug('all unit flags updated')
+    def invalidate_stats_deep(self, content_hashes=None, translation_ids=()):
+        """Invalidate stats of translations in the project.
 
-    def invalidate_stats_deep(self):
+        The invalidation can be limited to translations containing given
+        content hashes and translations with given ids.
+        """
         self.log_info('updating stats caches')
         from weblate.trans.models import Translation
 
         translations = Translation.objects.filter(component__project=self)
-        for translation in translations.iterator():
+        if content_hashes is None:
+            for translation in translations.iterator():
+                translation.invalidate_cache()
+            return
+
+        processed = set()
+        for translation in translations.filter(
+            unit__content_hash__in=content_hashes
+        ).distinct():
             translation.invalidate_cache()
+            processed.add(translation.pk)
+        for translation in translations.filter(pk__in=translation_ids):
+            if translation.pk not in processed:
+                translation.invalidate_cache()
+
+    def post_update(self, content_hashes=None, translation_ids=()):
+        """Run batch checks and update stats after update.
+
+        The processing is limited to strings with given content hashes and
+        their translations. Large sets are processed for whole project, what
+        is faster than filtering by the content hashes.
+        """
+        if content_hashes is not None and len(content_hashes) > SCOPE_LIMIT:
+            content_hashes = None
+        if content_hashes is None or content_hashes:
+            self.run_target_checks(content_hashes)
+            self.run_source_checks(content_hashes)
+        self.invalidate_stats_deep(content_hashes, translation_ids)
 
     def get_stats(self):
         """Return stats dictionary."""
@@ -21,6 +21,7 @@
 
 import codecs
 import os
+from collections import defaultdict
 
 from django.core.cache import cache
 from django.core.exceptions import ValidationError
@@ -33,10 +34,12 @@ from django.utils.translation import gettext as _
 
 from weblate.checks import CHECKS
 from weblate.checks.flags import Flags
+from weblate.checks.models import Check
 from weblate.formats.auto import try_load
 from weblate.formats.base import UnitNotFound
 from weblate.formats.helpers import BytesIOMode
 from weblate.lang.models import Language, Plural
+from weblate.machinery.base import invalidate_cache
 from weblate.trans.checklists import TranslationChecklist
 from weblate.trans.defines import FILENAME_LENGTH
 from weblate.trans.exceptions import FileParseError
@@ -47,15 +50,17 @@ from weblate.trans.models.unit import (
     STATE_APPROVED,
     STATE_FUZZY,
     STATE_TRANSLATED,
+    SYNC_FIELDS,
     Unit,
 )
+from weblate.trans.search import get_fulltext
 from weblate.trans.signals import store_post_load, vcs_post_commit, vcs_pre_commit
 from weblate.trans.util import split_plural
 from weblate.trans.validators import validate_check_flags
 from weblate.utils.errors import report_error
 from weblate.utils.render import render_template
 from weblate.utils.site import get_site_url
-from weblate.utils.stats import TranslationStats
+from weblate.utils.stats import TranslationStats, get_stats_delta
 
 
 class TranslationManager(models.Manager):
@@ -266,6 +271,22 @@ class Translation(models.Model, URLMixin, LoggerMixin):
         except Exception as exc:
             self.component.handle_parse_error(exc, self)
 
+    def get_sync_store(self):
+        """Return parsed file for updating database.
+
+        Uses file parsed in parallel by the component if available.
+        """
+        parser = self.component.parallel_parser
+        if parser is not None:
+            try:
+                store = parser.get(self.filename)
+            except Exception as error:
+                self.log_warning('parallel parsing failed: %s', error)
+                store = None
+            if store is not None:
+                return store
+        return self.store
+
     def check_sync(self, force=False, request=None, change=None):
         """Check whether database is in sync with git and possibly updates."""
         if change is None:
@@ -275,6 +296,9 @@ class Translation(models.Model, URLMixin, LoggerMixin):
         else:
             user = request.user
 
+        # Content hashes of created, changed and removed strings
+        self.touched_hashes = set()
+
         # Check if we're not already up to date
         if not self.revision:
             self.reason = 'new file'
@@ -290,9 +314,16 @@ class Translation(models.Model, URLMixin, LoggerMixin):
 
         # List of updated units (used for cleanup and duplicates detection)
         updated = {}
+        # Units to store in bulk
+        created = []
+        changed = []
+        # Units where only position has changed
+        moved = []
+        # Duplicate units, processed once all units are stored
+        duplicates = []
 
         try:
-            store = self.store
+            store = self.get_sync_store()
 
             # Store plural
             plural = store.get_plural(self.language)
@@ -316,24 +347,7 @@ class Translation(models.Model, URLMixin, LoggerMixin):
 
                 # Check for possible duplicate units
                 if id_hash in updated:
-                    newunit = updated[id_hash]
-                    self.log_warning(
-                        'duplicate string to translate: %s (%s)',
-                        newunit,
-                        repr(newunit.source),
-                    )
-                    Change.objects.create(
-                        unit=newunit,
-                        action=Change.ACTION_DUPLICATE_STRING,
-                        user=user,
-                        author=user,
-                    )
-                    self.component.trigger_alert(
-                        'DuplicateString',
-                        language_code=self.language.code,
-                        source=newunit.source,
-                        unit_pk=newunit.pk,
-                    )
+                    duplicates.append(updated[id_hash])
                     continue
 
                 try:
@@ -343,7 +357,13 @@ class Translation(models.Model, URLMixin, LoggerMixin):
                     newunit = Unit(translation=self, id_hash=id_hash, state=-1)
                     is_new = True
 
-                newunit.update_from_unit(unit, pos, is_new)
+                if newunit.update_from_unit(unit, pos, is_new):
+                    if is_new:
+                        created.append(newunit)
+                    else:
+                        changed.append(newunit)
+                elif newunit.position != newunit.old_unit.position:
+                    moved.append(newunit)
 
                 # Check if unit is worth notification:
                 # - new and untranslated
@@ -365,12 +385,48 @@ class Translation(models.Model, URLMixin, LoggerMixin):
             self.log_warning('skipping update due to parse error: %s', error)
             return
 
+        # Store updated units
+        self.save_units(created, changed, moved)
+
+        # Report duplicates
+        for newunit in duplicates:
+            self.log_warning(
+                'duplicate string to translate: %s (%s)', newunit, repr(newunit.source)
+            )
+            Change.objects.create(
+                unit=newunit,
+                action=Change.ACTION_DUPLICATE_STRING,
+                user=user,
+                author=user,
+            )
+            self.component.trigger_alert(
+                'DuplicateString',
+                language_code=self.language.code,
+                source=newunit.source,
+                unit_pk=newunit.pk,
+            )
+
         # Delete stale units
         stale = set(dbunits) - set(updated)
         if stale:
             self.unit_set.filter(id_hash__in=stale).delete()
             self.component.needs_cleanup = True
 
+        self.touched_hashes.update(unit.content_hash for unit in created)
+        for unit in changed:
+            self.touched_hashes.add(unit.content_hash)
+            self.touched_hashes.add(unit.old_unit.content_hash)
+        self.touched_hashes.update(dbunits[id_hash].content_hash for id_hash in stale)
+
+        self.log_info(
+            'created %d strings, updated %d strings, moved %d strings, '
+            'removed %d strings',
+            len(created),
+            len(changed),
+            len(moved),
+            len(stale),
+        )
+
         # We should also do cleanup on source strings tracking objects
 
         # Update revision and stats
@@ -382,6 +438,117 @@ class Translation(models.Model, URLMixin, LoggerMixin):
         # Invalidate keys cache
         transaction.on_commit(self.invalidate_keys)
 
+    def save_units(self, created, changed, moved):
+        """Store units updated from the file in bulk.
+
+        This is counterpart of Unit.save for units updated by update_from_unit,
+        it stores units, updates labels, checks and fulltext index.
+        """
+        if created:
+            Unit.objects.bulk_create(created, batch_size=500)
+            # Not all databases return primary keys from bulk insert
+            if any(unit.pk is None for unit in created):
+                pks = dict(self.unit_set.values_list('id_hash', 'pk'))
+                for unit in created:
+                    unit.pk = pks[unit.id_hash]
+        if changed:
+            Unit.objects.bulk_update(changed, SYNC_FIELDS, batch_size=500)
+        if moved:
+            Unit.objects.bulk_update(moved, ['position'], batch_size=500)
+
+        units = created + changed
+        if not units:
+            return
+
+        # Update unit labels
+        if not self.is_source:
+            self.save_units_labels(units)
+
+        # Update checks and fulltext index
+        self.run_checks([unit for unit in units if unit.needs_checks])
+        get_fulltext().update_index_units(
+            [unit for unit in units if unit.needs_index]
+        )
+        invalidate_cache('weblate:{}'.format(self.language.code))
+
+    def run_checks(self, units):
+        """Update checks for given units in batch.
+
+        Existing checks are loaded in single query and the changes are written in
+        bulk together with number of failing checks on units. Batch updated
+        checks are skipped as these are updated project wide.
+        """
+        if not units:
+            return
+
+        if self.is_source:
+            checks = CHECKS.source
+            meth = 'check_source_batch'
+            items = [(unit.get_source_plurals(), unit) for unit in units]
+        else:
+            checks = CHECKS.target
+            meth = 'check_target_batch'
+            items = [
+                (unit.get_source_plurals(), unit.get_target_plurals(), unit)
+                for unit in units
+            ]
+        skip = {check for check, check_obj in checks.items() if check_obj.batch_update}
+        pks = {unit.pk for unit in units}
+
+        # Fetch existing checks
+        existing = {}
+        for pk, unit_id, check in Check.objects.filter(
+            unit__translation=self
+        ).values_list('pk', 'unit_id', 'check'):
+            if unit_id in pks and check not in skip:
+                existing[unit_id, check] = pk
+
+        # Run the checks
+        create = []
+        for check, check_obj in checks.items():
+            if check in skip:
+                continue
+            for unit in getattr(check_obj, meth)(items):
+                if existing.pop((unit.pk, check), None) is None:
+                    create.append(Check(unit=unit, check=check, ignore=False))
+
+        if create:
+            Check.objects.bulk_create(create, batch_size=500, ignore_conflicts=True)
+
+        # Delete no longer failing checks
+        delete = list(existing.values())
+        for offset in range(0, len(delete), 500):
+            Check.objects.filter(pk__in=delete[offset : offset + 500]).delete()
+
+        # Update number of failing checks
+        Unit.objects.update_failing_checks(
+            {check.unit_id for check in create}
+            | {unit_id for unit_id, _check in existing}
+        )
+
+    def save_units_labels(self, units):
+        """Synchronize labels of units with their source strings."""
+        through = Unit.labels.through
+        existing = defaultdict(dict)
+        for pk, unit_id, label_id in through.objects.filter(
+            unit__translation=self
+        ).values_list('pk', 'unit_id', 'label_id'):
+            existing[unit_id][label_id] = pk
+
+        create = []
+        delete = []
+        for unit in units:
+            current = existing[unit.pk]
+            for label in unit.source_info.labels.all():
+                if current.pop(label.pk, None) is None:
+                    create.append(through(unit_id=unit.pk, label_id=label.pk))
+            delete.extend(current.values())
+
+        if create:
+            through.objects.bulk_create(create, batch_size=500)
+        for offset in range(0, len(delete), 500):
+            through.objects.filter(pk__in=delete[offset : offset + 500]).delete()
+
     def do_update(self, request=None, method=None):
         return self.component.do_update(request, method=method)
 
@@ -399,14 +566,7 @@ class Translation(models.Model, URLMixin, LoggerMixin):
 
     def get_git_blob_hash(self):
         """Return current VCS blob hash for file."""
-        ret = self.component.repository.get_object_hash(self.get_filename())
-
-        if not self.component.has_template():
-            return ret
-
-        return ','.join(
-            [ret, self.component.repository.get_object_hash(self.component.template)]
-        )
+        return self.component.get_git_blob_hash(self.filename)
 
     def store_hash(self):
         """Store current hash in database."""
@@ -912,8 +1072,23 @@ class Translation(models.Model, URLMixin, LoggerMixin):
 
     def invalidate_cache(self):
         """Invalidate any cached stats."""
+        from weblate.trans.tasks import update_translation_stats
+
         # Invalidate summary stats
         transaction.on_commit(self.stats.invalidate)
+        # Recalculate them in the background
+        transaction.on_commit(lambda: update_translation_stats.delay(self.pk))
+
+    def update_stats(self, old_stats, new_stats, last_change=None):
+        """Incrementally update cached stats after unit change."""
+        if self.is_source:
+            # Source changes affect parent stats in other ways
+            self.invalidate_cache()
+            return
+        delta = get_stats_delta(old_stats, new_stats)
+        if not delta and last_change is None:
+            return
+        transaction.on_commit(lambda: self.stats.apply_delta(delta, last_change))
 
     @property
     def keys_cache_key(self):
@@ -21,11 +21,13 @@
 
 import re
 from copy import copy
+from functools import lru_cache
 
 from django.conf import settings
 from django.core.cache import cache
-from django.db import models, transaction
-from django.db.models import Q
+from django.db import DatabaseError, models, transaction
+from django.db.models import Count, Exists, IntegerField, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
 from django.utils import timezone
 from django.utils.functional import cached_property
 from django.utils.translation import gettext_lazy
@@ -34,11 +36,12 @@ from weblate.checks import CHECKS
 from weblate.checks.flags import Flags
 from weblate.checks.models import Check
 from weblate.formats.helpers import CONTROLCHARS
+from weblate.machinery.base import invalidate_cache
 from weblate.memory.tasks import update_memory
 from weblate.trans.mixins import LoggerMixin
 from weblate.trans.models.change import Change
 from weblate.trans.models.comment import Comment
-from weblate.trans.search import Fulltext
+from weblate.trans.search import get_fulltext
 from weblate.trans.signals import unit_pre_create
 from weblate.trans.util import (
     get_distinct_translations,
@@ -58,6 +61,7 @@ from weblate.utils.state import (
     STATE_READONLY,
     STATE_TRANSLATED,
 )
+from weblate.utils.stats import get_unit_stats
 
 SIMPLE_FILTERS = {
     'fuzzy': {'state': STATE_FUZZY},
@@ -75,6 +79,39 @@ SIMPLE_FILTERS = {
 
 NEWLINES = re.compile(r'\r\n|\r|\n')
 
+# Fields updated by update_from_unit, used for bulk updates
+SYNC_FIELDS = (
+    'position',
+    'location',
+    'flags',
+    'source',
+    'target',
+    'state',
+    'original_state',
+    'context',
+    'note',
+    'content_hash',
+    'previous_source',
+    'priority',
+    'num_words',
+    'extra_context',
+    'extra_flags',
+)
+
+
+# Fields maintained by the checks, these are not written on save
+COUNTER_FIELDS = ('failing_checks', 'has_failing_check')
+
+
+@lru_cache(maxsize=None)
+def get_save_fields():
+    """Return fields of unit stored on save."""
+    return [
+        field.name
+        for field in Unit._meta.concrete_fields
+        if not field.primary_key and field.name not in COUNTER_FIELDS
+    ]
+
 
 class UnitQuerySet(models.QuerySet):
     def filter_type(self, rqtype, ignored=False, strict=False):
@@ -111,13 +148,13 @@ class UnitQuerySet(models.QuerySet):
 
     def more_like_this(self, unit, top=5):
         """Find closely similar units."""
-        more_results = Fulltext().more_like(unit.pk, unit.source, top)
-
-        return self.filter(
-            pk__in=more_results,
+        units = self.filter(
             translation__language=unit.translation.language,
             state__gte=STATE_TRANSLATED,
         )
+        more_results = get_fulltext().more_like(unit.pk, unit.source, top, units)
+
+        return units.filter(pk__in=more_results)
 
     def same(self, unit, exclude=True):
         """Unit with same source within same project."""
@@ -158,6 +195,27 @@ class UnitQuerySet(models.QuerySet):
     def order(self):
         return self.order_by('-priority', 'position')
 
+    def update_failing_checks(self, pks):
+        """Recalculate number of active checks for units with given ids.
+
+        The checks are counted in the database, so checks which were not
+        created due to conflict are not counted.
+        """
+        pks = list(pks)
+        for offset in range(0, len(pks), 500):
+            self.filter(pk__in=pks[offset : offset + 500]).recalculate_failing_checks()
+
+    def recalculate_failing_checks(self):
+        """Recalculate number of active checks and failing check flag."""
+        active = Check.objects.filter(unit=OuterRef('pk'), ignore=False)
+        count = (
+            active.order_by().values('unit').annotate(count=Count('pk')).values('count')
+        )
+        self.update(
+            failing_checks=Coalesce(Subquery(count, output_field=IntegerField()), 0),
+            has_failing_check=Exists(active),
+        )
+
 
 class Unit(models.Model, LoggerMixin):
 
@@ -181,6 +239,7 @@ class Unit(models.Model, LoggerMixin):
     has_suggestion = models.BooleanField(default=False, db_index=True)
     has_comment = models.BooleanField(default=False, db_index=True)
     has_failing_check = models.BooleanField(default=False, db_index=True)
+    failing_checks = models.IntegerField(default=0)
 
     num_words = models.IntegerField(default=0)
 
@@ -225,6 +284,8 @@ class Unit(models.Model, LoggerMixin):
         super().__init__(*args, **kwargs)
         self.old_unit = copy(self)
         self.is_batch_update = False
+        self.needs_checks = False
+        self.needs_index = False
 
     def __str__(self):
         if self.translation.is_template:
@@ -293,7 +354,12 @@ class Unit(models.Model, LoggerMixin):
                 raise ValueError('String contains control char')
 
     def update_from_unit(self, unit, pos, created):
-        """Update Unit from ttkit unit."""
+        """Update Unit from ttkit unit.
+
+        The unit is not saved, the caller is expected to store the updated units
+        in bulk. Returns whether the content has changed, position only changes
+        are not considered to be a change.
+        """
         component = self.translation.component
         self.is_batch_update = True
         # Get unit attributes
@@ -364,11 +430,11 @@ class Unit(models.Model, LoggerMixin):
             and same_target
             and same_state
             and note == self.note
-            and pos == self.position
             and content_hash == self.content_hash
             and previous_source == self.previous_source
         ):
-            return
+            self.position = pos
+            return False
 
         # Store updated values
         self.position = pos
@@ -390,18 +456,16 @@ class Unit(models.Model, LoggerMixin):
         if created:
             unit_pre_create.send(sender=self.__class__, unit=self)
 
-        # Save into database
-        self.save(
-            force_insert=created,
-            same_content=same_source and same_target,
-            same_state=same_state,
-        )
+        # Track what needs to be done after storing the unit
+        same_content = same_source and same_target
+        self.update_num_words(same_content)
+        self.needs_checks = not same_content or not same_state
+        self.needs_index = created or not same_content
+
         # Track updated sources for source checks
         if self.translation.is_template:
             component.updated_sources[self.id_hash] = self
-        # Update unit labels
-        if not self.translation.is_source:
-            self.labels.set(self.source_info.labels.all())
+        return True
 
     def update_state(self):
         """Update state based on flags."""
@@ -517,11 +581,15 @@ class Unit(models.Model, LoggerMixin):
         self.save()
 
         # Generate Change object for this change
-        self.generate_change(user or author, author, change_action)
+        change = self.generate_change(user or author, author, change_action)
 
         if change_action not in (Change.ACTION_UPLOAD, Change.ACTION_AUTO):
             # Update translation stats
-            self.translation.invalidate_cache()
+            self.translation.update_stats(
+                get_unit_stats(self.old_unit),
+                get_unit_stats(self),
+                (change.timestamp, change.author_id),
+            )
 
             # Update user stats
             author.profile.translated += 1
@@ -562,7 +630,7 @@ class Unit(models.Model, LoggerMixin):
             unit.update_has_comment()
             unit.update_has_suggestion()
             unit.save()
-            Fulltext.update_index_unit(unit)
+            get_fulltext().update_index_unit(unit)
             Change.objects.create(
                 unit=unit,
                 action=Change.ACTION_SOURCE_CHANGE,
@@ -599,7 +667,7 @@ class Unit(models.Model, LoggerMixin):
             action = Change.ACTION_NEW
 
         # Create change object
-        Change.objects.create(
+        return Change.objects.create(
             unit=self,
             action=action,
             user=user,
@@ -610,20 +678,36 @@ class Unit(models.Model, LoggerMixin):
 
     def save(self, same_content=False, same_state=False, force_insert=False, **kwargs):
         """Wrapper around save to run checks or update fulltext."""
-        # Store number of words
-        if not same_content or not self.num_words:
-            self.num_words = len(self.get_source_plurals()[0].split())
+        self.update_num_words(same_content)
 
-        # Actually save the unit
-        super().save(**kwargs)
+        # Actually save the unit, number of failing checks is updated in the
+        # database by the checks, do not overwrite it with possibly outdated
+        # value
+        if self._state.adding or 'update_fields' in kwargs:
+            super().save(**kwargs)
+        else:
+            try:
+                super().save(update_fields=get_save_fields(), **kwargs)
+            except DatabaseError:
+                # Unit was removed meanwhile, insert it as Django does when
+                # saving without update_fields
+                if Unit.objects.filter(pk=self.pk).exists():
+                    raise
+                super().save(force_insert=True, **kwargs)
 
         # Update checks if content or fuzzy flag has changed
         if not same_content or not same_state:
             self.run_checks(same_state, same_content)
+            invalidate_cache('weblate:{}'.format(self.translation.language.code))
 
         # Update fulltext index if content has changed or this is a new unit
         if force_insert or not same_content:
-            Fulltext.update_index_unit(self)
+            get_fulltext().update_index_unit(self)
+
+    def update_num_words(self, same_content=False):
+        """Store number of words."""
+        if not same_content or not self.num_words:
+            self.num_words = len(self.get_source_plurals()[0].split())
 
     @cached_property
     def suggestions(self):
@@ -653,13 +737,11 @@ class Unit(models.Model, LoggerMixin):
 
     def run_checks(self, same_state=True, same_content=True):
         """Update checks for this unit."""
-        was_change = False
-        has_checks = None
-
         src = self.get_source_plurals()
         tgt = self.get_target_plurals()
 
-        old_checks = set(self.check_set.values_list('check', flat=True))
+        existing = dict(self.check_set.values_list('check', 'ignore'))
+        old_checks = set(existing)
         create = []
 
         if self.translation.is_source:
@@ -686,40 +768,24 @@ class Unit(models.Model, LoggerMixin):
                 else:
                     # Create new check
                     create.append(Check(unit=self, ignore=False, check=check))
-                    was_change = True
-                    has_checks = True
 
         if create:
             Check.objects.bulk_create(create, batch_size=500, ignore_conflicts=True)
 
         # Delete no longer failing checks
         if old_checks:
-            was_change = True
             Check.objects.filter(unit=self, check__in=old_checks).delete()
 
-        # Update failing checks flag
-        if not self.is_batch_update and (was_change or not same_content):
-            self.update_has_failing_check(was_change, has_checks)
-
-    def update_has_failing_check(
-        self, recurse=False, has_checks=None, invalidate=False
-    ):
-        """Update flag counting failing checks."""
-        if has_checks is None:
-            has_checks = self.active_checks().exists()
-
-        # Change attribute if it has changed
-        if has_checks != self.has_failing_check:
-            self.has_failing_check = has_checks
-            self.save(
-                same_content=True, same_state=True, update_fields=['has_failing_check']
+        # Update number of failing checks
+        if create or old_checks:
+            Unit.objects.filter(pk=self.pk).recalculate_failing_checks()
+            active = len(create) + sum(
+                1
+                for check, ignore in existing.items()
+                if not ignore and check not in old_checks
             )
-            if invalidate:
-                self.translation.invalidate_cache()
-
-        if recurse:
-            for unit in Unit.objects.prefetch().same(self):
-                unit.update_has_failing_check(False, has_checks, invalidate)
+            self.failing_checks = active
+            self.has_failing_check = active > 0
 
     def update_has_suggestion(self):
         """Update flag counting suggestions."""
@@ -822,8 +888,10 @@ class Unit(models.Model, LoggerMixin):
                 check__in=self.translation.component.enforced_checks
             ).exists()
         ):
+            old_stats = get_unit_stats(self)
             self.state = self.original_state = STATE_FUZZY
             self.save(same_state=True, same_content=True, update_fields=['state'])
+            self.translation.update_stats(old_stats, get_unit_stats(self))
 
         if (
             propagate
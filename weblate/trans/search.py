@@ -18,26 +18,38 @@
 # along with this program.  If not, see <https://www.gnu.org/licenses/>.
 #
 
-"""Whoosh based full text search."""
+"""Full text search backends."""
 
 
 import functools
 import logging
 from collections import defaultdict
-from time import sleep
+from time import time
 
-from celery_batches import Batches
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
 from django.utils.encoding import force_text
 from whoosh import qparser
 from whoosh.fields import NUMERIC, TEXT, SchemaClass
-from whoosh.index import LockError
+from whoosh.index import EmptyIndexError
 from whoosh.query import Or, Term
 
-from weblate.utils.celery import app, extract_batch_args, extract_batch_kwargs
+from weblate.machinery.base import invalidate_cache
+from weblate.utils.classloader import load_class
 from weblate.utils.index import WhooshIndex
 
 LOGGER = logging.getLogger('weblate.search')
 
+FULLTEXT_PENDING_KEY = 'fulltext-update-pending'
+FULLTEXT_LOCK_KEY = 'fulltext-update-lock'
+FULLTEXT_STATS_KEY = 'fulltext-update-stats'
+FULLTEXT_RETRY_KEY = 'fulltext-update-retry'
+# Delay before checking queue again when other writer is running
+FULLTEXT_RETRY_DELAY = 30
+
 
 class TargetSchema(SchemaClass):
     """Fultext index schema for target strings."""
@@ -56,7 +68,61 @@ class SourceSchema(SchemaClass):
     location = TEXT()
 
 
-class Fulltext(WhooshIndex):
+def get_fulltext():
+    """Return configured fulltext backend."""
+    return load_class(settings.FULLTEXT_BACKEND, 'FULLTEXT_BACKEND')()
+
+
+class BaseFulltext:
+    """Fulltext backend interface."""
+
+    @classmethod
+    def update_index_unit(cls, unit):
+        """Add single unit to index."""
+        raise NotImplementedError()
+
+    @classmethod
+    def update_index_units(cls, units):
+        """Add units to index."""
+        raise NotImplementedError()
+
+    @classmethod
+    def clean_search_unit(cls, pk, lang):
+        """Cleanup search index on unit deletion."""
+        raise NotImplementedError()
+
+    @classmethod
+    def cleanup(cls):
+        """Remove the index completely."""
+        raise NotImplementedError()
+
+    def search(self, query, langs, params):
+        """Perform fulltext search in given areas.
+
+        Returns set of primary keys.
+        """
+        raise NotImplementedError()
+
+    def more_like(self, pk, source, top=5, units=None):
+        """Find similar units.
+
+        The units queryset limits the candidates, the backends not able to
+        filter the candidates ignore it.
+        """
+        raise NotImplementedError()
+
+    def cleanup_stale(self):
+        """Remove deleted units from the index."""
+        raise NotImplementedError()
+
+    def optimize(self):
+        """Optimize the index."""
+        raise NotImplementedError()
+
+
+class Fulltext(WhooshIndex, BaseFulltext):
+    """Whoosh based fulltext stored in the data directory."""
+
     LOCATION = 'whoosh'
     FAKE = False
 
@@ -122,16 +188,98 @@ class Fulltext(WhooshIndex):
     @classmethod
     def update_index_unit(cls, unit):
         """Add single unit to index."""
-        if not cls.FAKE:
-            update_fulltext.delay(
-                pk=unit.pk,
-                source=force_text(unit.source),
-                context=force_text(unit.context),
-                location=force_text(unit.location),
-                target=force_text(unit.target),
-                note=force_text(unit.note),
-                language=force_text(unit.translation.language.code),
+        cls.update_index_units([unit])
+
+    @classmethod
+    def update_index_units(cls, units):
+        """Queue units for index update."""
+        from weblate.trans.models import IndexUpdate
+
+        if cls.FAKE or not units:
+            return
+        IndexUpdate.objects.bulk_create(
+            [
+                IndexUpdate(
+                    unitid=unit.pk, language_code=unit.translation.language.code
+                )
+                for unit in units
+            ],
+            batch_size=500,
+        )
+        transaction.on_commit(schedule_fulltext_update)
+
+    def process_updates(self, limit=10000):
+        """Apply queued index updates.
+
+        Returns number of processed updates, the caller is responsible for
+        making sure there is only one writer.
+        """
+        from weblate.trans.models import IndexUpdate, Unit
+
+        queued = list(
+            IndexUpdate.objects.order_by('pk').values_list(
+                'pk', 'unitid', 'language_code', 'to_delete'
+            )[:limit]
+        )
+        if not queued:
+            return 0
+        start = time()
+
+        languages = {}
+        deleted = set()
+        for _pk, unitid, language_code, to_delete in queued:
+            languages[unitid] = language_code
+            if to_delete:
+                deleted.add(unitid)
+        units = list(
+            Unit.objects.filter(pk__in=set(languages) - deleted).values(
+                'pk',
+                'source',
+                'context',
+                'location',
+                'target',
+                'note',
+                language=F('translation__language__code'),
             )
+        )
+        # Units removed meanwhile
+        deleted.update(set(languages) - deleted - {unit['pk'] for unit in units})
+
+        if units:
+            self.update_index(units)
+        if deleted:
+            removed = defaultdict(set)
+            for unitid in deleted:
+                if languages[unitid]:
+                    removed[languages[unitid]].add(unitid)
+            self.delete_search_units(deleted, removed)
+
+        # Weblate suggestions are based on the index
+        for language_code in set(languages.values()):
+            if language_code:
+                invalidate_cache('weblate:{}'.format(language_code))
+
+        # Remove only processed updates, rows with lower id might have been
+        # committed meanwhile
+        processed = [item[0] for item in queued]
+        for offset in range(0, len(processed), 500):
+            IndexUpdate.objects.filter(pk__in=processed[offset : offset + 500]).delete()
+
+        latency = time() - start
+        stats = {
+            'processed': len(queued),
+            'latency': latency,
+            'backlog': IndexUpdate.objects.count(),
+            'timestamp': timezone.now(),
+        }
+        cache.set(FULLTEXT_STATS_KEY, stats, 86400)
+        LOGGER.info(
+            'committed %d index updates in %.3f s, %d remaining',
+            stats['processed'],
+            latency,
+            stats['backlog'],
+        )
+        return len(queued)
 
     @staticmethod
     def base_search(index, query, params, search, schema):
@@ -186,7 +334,7 @@ class Fulltext(WhooshIndex):
 
         return pks
 
-    def more_like(self, pk, source, top=5):
+    def more_like(self, pk, source, top=5, units=None):
         """Find similar units."""
         index = self.get_source_index()
         with index.searcher() as searcher:
@@ -214,8 +362,47 @@ class Fulltext(WhooshIndex):
     @classmethod
     def clean_search_unit(cls, pk, lang):
         """Cleanup search index on unit deletion."""
+        from weblate.trans.models import IndexUpdate
+
         if not cls.FAKE:
-            delete_fulltext.delay(pk, lang)
+            IndexUpdate.objects.create(
+                unitid=pk, language_code=lang or '', to_delete=True
+            )
+            transaction.on_commit(schedule_fulltext_update)
+
+    def cleanup_stale(self):
+        from weblate.lang.models import Language
+        from weblate.trans.models import Unit
+
+        languages = list(Language.objects.values_list('code', flat=True)) + [None]
+        # We operate only on target indexes as they will have all IDs anyway
+        for lang in languages:
+            if lang is None:
+                index = self.get_source_index()
+            else:
+                index = self.get_target_index(lang)
+            try:
+                fields = index.reader().all_stored_fields()
+            except EmptyIndexError:
+                continue
+            for item in fields:
+                if Unit.objects.filter(pk=item['pk']).exists():
+                    continue
+                self.clean_search_unit(item['pk'], lang)
+
+    def optimize(self):
+        from weblate.lang.models import Language
+
+        LOGGER.info('starting optimizing source index')
+        index = self.get_source_index()
+        index.optimize()
+        LOGGER.info('completed optimizing source index')
+        languages = Language.objects.have_translation()
+        for lang in languages:
+            LOGGER.info('starting optimizing %s index', lang.code)
+            index = self.get_target_index(lang.code)
+            index.optimize()
+            LOGGER.info('completed optimizing %s index', lang.code)
 
     @staticmethod
     def delete_units_index(index, units):
@@ -233,42 +420,113 @@ class Fulltext(WhooshIndex):
             self.delete_units_index(self.get_target_index(lang), units)
 
 
-@app.task(trail=False, base=Batches, flush_every=1000, flush_interval=300, bind=True)
-def update_fulltext(self, *args, **kwargs):
-    unitdata = extract_batch_kwargs(*args, **kwargs)
-    fulltext = Fulltext()
-
-    # Update index
-    try:
-        fulltext.update_index(unitdata)
-    except LockError:
-        LOGGER.info('retrying update batch of len %d', len(unitdata))
-        # Manually handle retries, it doesn't work
-        # with celery-batches
-        sleep(10)
-        for unit in unitdata:
-            update_fulltext.delay(**unit)
-
-
-@app.task(trail=False, base=Batches, flush_every=1000, flush_interval=300, bind=True)
-def delete_fulltext(self, *args):
-    ids = extract_batch_args(*args)
-    fulltext = Fulltext()
-
-    units = set()
-    languages = defaultdict(set)
-    for unit, language in ids:
-        units.add(unit)
-        if language is None:
-            continue
-        languages[language].add(unit)
-
-    try:
-        fulltext.delete_search_units(units, languages)
-    except LockError:
-        LOGGER.info('retrying delete batch of len %d', len(ids))
-        # Manually handle retries, it doesn't work
-        # with celery-batches
-        sleep(10)
-        for unit in ids:
-            delete_fulltext.delay(*unit)
+class DatabaseFulltext(BaseFulltext):
+    """PostgreSQL based fulltext searching directly in the units table.
+
+    The database maintains the index, so there is nothing to update and the
+    index is shared by all nodes. Needs the pg_trgm extension and
+    django.contrib.postgres.
+    """
+
+    # Minimal trigram similarity of matched strings
+    SIMILARITY = 0.3
+    # Text search configuration, the strings are in many languages, so no
+    # language specific processing is done
+    CONFIG = 'simple'
+
+    @classmethod
+    def update_index_unit(cls, unit):
+        return
+
+    @classmethod
+    def update_index_units(cls, units):
+        return
+
+    @classmethod
+    def clean_search_unit(cls, pk, lang):
+        return
+
+    @classmethod
+    def cleanup(cls):
+        return
+
+    def search(self, query, langs, params):
+        from django.contrib.postgres.search import SearchQuery, SearchVector
+
+        from weblate.trans.models import Unit
+
+        source = [
+            field
+            for field in ('source', 'context', 'location')
+            if params.get(field, False)
+        ]
+        target = [
+            field
+            for field, param in (('target', 'target'), ('note', 'comment'))
+            if params.get(param, False)
+        ]
+        if not source and not target:
+            return set()
+
+        # The vectors match the indexes created by the migration, there
+        # is one index for every field
+        search_query = SearchQuery(query, config=self.CONFIG)
+        annotations = {}
+        condition = Q()
+        for field in source:
+            name = '{}_search'.format(field)
+            annotations[name] = SearchVector(field, config=self.CONFIG)
+            condition |= Q(**{name: search_query})
+        for field in target:
+            name = '{}_search'.format(field)
+            annotations[name] = SearchVector(field, config=self.CONFIG)
+            condition |= Q(
+                **{name: search_query, 'translation__language__code__in': langs}
+            )
+        units = Unit.objects.annotate(**annotations)
+        return set(units.filter(condition).values_list('pk', flat=True))
+
+    def more_like(self, pk, source, top=5, units=None):
+        from django.contrib.postgres.search import TrigramSimilarity
+
+        from weblate.trans.models import Unit
+
+        if units is None:
+            units = Unit.objects.all()
+        results = list(
+            units.filter(source__trigram_similar=source)
+            .annotate(similarity=TrigramSimilarity('source', source))
+            .filter(similarity__gte=self.SIMILARITY)
+            .order_by('-similarity')
+            .values_list('pk', 'similarity')[:top]
+        )
+        LOGGER.debug('found %d matches', len(results))
+        if not results:
+            return []
+
+        # Filter bad results
+        threshold = results[0][1] / 2
+        return [result[0] for result in results if result[1] > threshold]
+
+    def cleanup_stale(self):
+        return
+
+    def optimize(self):
+        return
+
+
+def get_fulltext_stats():
+    """Return metrics of the fulltext index updates."""
+    from weblate.trans.models import IndexUpdate
+
+    stats = cache.get(FULLTEXT_STATS_KEY, {})
+    stats['backlog'] = IndexUpdate.objects.count()
+    return stats
+
+
+def schedule_fulltext_update():
+    """Trigger processing of queued index updates unless already pending."""
+    from weblate.trans.tasks import update_fulltext
+
+    if cache.add(FULLTEXT_PENDING_KEY, True, 300):
+        update_fulltext.delay()
@@ -19,7 +19,6 @@
 #
 
 
-import logging
 import os
 from datetime import timedelta
 from glob import glob
@@ -27,18 +26,19 @@ from shutil import rmtree
 from time import time
 
 from celery.schedules import crontab
+from celery_batches import Batches
 from django.conf import settings
+from django.core.cache import cache
 from django.db import transaction
 from django.utils import timezone
 from django.utils.translation import gettext as _
 from django.utils.translation import ngettext, override
 from filelock import Timeout
-from whoosh.index import EmptyIndexError
+from whoosh.index import LockError
 
 from weblate.auth.models import User, get_anonymous
-from weblate.lang.models import Language
-from weblate.trans.autotranslate import AutoTranslate
-from weblate.trans.exceptions import FileParseError
+from weblate.trans.autotranslate import CHECKPOINT_LOCK_TIMEOUT, AutoTranslate
+from weblate.trans.exceptions import CheckpointLocked, FileParseError
 from weblate.trans.models import (
     Change,
     Comment,
@@ -48,12 +48,19 @@ from weblate.trans.models import (
     Translation,
     Unit,
 )
-from weblate.trans.search import Fulltext
-from weblate.utils.celery import app
+from weblate.trans.search import (
+    FULLTEXT_LOCK_KEY,
+    FULLTEXT_PENDING_KEY,
+    FULLTEXT_RETRY_DELAY,
+    FULLTEXT_RETRY_KEY,
+    LOGGER,
+    Fulltext,
+    get_fulltext,
+)
+from weblate.utils.celery import app, extract_batch_args
 from weblate.utils.data import data_dir
 from weblate.utils.files import remove_readonly
-
-SEARCH_LOGGER = logging.getLogger("weblate.search")
+from weblate.utils.stats import GlobalStats, prefetch_stats
 
 
 @app.task(
@@ -131,37 +138,12 @@ def commit_pending(hours=None, pks=None, logger=None):
 @app.task(trail=False)
 def cleanup_fulltext():
     """Remove stale units from fulltext."""
-    fulltext = Fulltext()
-    languages = list(Language.objects.values_list("code", flat=True)) + [None]
-    # We operate only on target indexes as they will have all IDs anyway
-    for lang in languages:
-        if lang is None:
-            index = fulltext.get_source_index()
-        else:
-            index = fulltext.get_target_index(lang)
-        try:
-            fields = index.reader().all_stored_fields()
-        except EmptyIndexError:
-            continue
-        for item in fields:
-            if Unit.objects.filter(pk=item["pk"]).exists():
-                continue
-            fulltext.clean_search_unit(item["pk"], lang)
+    get_fulltext().cleanup_stale()
 
 
 @app.task(trail=False)
 def optimize_fulltext():
-    SEARCH_LOGGER.info("starting optimizing source index")
-    fulltext = Fulltext()
-    index = fulltext.get_source_index()
-    index.optimize()
-    SEARCH_LOGGER.info("completed optimizing source index")
-    languages = Language.objects.have_translation()
-    for lang in languages:
-        SEARCH_LOGGER.info("starting optimizing %s index", lang.code)
-        index = fulltext.get_target_index(lang.code)
-        index.optimize()
-        SEARCH_LOGGER.info("completed optimizing %s index", lang.code)
+    get_fulltext().optimize()
 
 
 def cleanup_sources(project):
@@ -337,7 +319,43 @@ def project_removal(pk, uid):
         return
 
 
-@app.task(trail=False)
+@app.task(trail=False, base=Batches, flush_every=1000, flush_interval=60, bind=True)
+def update_translation_stats(self, *args):
+    """Recalculate invalidated stats of translations and their parents."""
+    ids = {item[0] for item in extract_batch_args(*args)}
+    translations = prefetch_stats(Translation.objects.filter(pk__in=ids).prefetch())
+    components = {}
+    languages = {}
+    project_languages = set()
+    for translation in translations:
+        translation.stats.ensure_basic()
+        components[translation.component_id] = translation.component
+        languages[translation.language_id] = translation.language
+        project_languages.add((translation.component.project, translation.language))
+    projects = {}
+    for component in components.values():
+        component.stats.ensure_basic()
+        projects[component.project_id] = component.project
+        for clist in component.componentlist_set.iterator():
+            clist.stats.ensure_basic()
+    for project, language in project_languages:
+        project.stats.get_single_language_stats(language).ensure_basic()
+    for project in projects.values():
+        project.stats.ensure_basic()
+    for language in languages.values():
+        language.stats.ensure_basic()
+    GlobalStats().ensure_basic()
+
+
+@app.task(
+    trail=False,
+    acks_late=True,
+    reject_on_worker_lost=True,
+    # Delivered again while the lock of running or interrupted task is held
+    autoretry_for=(CheckpointLocked,),
+    default_retry_delay=CHECKPOINT_LOCK_TIMEOUT,
+    max_retries=None,
+)
 def auto_translate(
     user_id,
     translation_id,
@@ -374,6 +392,30 @@ def auto_translate(
         )
 
 
+@app.task(trail=False)
+def update_fulltext():
+    """Process queued index updates, only single writer is running."""
+    cache.delete(FULLTEXT_PENDING_KEY)
+    if not cache.add(FULLTEXT_LOCK_KEY, True, 3600):
+        # Other writer is running and might have already read the queue,
+        # check again shortly instead of waiting for the periodic run
+        if not settings.CELERY_TASK_ALWAYS_EAGER and cache.add(
+            FULLTEXT_RETRY_KEY, True, FULLTEXT_RETRY_DELAY
+        ):
+            update_fulltext.apply_async(countdown=FULLTEXT_RETRY_DELAY)
+        return
+    try:
+        fulltext = Fulltext()
+        while fulltext.process_updates():
+            continue
+    except LockError:
+        # Index is locked by other process (for example by rebuild_index),
+        # the updates stay queued and are processed next time
+        LOGGER.info('index locked, postponing update')
+    finally:
+        cache.delete(FULLTEXT_LOCK_KEY)
+
+
 @app.on_after_finalize.connect
 def setup_periodic_tasks(sender, **kwargs):
     sender.add_periodic_task(3600, commit_pending.s(), name="commit-pending")
@@ -395,6 +437,8 @@ def setup_periodic_tasks(sender, **kwargs):
         3600 * 24, cleanup_old_comments.s(), name="cleanup-old-comments"
     )
 
+    sender.add_periodic_task(300, update_fulltext.s(), name="fulltext-update")
+
     # Following fulltext maintenance tasks should not be
     # executed at same time
     sender.add_periodic_task(
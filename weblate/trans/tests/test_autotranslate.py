@@ -20,11 +20,16 @@
 
 """Test for automatic translation."""
 
+from unittest.mock import patch
+
+from django.core.cache import cache
 from django.core.management import call_command
 from django.core.management.base import CommandError
 from django.urls import reverse
 
-from weblate.trans.models import Component
+from weblate.trans.autotranslate import AutoTranslate
+from weblate.trans.exceptions import CheckpointLocked
+from weblate.trans.models import Change, Component
 from weblate.trans.tests.test_views import ViewTestCase
 
 
@@ -93,6 +98,14 @@ class AutoTranslationTest(ViewTestCase):
         """Test for automatic translation with different content."""
         self.perform_auto()
 
+    def test_change(self):
+        self.perform_auto()
+        change = Change.objects.get(action=Change.ACTION_AUTO)
+        self.assertEqual(change.user, self.user)
+        self.assertEqual(change.component, self.component2)
+        self.assertEqual(change.target, 'Nazdar svete!\n')
+        self.assertTrue(change.unit.pending)
+
     def test_sugggest(self):
         """Test for automatic suggestion."""
         self.perform_auto(mode='suggest')
@@ -148,6 +161,41 @@ class AutoTranslationTest(ViewTestCase):
             call_command('auto_translate', 'test', 'test', 'xxx')
 
 
+class TierTranslation:
+    concurrent = True
+    deadline = 10
+
+    def __init__(self, name, max_score, quality):
+        self.name = name
+        self.max_score = max_score
+        self.quality = quality
+        self.queried = []
+
+    def get_result_store(self, language, unit, texts, source=None):
+        return None
+
+    def translate_batch(self, language, units, user, **kwargs):
+        if self.quality is None:
+            raise ValueError('Failure')
+        self.queried.extend(units)
+        return [[{'text': self.name, 'quality': self.quality}] for unit in units]
+
+
+class CheckpointAutoTranslate(AutoTranslate):
+    def get_checkpoint_key(self):
+        return 'auto-translate-checkpoint:test'
+
+
+class ResumeAutoTranslate(CheckpointAutoTranslate):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.queried = []
+
+    def fetch_mt(self, services, threshold, units):
+        self.queried.extend(unit.pk for unit in units)
+        return {unit.pk: 'Translated' for unit in units}
+
+
 class AutoTranslationMtTest(ViewTestCase):
     fake_search = False
 
@@ -216,3 +264,122 @@ class AutoTranslationMtTest(ViewTestCase):
 
     def test_overwrite(self):
         self.perform_auto(overwrite='1', engines=['weblate'], threshold=80)
+
+    def test_resume(self):
+        self.make_different()
+        translation = self.component3.translation_set.get(language_code='cs')
+        auto = CheckpointAutoTranslate(self.user, translation, 'todo', 'translate')
+        # Pretend all strings were processed before interruption
+        cache.set(
+            auto.get_checkpoint_key(),
+            {
+                'pk': translation.unit_set.order_by('-pk')[0].pk,
+                'done': 4,
+                'updated': 1,
+                'updated_pks': [],
+                'touched_hashes': set(),
+            },
+        )
+        auto.process_mt(['weblate'], 80)
+        self.assertEqual(auto.updated, 1)
+        self.assertEqual(
+            cache.get(auto.get_checkpoint_key()), {'finished': True, 'updated': 1}
+        )
+        translation.invalidate_cache()
+        self.assertEqual(translation.stats.translated, 0)
+
+        # Finished task is not processed again
+        auto = CheckpointAutoTranslate(self.user, translation, 'todo', 'translate')
+        auto.process_mt(['weblate'], 80)
+        self.assertEqual(auto.updated, 1)
+        translation.invalidate_cache()
+        self.assertEqual(translation.stats.translated, 0)
+
+        # Without checkpoint the processing starts from beginning
+        cache.delete(auto.get_checkpoint_key())
+        auto = CheckpointAutoTranslate(self.user, translation, 'todo', 'translate')
+        auto.process_mt(['weblate'], 80)
+        self.assertEqual(auto.updated, 1)
+        translation.invalidate_cache()
+        self.assertEqual(translation.stats.translated, 1)
+
+    @patch('weblate.trans.autotranslate.BATCH_SIZE', 1)
+    def test_resume_partial(self):
+        translation = self.component3.translation_set.get(language_code='cs')
+        units = list(translation.unit_set.order_by('pk'))
+        auto = ResumeAutoTranslate(self.user, translation, 'todo', 'translate')
+        # Pretend first two chunks were processed before interruption
+        cache.set(
+            auto.get_checkpoint_key(),
+            {
+                'pk': units[1].pk,
+                'done': 2,
+                'updated': 0,
+                'updated_pks': [],
+                'touched_hashes': set(),
+            },
+        )
+        auto.process_mt([], 80)
+        remaining = [unit.pk for unit in units[2:]]
+        self.assertEqual(auto.queried, remaining)
+        self.assertEqual(auto.updated, len(remaining))
+        self.assertTrue(cache.get(auto.get_checkpoint_key())['finished'])
+        self.assertEqual(
+            set(
+                translation.unit_set.filter(target='Translated').values_list(
+                    'pk', flat=True
+                )
+            ),
+            set(remaining),
+        )
+
+    @patch('weblate.trans.autotranslate.BATCH_SIZE', 1)
+    def test_resume_locked(self):
+        translation = self.component3.translation_set.get(language_code='cs')
+        units = list(translation.unit_set.order_by('pk'))
+        auto = ResumeAutoTranslate(self.user, translation, 'todo', 'translate')
+        lock_key = '{}:lock'.format(auto.get_checkpoint_key())
+        # Run interrupted after first chunk, leaving the lock behind
+        cache.set(
+            auto.get_checkpoint_key(),
+            {
+                'pk': units[0].pk,
+                'done': 1,
+                'updated': 0,
+                'updated_pks': [],
+                'touched_hashes': set(),
+            },
+        )
+        cache.add(lock_key, True)
+        # The task delivered again is retried later
+        with self.assertRaises(CheckpointLocked):
+            auto.process_mt([], 80)
+        self.assertEqual(auto.queried, [])
+        # Once the lock expires, the processing continues
+        cache.delete(lock_key)
+        auto = ResumeAutoTranslate(self.user, translation, 'todo', 'translate')
+        auto.process_mt([], 80)
+        self.assertEqual(auto.queried, [unit.pk for unit in units[1:]])
+        self.assertEqual(auto.updated, len(units) - 1)
+        self.assertIsNone(cache.get(lock_key))
+
+    def test_fetch_tiers(self):
+        translation = self.component3.translation_set.get(language_code='cs')
+        units = list(translation.unit_set.all())
+        auto = AutoTranslate(self.user, translation, 'todo', 'translate')
+        # Lower ranked service is not queried when better result exists
+        high = TierTranslation('High', 100, 95)
+        low = TierTranslation('Low', 90, 90)
+        result = auto.fetch_mt([high, low], 80, units)
+        self.assertEqual(set(result.values()), {'High'})
+        self.assertEqual(len(high.queried), len(units))
+        self.assertEqual(low.queried, [])
+        # Lower ranked service is queried when it can provide better result
+        high = TierTranslation('High', 100, 85)
+        low = TierTranslation('Low', 90, 90)
+        result = auto.fetch_mt([high, low], 80, units)
+        self.assertEqual(set(result.values()), {'Low'})
+        # Failing service is skipped
+        failing = TierTranslation('Failing', 100, None)
+        result = auto.fetch_mt([failing, low], 80, units)
+        self.assertEqual(set(result.values()), {'Low'})
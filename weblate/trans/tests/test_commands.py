@@ -397,6 +397,11 @@ class UpdateChecksTest(CheckGitTest):
     expected_string = 'Processing'
 
 
+class RecountChecksTest(CheckGitTest):
+    command_name = 'recount_checks'
+    expected_string = 'Processing'
+
+
 class UpdateGitTest(CheckGitTest):
     command_name = 'updategit'
     expected_string = ''
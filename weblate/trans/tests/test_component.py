@@ -24,6 +24,7 @@ import os
 import shutil
 
 from django.core.exceptions import ValidationError
+from django.test.utils import override_settings
 
 from weblate.checks.models import Check
 from weblate.lang.models import Language
@@ -69,6 +70,17 @@ class ComponentTest(RepoTestCase):
         self.verify_component(component, 4, 'cs', 4)
         self.assertTrue(os.path.exists(component.full_path))
 
+    @override_settings(PARSE_PROCESSES=2)
+    def test_create_parallel(self):
+        component = self.create_component()
+        self.verify_component(component, 4, 'cs', 4)
+        self.assertIsNone(component.parallel_parser)
+
+    @override_settings(PARSE_PROCESSES=2)
+    def test_create_json_mono_parallel(self):
+        component = self.create_json_mono()
+        self.verify_component(component, 2, 'cs', 4)
+
     def test_create_dot(self):
         component = self._create_component('po', './po/*.po')
         self.verify_component(component, 4, 'cs', 4)
@@ -24,8 +24,10 @@
 import os
 import shutil
 
+from django.core.cache import cache
 from django.core.management.color import no_style
 from django.db import connection
+from django.db.models import F
 from django.test import LiveServerTestCase, TestCase
 from django.test.utils import override_settings
 
@@ -34,15 +36,19 @@ from weblate.checks.models import Check
 from weblate.lang.models import Language, Plural
 from weblate.trans.models import (
     AutoComponentList,
+    Change,
     Component,
     ComponentList,
     Project,
+    Translation,
     Unit,
     WhiteboardMessage,
 )
 from weblate.trans.tests.utils import RepoTestMixin, create_test_user
 from weblate.utils.django_hacks import immediate_on_commit, immediate_on_commit_leave
+from weblate.utils.models import PersistentStats
 from weblate.utils.state import STATE_TRANSLATED
+from weblate.utils.stats import BASIC_KEYS
 
 
 def fixup_languages_seq():
@@ -197,6 +203,136 @@ class TranslationTest(RepoTestCase):
         self.assertEqual(translation.stats.all, 0)
         self.assertEqual(translation.stats.all_words, 0)
 
+    def test_update_stats_delta(self):
+        """Stats are incrementally updated on translating."""
+        component = self.create_component()
+        translation = component.translation_set.get(language_code='cs')
+        user = create_test_user()
+        self.assertEqual(translation.stats.translated, 0)
+        self.assertEqual(component.stats.translated, 0)
+        unit = translation.unit_set.all()[0]
+        unit.translate(user, 'Nazdar', STATE_TRANSLATED)
+        translation = Translation.objects.get(pk=translation.pk)
+        self.assertEqual(translation.stats.translated, 1)
+        self.assertEqual(translation.stats.translated_words, unit.num_words)
+        self.assertEqual(translation.stats.last_author, user.pk)
+        self.assertEqual(Component.objects.get(pk=component.pk).stats.translated, 1)
+        # Full recalculation gives same result
+        expected = translation.stats.get_data()
+        translation.stats.invalidate()
+        translation.stats.ensure_basic()
+        for key in BASIC_KEYS:
+            self.assertEqual(getattr(translation.stats, key), expected[key], key)
+
+    def test_update_stats_delta_locked(self):
+        """Stats are invalidated when updated concurrently."""
+        component = self.create_component()
+        translation = component.translation_set.get(language_code='cs')
+        user = create_test_user()
+        self.assertEqual(translation.stats.translated, 0)
+        # Simulate other process updating the stats
+        cache.add(translation.stats.lock_key, True)
+        unit = translation.unit_set.all()[0]
+        unit.translate(user, 'Nazdar', STATE_TRANSLATED)
+        self.assertIsNone(cache.get(translation.stats.cache_key))
+        cache.delete(translation.stats.lock_key)
+        translation = Translation.objects.get(pk=translation.pk)
+        self.assertEqual(translation.stats.translated, 1)
+
+    def test_update_stats_persistent(self):
+        """Stats are loaded from the database when missing in the cache."""
+        component = self.create_component()
+        translation = component.translation_set.get(language_code='cs')
+        self.assertEqual(translation.stats.all, 4)
+        cache.delete(translation.stats.cache_key)
+        translation = Translation.objects.get(pk=translation.pk)
+        with self.assertNumQueries(1):
+            self.assertEqual(translation.stats.all, 4)
+            self.assertEqual(translation.stats.all_words, 15)
+        translation.stats.invalidate()
+        cache.delete(translation.stats.cache_key)
+        translation = Translation.objects.get(pk=translation.pk)
+        self.assertEqual(translation.stats.load(), {})
+
+    def test_update_stats_delete(self):
+        """Stored stats are removed with the objects."""
+        component = self.create_component()
+        project = component.project
+        translation = component.translation_set.get(language_code='cs')
+        stats = [
+            translation.stats,
+            component.stats,
+            project.stats,
+            project.stats.get_single_language_stats(translation.language),
+        ]
+        for item in stats:
+            self.assertEqual(item.all, 4)
+        keys = [item.cache_key for item in stats]
+        self.assertEqual(PersistentStats.objects.filter(key__in=keys).count(), 4)
+        project.delete()
+        self.assertFalse(PersistentStats.objects.filter(key__in=keys).exists())
+        for key in keys:
+            self.assertIsNone(cache.get(key))
+
+    def test_update_stats_stale(self):
+        """Previous stats are served while being recalculated elsewhere."""
+        component = self.create_component()
+        translation = component.translation_set.get(language_code='cs')
+        self.assertEqual(translation.stats.all_words, 15)
+        translation.unit_set.update(num_words=0)
+        translation.stats.discard()
+        # Simulate calculation in progress
+        cache.add(translation.stats.lock_key, True)
+        translation = Translation.objects.get(pk=translation.pk)
+        self.assertEqual(translation.stats.all_words, 15)
+        self.assertIsNone(cache.get(translation.stats.cache_key))
+        # Calculation finished
+        cache.delete(translation.stats.lock_key)
+        translation = Translation.objects.get(pk=translation.pk)
+        self.assertEqual(translation.stats.all_words, 0)
+
+    def test_sync_positions(self):
+        """Position only changes are stored without updating units."""
+        component = self.create_component()
+        translation = component.translation_set.get(language_code='cs')
+        expected = dict(translation.unit_set.values_list('pk', 'position'))
+        checks = Check.objects.filter(unit__translation=translation)
+        expected_checks = set(checks.values_list('pk', 'check'))
+        changes = Change.objects.count()
+        translation.unit_set.update(position=F('position') + 100)
+        translation.check_sync(force=True)
+        # Positions were updated in the database
+        self.assertEqual(
+            expected, dict(translation.unit_set.values_list('pk', 'position'))
+        )
+        # No changes were recorded and checks were kept
+        self.assertEqual(Change.objects.count(), changes)
+        self.assertEqual(expected_checks, set(checks.values_list('pk', 'check')))
+
+    def test_sync_new_units(self):
+        """Units created in bulk get checks and word counts."""
+        component = self.create_component()
+        translation = component.translation_set.get(language_code='cs')
+        expected = set(
+            Check.objects.filter(unit__translation=translation).values_list(
+                'unit__id_hash', 'check'
+            )
+        )
+        words = translation.stats.all_words
+        translation.unit_set.all().delete()
+        translation.check_sync(force=True)
+        translation.invalidate_cache()
+        self.assertEqual(translation.unit_set.count(), 4)
+        self.assertEqual(translation.stats.all_words, words)
+        self.assertEqual(
+            expected,
+            set(
+                Check.objects.filter(unit__translation=translation).values_list(
+                    'unit__id_hash', 'check'
+                )
+            ),
+        )
+
     def test_commit_groupping(self):
         component = self.create_component()
         translation = component.translation_set.get(language_code='cs')
@@ -325,6 +461,13 @@ class UnitTest(ModelTestCase):
         unit.translate(user, 'other\r\nstring', STATE_TRANSLATED)
         self.assertEqual(unit.target, 'other\r\nstring')
 
+    def test_save_deleted(self):
+        unit = Unit.objects.filter(translation__language_code="cs")[0]
+        # Simulate removal by concurrent update
+        Unit.objects.filter(pk=unit.pk).delete()
+        unit.save(same_content=True, same_state=True)
+        self.assertTrue(Unit.objects.filter(pk=unit.pk).exists())
+
     def test_flags(self):
         unit = Unit.objects.filter(translation__language_code="cs")[0]
         unit.flags = 'no-wrap, ignore-same'
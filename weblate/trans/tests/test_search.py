@@ -23,14 +23,28 @@
 
 import re
 import shutil
-from unittest import TestCase
+from unittest import TestCase, skipIf
+from unittest.mock import patch
 
+from django.core.cache import cache
+from django.db import connection
 from django.http import QueryDict
 from django.test.utils import override_settings
 from django.urls import reverse
 from whoosh.filedb.filestore import FileStorage
 
-from weblate.trans.search import Fulltext
+from weblate.machinery.base import get_cache_version
+from weblate.trans.models import IndexUpdate
+from weblate.trans.search import (
+    FULLTEXT_LOCK_KEY,
+    FULLTEXT_RETRY_DELAY,
+    FULLTEXT_RETRY_KEY,
+    DatabaseFulltext,
+    Fulltext,
+    get_fulltext,
+    get_fulltext_stats,
+)
+from weblate.trans.tasks import update_fulltext
 from weblate.trans.tests.test_views import ViewTestCase
 from weblate.trans.tests.utils import TempDirMixin
 from weblate.utils.ratelimit import reset_rate_limit
@@ -208,6 +222,61 @@ class SearchBackendTest(ViewTestCase):
         Fulltext.update_index_unit(unit)
         Fulltext.update_index_unit(unit)
 
+    def test_queue(self):
+        unit = self.get_translation().unit_set.get(source='Hello, world!\n')
+        update_fulltext()
+        # Simulate running writer
+        cache.add(FULLTEXT_LOCK_KEY, True)
+        Fulltext.update_index_unit(unit)
+        self.assertEqual(IndexUpdate.objects.count(), 1)
+        cache.delete(FULLTEXT_LOCK_KEY)
+        version = get_cache_version('weblate:cs')
+        update_fulltext()
+        self.assertEqual(IndexUpdate.objects.count(), 0)
+        # Cached Weblate suggestions are invalidated by the index update
+        self.assertNotEqual(get_cache_version('weblate:cs'), version)
+        stats = get_fulltext_stats()
+        self.assertEqual(stats['backlog'], 0)
+        self.assertEqual(stats['processed'], 1)
+        self.assertIn(
+            unit.pk, Fulltext().search('world', ['cs'], {'source': True})
+        )
+
+    @override_settings(CELERY_TASK_ALWAYS_EAGER=False)
+    def test_queue_locked(self):
+        # Simulate running writer
+        cache.add(FULLTEXT_LOCK_KEY, True)
+        with patch.object(update_fulltext, 'apply_async') as apply_async:
+            update_fulltext()
+            update_fulltext()
+        cache.delete(FULLTEXT_LOCK_KEY)
+        cache.delete(FULLTEXT_RETRY_KEY)
+        # The processing is scheduled again only once
+        apply_async.assert_called_once_with(countdown=FULLTEXT_RETRY_DELAY)
+
+    def test_backend(self):
+        self.assertIsInstance(get_fulltext(), Fulltext)
+        with override_settings(
+            FULLTEXT_BACKEND='weblate.trans.search.DatabaseFulltext'
+        ):
+            fulltext = get_fulltext()
+            self.assertIsInstance(fulltext, DatabaseFulltext)
+            self.assertEqual(fulltext.search('hello', ['cs'], {}), set())
+
+    @skipIf(connection.vendor != 'postgresql', 'PostgreSQL is not used')
+    def test_database(self):
+        self.edit_unit('Hello, world!\n', 'Nazdar svete!\n')
+        unit = self.get_translation().unit_set.get(source='Hello, world!\n')
+        fulltext = DatabaseFulltext()
+        self.assertIn(unit.pk, fulltext.search('world', ['cs'], {'source': True}))
+        self.assertIn(unit.pk, fulltext.search('nazdar', ['cs'], {'target': True}))
+        self.assertNotIn(unit.pk, fulltext.search('world', ['cs'], {'target': True}))
+        self.assertNotIn(unit.pk, fulltext.search('nazdar', ['de'], {'target': True}))
+        self.assertEqual(
+            fulltext.search('nonexisting', ['cs'], {'source': True, 'target': True}),
+            set(),
+        )
+
 
 class SearchMigrationTest(TestCase, TempDirMixin):
     """Search index migration testing."""
@@ -18,6 +18,8 @@
 # along with this program.  If not, see <https://www.gnu.org/licenses/>.
 #
 
+from functools import partial
+
 from celery.result import AsyncResult
 from django.contrib.auth.decorators import login_required
 from django.core.exceptions import PermissionDenied
@@ -30,7 +32,7 @@ from django.views.decorators.http import require_POST
 from weblate.checks.flags import Flags
 from weblate.checks.models import Check
 from weblate.machinery import MACHINE_TRANSLATION_SERVICES
-from weblate.machinery.base import MachineTranslationError
+from weblate.machinery.base import MachineTranslationError, run_concurrent
 from weblate.trans.models import Change, Unit
 from weblate.trans.util import sort_objects
 from weblate.utils.celery import get_task_progress, is_task_ready
@@ -59,14 +61,38 @@ def handle_machinery(request, service, unit, source):
         'dir': unit.translation.language.direction,
     }
 
-    try:
-        response['translations'] = translation_service.translate(
-            unit.translation.language.code, source, unit, request.user
-        )
+    # Make sure related objects are loaded, the service might run in a thread
+    unit.translation.component.project.source_language
+
+    # Persistent store is accessed here as the thread does not use database
+    store = translation_service.get_result_store(
+        unit.translation.language.code, unit, [source]
+    )
+
+    # Run the query with the service deadline
+    result, exc = run_concurrent(
+        [
+            (
+                translation_service,
+                partial(
+                    translation_service.translate,
+                    unit.translation.language.code,
+                    source,
+                    unit,
+                    request.user,
+                    store=store,
+                ),
+            )
+        ]
+    )[0]
+    if store is not None:
+        store.save()
+    if exc is None:
+        response['translations'] = result
         response['responseStatus'] = 200
-    except MachineTranslationError as exc:
+    elif isinstance(exc, MachineTranslationError):
         response['responseDetails'] = str(exc)
-    except Exception as exc:
+    else:
         report_error(exc, request)
         response['responseDetails'] = '{0}: {1}'.format(
             exc.__class__.__name__, str(exc)
@@ -0,0 +1,32 @@
+# Generated by Django 3.0.3 on 2020-02-24 10:12
+
+from django.db import migrations, models
+
+import weblate.utils.fields
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = []
+
+    operations = [
+        migrations.CreateModel(
+            name="PersistentStats",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("key", models.CharField(max_length=190, unique=True)),
+                ("data", weblate.utils.fields.JSONField(default={})),
+                ("updated", models.DateTimeField(auto_now=True)),
+            ],
+        )
+    ]
@@ -21,11 +21,13 @@
 
 from appconf import AppConf
 from django.core.cache import cache
+from django.db import models
 from django.db.models.signals import post_save
 from django.dispatch import receiver
 
 from weblate.trans.models import Change
 from weblate.utils.decorators import disable_for_loaddata
+from weblate.utils.fields import JSONField
 
 
 class WeblateConf(AppConf):
@@ -67,6 +69,17 @@ class WeblateConf(AppConf):
         prefix = ''
 
 
+class PersistentStats(models.Model):
+    """Statistics stored in the database as a backend for the cache."""
+
+    key = models.CharField(max_length=190, unique=True)
+    data = JSONField()
+    updated = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return self.key
+
+
 @receiver(post_save, sender=Change)
 @disable_for_loaddata
 def update_source(sender, instance, created, **kwargs):
@@ -52,6 +52,25 @@ class Comparer:
             # Too long string, mark them as not much similar
             return 50
 
+    def bounded_similarity(self, first, second, threshold):
+        """Returns string similarity if it reaches threshold, None otherwise."""
+        length = max(len(first), len(second))
+        if not length:
+            return 100
+        # Maximal distance to reach threshold
+        limit = length * (100 - threshold) // 100
+        # The distance is at least the difference of lengths
+        if abs(len(first) - len(second)) > limit:
+            return None
+        try:
+            distance = damerau_levenshtein_distance(first, second)
+        except MemoryError:
+            # Too long string, same fallback as in similarity
+            return 50 if threshold <= 50 else None
+        if distance > limit:
+            return None
+        return int(100 * (1.0 - (float(distance) / length)))
+
 
 class QuotePlugin(whoosh.qparser.SingleQuotePlugin):
     """Single and double quotes to specify a term."""
@@ -24,9 +24,11 @@ from datetime import timedelta
 
 from django.core.cache import cache
 from django.core.exceptions import ObjectDoesNotExist
+from django.db import IntegrityError, transaction
 from django.db.models import Count, Sum
 from django.db.models.functions import Length
 from django.utils import timezone
+from django.utils.dateparse import parse_datetime
 from django.utils.functional import cached_property
 
 from weblate.trans.filter import get_filter_choice
@@ -72,6 +74,51 @@ SOURCE_KEYS = frozenset(
     list(BASIC_KEYS) + ["source_strings", "source_words", "source_chars"]
 )
 
+# Lifetime of stats in the cache
+CACHE_TIMEOUT = 30 * 86400
+
+# Time to wait for other process to calculate stats
+LOCK_TIMEOUT = 300
+
+# Number of incremental updates after which stats are fully recalculated
+DELTA_LIMIT = 100
+
+
+def get_unit_stats(unit):
+    """Return contribution of a single unit to the basic stats."""
+    words = unit.num_words
+    chars = len(unit.source)
+    result = {}
+    for item, matches in (
+        ("all", True),
+        ("fuzzy", unit.state == STATE_FUZZY),
+        ("translated", unit.state >= STATE_TRANSLATED),
+        ("todo", unit.state < STATE_TRANSLATED),
+        ("nottranslated", unit.state == STATE_EMPTY),
+        ("approved", unit.state >= STATE_APPROVED),
+        ("allchecks", unit.has_failing_check),
+        ("suggestions", unit.has_suggestion),
+        ("comments", unit.has_comment),
+        (
+            "approved_suggestions",
+            unit.state >= STATE_APPROVED and unit.has_suggestion,
+        ),
+    ):
+        if matches:
+            result[item] = 1
+            result["{}_words".format(item)] = words
+            result["{}_chars".format(item)] = chars
+        else:
+            result[item] = 0
+            result["{}_words".format(item)] = 0
+            result["{}_chars".format(item)] = 0
+    return result
+
+
+def get_stats_delta(old, new):
+    """Return difference between two unit stats."""
+    return {key: new[key] - old[key] for key in new if new[key] != old[key]}
+
 
 def aggregate(stats, item, stats_obj):
     if item == "last_changed":
@@ -94,6 +141,53 @@ def zero_stats(keys):
     return stats
 
 
+def load_persistent(keys):
+    """Load stats stored in the database."""
+    from weblate.utils.models import PersistentStats
+
+    result = {}
+    stored = PersistentStats.objects.filter(key__in=keys).values_list("key", "data")
+    for key, data in stored:
+        if data.get("last_changed"):
+            data["last_changed"] = parse_datetime(data["last_changed"])
+        result[key] = data
+    return result
+
+
+def save_persistent(key, data):
+    """Store stats in the database."""
+    from weblate.utils.models import PersistentStats
+
+    if PersistentStats.objects.filter(key=key).update(data=data):
+        return
+    try:
+        with transaction.atomic():
+            PersistentStats.objects.create(key=key, data=data)
+    except IntegrityError:
+        # Created concurrently
+        PersistentStats.objects.filter(key=key).update(data=data)
+
+
+def delete_persistent(key):
+    """Remove stats stored in the database."""
+    from weblate.utils.models import PersistentStats
+
+    PersistentStats.objects.filter(key=key).delete()
+
+
+def delete_persistent_prefix(prefix):
+    """Remove stats stored in the database with given key prefix.
+
+    Returns list of removed keys.
+    """
+    from weblate.utils.models import PersistentStats
+
+    stored = PersistentStats.objects.filter(key__startswith=prefix)
+    keys = list(stored.values_list("key", flat=True))
+    stored.delete()
+    return keys
+
+
 def prefetch_stats(queryset):
     objects = list(queryset)
     if not objects:
@@ -124,6 +218,7 @@ class BaseStats:
         self._object = obj
         self._data = None
         self._pending_save = False
+        self._stale = False
 
     @property
     def pk(self):
@@ -159,6 +254,12 @@ class BaseStats:
         if not lookup:
             return
         data = cache.get_many(lookup.keys())
+        missing = set(lookup.keys()) - set(data.keys())
+        if missing:
+            stored = load_persistent(missing)
+            if stored:
+                cache.set_many(stored, CACHE_TIMEOUT)
+            data.update(stored)
         for item, value in data.items():
             lookup[item].set_data(value)
         for item in set(lookup.keys()) - set(data.keys()):
@@ -172,6 +273,14 @@ class BaseStats:
     def cache_key(self):
         return "stats-{}-{}".format(self._object.__class__.__name__, self._object.pk)
 
+    @cached_property
+    def stale_key(self):
+        return "{}-stale".format(self.cache_key)
+
+    @cached_property
+    def lock_key(self):
+        return "{}-lock".format(self.cache_key)
+
     def __getattr__(self, name):
         if self._data is None:
             self._data = self.load()
@@ -179,7 +288,9 @@ class BaseStats:
             was_pending = self._pending_save
             self._pending_save = True
             if name in self.basic_keys:
-                self.prefetch_basic()
+                self.ensure_basic(save=False)
+                if name not in self._data:
+                    self.prefetch_basic()
             elif name.endswith("_percent"):
                 self.store_percents(name)
             else:
@@ -190,16 +301,81 @@ class BaseStats:
         return self._data[name]
 
     def load(self):
-        return cache.get(self.cache_key, {})
+        data = cache.get(self.cache_key)
+        if data is None:
+            data = load_persistent([self.cache_key]).get(self.cache_key, {})
+            if data:
+                cache.set(self.cache_key, data, CACHE_TIMEOUT)
+        return data
 
     def save(self):
-        """Save stats to cache."""
-        cache.set(self.cache_key, self._data, 30 * 86400)
+        """Save stats to cache and database."""
+        if self._stale:
+            return
+        cache.set(self.cache_key, self._data, CACHE_TIMEOUT)
+        save_persistent(self.cache_key, self._data)
+
+    def discard(self):
+        """Remove local, cache and database data.
+
+        The previous data is kept aside to be served while the stats are being
+        recalculated.
+        """
+        data = self._data or cache.get(self.cache_key)
+        if data and "all" in data:
+            cache.set(self.stale_key, data, CACHE_TIMEOUT)
+        self._data = {}
+        self._stale = False
+        cache.delete(self.cache_key)
+        delete_persistent(self.cache_key)
 
     def invalidate(self, language=None):
         """Invalidate local and cache data."""
+        self.discard()
+
+    def delete(self):
+        """Remove all data of deleted object."""
         self._data = {}
-        cache.delete(self.cache_key)
+        cache.delete_many([self.cache_key, self.stale_key])
+        delete_persistent(self.cache_key)
+
+    def apply_delta(self, delta, last_change=None, language=None):
+        """Incrementally update cached basic stats.
+
+        Only basic stats are updated, the others are dropped and calculated
+        on demand. Stats not present in the cache are left to be calculated
+        on next access and full recalculation is done after DELTA_LIMIT
+        incremental updates to fix possible drift. The update is done under
+        the stats lock, the stats are invalidated when it is held by other
+        process.
+        """
+        if not cache.add(self.lock_key, True, LOCK_TIMEOUT):
+            self.invalidate(language=language)
+            return
+        try:
+            data = self.load()
+            if "all" not in data:
+                self._data = data
+                return
+            updates = data.get("delta_updates", 0) + 1
+            if updates > DELTA_LIMIT:
+                self.invalidate(language=language)
+                return
+            self._data = {key: data[key] for key in self.basic_keys if key in data}
+            self._data["delta_updates"] = updates
+            for key, value in delta.items():
+                if key in self._data:
+                    self._data[key] += value
+            if last_change is not None:
+                timestamp, author = last_change
+                last = self._data.get("last_changed")
+                if not last or last < timestamp:
+                    self._data["last_changed"] = timestamp
+                    self._data["last_author"] = author
+            self.calculate_basic_percents()
+            self.save()
+        finally:
+            cache.delete(self.lock_key)
 
     def store(self, key, value):
         if self._data is None:
@@ -219,9 +395,21 @@ class BaseStats:
         if self._data is None:
             self._data = self.load()
         if "all" not in self._data:
-            self.prefetch_basic()
-            if save:
-                self.save()
+            locked = cache.add(self.lock_key, True, LOCK_TIMEOUT)
+            if not locked:
+                # Other process is calculating, serve previous data if we have it
+                stale = cache.get(self.stale_key)
+                if stale:
+                    self._data = stale
+                    self._stale = True
+                    return False
+            try:
+                self.prefetch_basic()
+                if save:
+                    self.save()
+            finally:
+                if locked:
+                    cache.delete(self.lock_key)
             return True
         return False
 
@@ -275,8 +463,9 @@ class DummyTranslationStats(BaseStats):
     def pk(self):
         return "l-{}".format(self.language.pk)
 
+    @cached_property
     def cache_key(self):
-        return None
+        return "stats-dummy-{}".format(self.pk)
 
     def save(self):
         return
@@ -299,6 +488,13 @@ class TranslationStats(BaseStats):
         self._object.component.stats.invalidate(language=self._object.language)
         self._object.language.stats.invalidate()
 
+    def apply_delta(self, delta, last_change=None, language=None):
+        super().apply_delta(delta, last_change)
+        self._object.component.stats.apply_delta(
+            delta, last_change, language=self._object.language
+        )
+        self._object.language.stats.apply_delta(delta, last_change)
+
     @property
     def language(self):
         return self._object.language
@@ -500,6 +696,12 @@ class ComponentStats(LanguageStats):
         for clist in self._object.componentlist_set.iterator():
             clist.stats.invalidate()
 
+    def apply_delta(self, delta, last_change=None, language=None):
+        super().apply_delta(delta, last_change, language)
+        self._object.project.stats.apply_delta(delta, last_change, language)
+        for clist in self._object.componentlist_set.iterator():
+            clist.stats.apply_delta(delta, last_change)
+
     def get_language_stats(self):
         yield from (
             TranslationStats(translation) for translation in self.translation_set
@@ -573,6 +775,18 @@ class ProjectStats(BaseStats):
                 self.get_single_language_stats(lang).invalidate()
         GlobalStats().invalidate()
 
+    def apply_delta(self, delta, last_change=None, language=None):
+        super().apply_delta(delta, last_change, language)
+        if language:
+            self.get_single_language_stats(language).apply_delta(delta, last_change)
+        GlobalStats().apply_delta(delta, last_change)
+
+    def delete(self):
+        super().delete()
+        # The languages can not be listed for deleted project
+        keys = delete_persistent_prefix("{}-".format(self.cache_key))
+        cache.delete_many(keys + ["{}-stale".format(key) for key in keys])
+
     @cached_property
     def component_set(self):
         return prefetch_stats(self._object.component_set.all())
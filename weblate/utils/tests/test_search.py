@@ -47,6 +47,28 @@ class ComparerTest(SimpleTestCase):
         # This is expected to raise MemoryError inside jellyfish
         self.assertLessEqual(Comparer().similarity("a" * 200000, "b" * 200000), 50)
 
+    def test_bounded(self):
+        comparer = Comparer()
+        self.assertEqual(comparer.bounded_similarity("a", "a", 50), 100)
+        self.assertEqual(comparer.bounded_similarity("", "", 50), 100)
+        self.assertEqual(
+            comparer.bounded_similarity("NICHOLASŸ", "NICHOLAS", 50),
+            comparer.similarity("NICHOLASŸ", "NICHOLAS"),
+        )
+        self.assertIsNone(comparer.bounded_similarity("a", "b", 50))
+        # Length difference alone is over the limit
+        self.assertIsNone(comparer.bounded_similarity("a" * 10, "a" * 100, 50))
+
+    def test_bounded_long(self):
+        comparer = Comparer()
+        first = "Hello world, this is a long string. " * 100
+        second = first[:-10] + "Hello!"
+        self.assertEqual(
+            comparer.bounded_similarity(first, second, 90),
+            comparer.similarity(first, second),
+        )
+        self.assertIsNone(comparer.bounded_similarity("a" * 3000, "b" * 3000, 90))
+
 
 class QueryParserTest(TestCase):
     def assert_query(self, string, expected):